@@ -0,0 +1,111 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Scheduler backends: how the nodes usage is collected on each scheduler,
+into the table consumed by `Xsinfo.xsinfo.process_sinfo`."""
+
+import json
+
+
+def read_sinfo_file(path: str):
+    """
+    Parse a recorded sinfo output, either fixed-width or `sinfo --json`.
+
+    Parameters
+    ----------
+    path : str
+        Path to the recorded output.
+
+    Returns
+    -------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores.
+    """
+    from Xsinfo.collect import read_fixed_width, read_json
+    with open(path) as f:
+        if f.read(1) == '{':
+            f.seek(0)
+            return read_json(json.load(f))
+        f.seek(0)
+        return read_fixed_width(f)
+
+
+def collect_slurm(filters: dict = None):
+    """Collect the nodes usage with sinfo (see `Xsinfo.collect.get_sinfo`),
+    which applies the nodes filters it can express."""
+    from Xsinfo.collect import get_sinfo
+    return get_sinfo(filters=filters)
+
+
+def collect_torque(filters: dict = None):
+    """Collect the nodes usage with pbsnodes (see `Xsinfo.torque`), and keep
+    the nodes selected by the filters (pbsnodes lists them all)."""
+    from Xsinfo.torque import get_pbsnodes
+    from Xsinfo.filters import filter_sinfo
+    return filter_sinfo(get_pbsnodes(), filters)
+
+
+def read_torque_file(path: str):
+    """Parse a recorded `pbsnodes -x` output."""
+    from Xsinfo.torque import read_pbsnodes
+    return read_pbsnodes(path)
+
+
+# name: {"command": executable that must be on the PATH,
+#        "collect": function collecting the nodes usage table,
+#        "read": function parsing a recorded output file into this table}
+BACKENDS = {}
+
+
+def register_backend(name: str, command: str, collect, read) -> None:
+    """
+    Register (or replace) a scheduler backend.
+
+    Parameters
+    ----------
+    name : str
+        Backend name, e.g. "slurm".
+    command : str
+        Executable that must be available for the collection, e.g. "sinfo".
+    collect : callable
+        Function returning the nodes usage table (with the
+        `Xsinfo.collect.SINFO_COLUMNS`, one row per node and partition),
+        called without arguments, or with the nodes filters if any (see
+        `Xsinfo.filters.parse_filters`).
+    read : callable
+        Function parsing a recorded output of `command` (path) into the same
+        table, e.g. for tests or to replay a collection.
+    """
+    BACKENDS[name] = {'command': command, 'collect': collect, 'read': read}
+
+
+def get_backend(name: str) -> dict:
+    """
+    Get a registered scheduler backend.
+
+    Parameters
+    ----------
+    name : str
+        Backend name.
+
+    Returns
+    -------
+    backend : dict
+        "command", "collect" and "read" of the backend.
+
+    Raises
+    ------
+    ValueError
+        If no backend is registered with this name.
+    """
+    if name not in BACKENDS:
+        raise ValueError('Scheduler backend must be one of %s (not "%s")' % (
+            ', '.join(sorted(BACKENDS)), name))
+    return BACKENDS[name]
+
+
+register_backend('slurm', 'sinfo', collect_slurm, read_sinfo_file)
+register_backend('torque', 'pbsnodes', collect_torque, read_torque_file)
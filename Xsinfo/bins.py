@@ -0,0 +1,236 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Bins of the cpu, memory and gpu loads (%) in which the nodes are summarized:
+quartiles by default, or any edges or number of bins per load, and a grid of
+the cpu x memory bins.
+
+The nodes are assigned to their bins with `np.digitize` and the stats of all
+the bins are aggregated in one pass with `np.bincount`, so that finer bins
+cost no more than the quartiles."""
+
+import json
+import numpy as np
+
+from Xsinfo.hostlist import compress_hostlist
+from Xsinfo.schema import LOAD_DECIMALS
+
+# right-closed bins, i.e. (25, 50], except the first one that also has its
+# lower edge, i.e. [0, 25]
+QUARTILES = [0., 25., 50., 75., 100.]
+LOADS = ['cpu', 'mem', 'gpu']
+# key of the stats per bin of cpu x memory loads
+GRID = 'cpu-mem'
+
+
+def parse_bins(bins) -> list:
+    """
+    Parse the bins of a load, given as a number of bins or as their edges.
+
+    Parameters
+    ----------
+    bins : int, str or list
+        Number of equal bins between 0 and 100 (e.g. 10 or "10"), or
+        increasing edges (e.g. "0,50,80,90,100" or [0, 50, 100]).
+
+    Returns
+    -------
+    edges : list
+        Edges of the bins (one more than the number of bins).
+
+    Raises
+    ------
+    ValueError
+        If there is not at least one bin, or the edges are not increasing.
+    """
+    if isinstance(bins, str):
+        bins = [x.strip() for x in bins.split(',') if x.strip()]
+        if len(bins) == 1:
+            bins = bins[0]
+    if isinstance(bins, (list, tuple)):
+        edges = [float(x) for x in bins]
+        if len(edges) < 2 or any(b <= a for a, b in zip(edges, edges[1:])):
+            raise ValueError('Bin edges must be at least two increasing '
+                             'numbers (not "%s")' % ','.join(map(str, bins)))
+        return edges
+    count = int(bins)
+    if count < 1 or str(count) != str(bins).strip():
+        raise ValueError('Number of bins must be a positive integer (not '
+                         '"%s")' % bins)
+    return [100. * x / count for x in range(count + 1)]
+
+
+def read_bins_config(path: str) -> dict:
+    """
+    Read the bins of each load from a JSON file, e.g.
+    {"cpu": 10, "mem": [0, 50, 80, 90, 100], "grid": true}.
+
+    Parameters
+    ----------
+    path : str
+        Path to the JSON file, with the bins of any of the "cpu", "mem" and
+        "gpu" loads (see `parse_bins`) and whether to summarize the nodes per
+        cpu x mem bins ("grid").
+
+    Returns
+    -------
+    config : dict
+        Edges per load, and "grid" if given.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a JSON object, has other keys or invalid bins.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or set(data) - set(LOADS + ['grid']):
+        raise ValueError('Bins config "%s" must be a JSON object with keys '
+                         'among %s and grid' % (path, ', '.join(LOADS)))
+    config = dict((load, parse_bins(bins)) for load, bins in data.items()
+                  if load in LOADS)
+    if 'grid' in data:
+        config['grid'] = bool(data['grid'])
+    return config
+
+
+def get_bins(bins=None, config: str = None, grid: bool = False) -> dict:
+    """
+    Get the bins of each load.
+
+    Parameters
+    ----------
+    bins : int, str or list
+        Bins of all the loads (see `parse_bins`), default to quartiles.
+    config : str
+        Path to a JSON file of bins per load (see `read_bins_config`), that
+        take precedence over `bins`.
+    grid : bool
+        Also summarize the nodes per cpu x mem bins.
+
+    Returns
+    -------
+    bins : dict
+        Edges per load ("cpu", "mem" and "gpu") and "grid".
+    """
+    edges = QUARTILES if bins is None else parse_bins(bins)
+    binning = dict((load, edges) for load in LOADS)
+    binning['grid'] = grid
+    if config:
+        binning.update(read_bins_config(config))
+    return binning
+
+
+def is_default(bins: dict) -> bool:
+    """Whether the bins are the quartiles of each load, without grid (i.e.
+    those of the summaries saved with the snapshots)."""
+    return not bins or (not bins.get('grid') and all(
+        bins.get(load, QUARTILES) == QUARTILES for load in LOADS))
+
+
+def get_labels(edges: list) -> list:
+    """Get the labels of the bins, e.g. "0-25" (with the "%" appended when
+    rendered)."""
+    return ['%g-%g' % (lo, hi) for lo, hi in zip(edges, edges[1:])]
+
+
+def digitize(loads: np.ndarray, edges: list) -> np.ndarray:
+    """
+    Get the bin of each load.
+
+    Parameters
+    ----------
+    loads : np.ndarray
+        Loads (%), possibly nan (e.g. the gpu load of nodes without GPUs) and
+        float32 (see `Xsinfo.schema.NODES_DTYPES`).
+    edges : list
+        Edges of the bins.
+
+    Returns
+    -------
+    codes : np.ndarray
+        Index of the bin of each load, or -1 for the loads out of the bins
+        (or nan).
+    """
+    # float32 loads back to their decimals, e.g. so that 33.3333 is in the
+    # bin that ends at 33.3333
+    loads = np.round(np.asarray(loads, dtype=float), LOAD_DECIMALS)
+    codes = np.digitize(loads, edges, right=True) - 1
+    # the first bin includes its lower edge
+    codes[loads == edges[0]] = 0
+    codes[(codes < 0) | (codes >= len(edges) - 1)] = -1
+    return codes
+
+
+def aggregate_bins(codes: np.ndarray, nbins: int, cpus: np.ndarray,
+                   free_mem: np.ndarray, nodes: np.ndarray,
+                   gpus: np.ndarray = None) -> list:
+    """
+    Compute the stats of the nodes of each bin in one pass.
+
+    Parameters
+    ----------
+    codes : np.ndarray
+        Bin of each node (-1 for none, see `digitize`).
+    nbins : int
+        Number of bins.
+    cpus : np.ndarray
+        Available cores of each node.
+    free_mem : np.ndarray
+        Free memory of each node (whole GiB, nan if unknown).
+    nodes : np.ndarray
+        Node names, in the order in which they are listed in their bin.
+    gpus : np.ndarray
+        Available GPUs of each node, if they are summed too.
+
+    Returns
+    -------
+    stats : list
+        Per non-empty bin: (bin index, [sum of available GPUs,] sum of
+        available cores, sum of free memory, mean and standard deviation of
+        the free memory, number of nodes, hostlist of the nodes). The nodes
+        of unknown free memory are left out of the memory stats only.
+    """
+    binned = codes >= 0
+    codes = codes[binned]
+    counts = np.bincount(codes, minlength=nbins)
+    sums = {}
+    for name, values in [('gpus', gpus), ('cpus', cpus)]:
+        if values is None:
+            continue
+        values = np.asarray(values)[binned]
+        total = np.bincount(codes, weights=values, minlength=nbins)
+        if values.dtype.kind in 'iu':
+            total = total.astype(np.int64)
+        sums[name] = total
+    free_mem = np.asarray(free_mem, dtype=float)[binned]
+    known = ~np.isnan(free_mem)
+    mem_codes, free_mem = codes[known], free_mem[known]
+    mem_counts = np.bincount(mem_codes, minlength=nbins)
+    # whole GiB
+    sums['mem'] = np.bincount(mem_codes, weights=free_mem,
+                              minlength=nbins).astype(np.int64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums['mem'] / mem_counts
+        # two passes, as pandas, for the precision of the deviations
+        squares = np.bincount(
+            mem_codes, weights=(free_mem - means[mem_codes]) ** 2,
+            minlength=nbins)
+        sds = np.sqrt(squares / (mem_counts - 1))
+    sds[mem_counts < 2] = np.nan
+    # the nodes of each bin, keeping their order
+    order = np.argsort(codes, kind='stable')
+    members = np.split(np.asarray(nodes)[binned][order],
+                       np.cumsum(counts)[:-1])
+    stats = []
+    for idx in np.flatnonzero(counts):
+        row = [int(idx)]
+        row.extend([sums[x][idx].item() for x in ['gpus', 'cpus', 'mem']
+                    if x in sums])
+        row.extend([round(means[idx].item(), 4), round(sds[idx].item(), 4),
+                    int(counts[idx]), compress_hostlist(members[idx])])
+        stats.append(row)
+    return stats
@@ -0,0 +1,428 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import os
+import json
+import signal
+import threading
+import subprocess
+from array import array
+import numpy as np
+import pandas as pd
+
+from Xsinfo.timing import timed
+from Xsinfo.filters import split_filters, filter_sinfo
+
+# (column name, sinfo -O field, width, dtype): the single source of truth for
+# both the sinfo command and the offsets at which its output is sliced
+SINFO_SPEC = [
+    ('node', 'NodeList', 40, str),
+    ('partition', 'Partition', 24, str),
+    ('status', 'StateLong', 20, str),
+    ('cpu_load', 'CPUsLoad', 10, float),
+    ('cpus', 'CPUsState', 24, str),
+    ('socket', 'Sockets', 6, int),
+    ('cores', 'Cores', 6, int),
+    ('threads', 'Threads', 6, int),
+    ('mem', 'Memory', 12, int),
+    ('free_mem', 'FreeMem', 12, float),
+]
+SINFO_COLUMNS = [col for col, _, _, _ in SINFO_SPEC]
+# generic resources (e.g. "gpu:a100:4(S:0-1)") and features of the nodes, also
+# collected but optional in the tables (e.g. Torque or older snapshots)
+GRES_SPEC = [
+    ('gres', 'Gres', 80, str),
+    ('gres_used', 'GresUsed', 80, str),
+    ('features', 'Features', 120, str),
+]
+GRES_COLUMNS = [col for col, _, _, _ in GRES_SPEC]
+# comma-separated lists that sinfo may truncate at their width (e.g. the many
+# features of a node): their last, possibly cut, item is left out rather than
+# rejecting the record
+TRUNCATED_LISTS = ['features']
+COLLECT_SPEC = SINFO_SPEC + GRES_SPEC
+
+# environment variable opting in to `sinfo --json` (if set to 1)
+SINFO_JSON_ENV = 'XSINFO_SINFO_JSON'
+
+
+def get_sinfo_cmd(spec: list = COLLECT_SPEC, cluster: str = None,
+                  filters: dict = None) -> list:
+    """
+    Get the sinfo command printing one fixed-width record per node/partition.
+
+    Parameters
+    ----------
+    spec : list
+        (column name, sinfo field, width, dtype) of each output field.
+    cluster : str
+        Name of the cluster to query (sinfo --clusters), if not the local one.
+    filters : dict
+        Nodes filters (see `Xsinfo.filters.parse_filters`), of which those
+        that sinfo can apply are passed as its -p, -t and -n options.
+
+    Returns
+    -------
+    cmd : list
+        sinfo command and arguments.
+    """
+    fmt = ','.join(['%s:%s' % (field, width) for _, field, width, _ in spec])
+    cmd = ['sinfo', '--Node', '-h', '-O', fmt] + split_filters(filters)[0]
+    if cluster:
+        cmd[1:1] = ['--clusters', cluster]
+    return cmd
+
+
+def get_sinfo_env(slurm_conf: str = None) -> dict:
+    """Get the environment of sinfo: the current one, or with another
+    configuration file (i.e. another cluster) as $SLURM_CONF."""
+    if not slurm_conf:
+        return None
+    return dict(os.environ, SLURM_CONF=slurm_conf)
+
+
+def parse_float(value: str) -> float:
+    """Parse a float field, for which Slurm may print "N/A" or nothing."""
+    if value in ('', 'N/A'):
+        return float('nan')
+    return float(value)
+
+
+def read_fixed_width(lines, spec: list = COLLECT_SPEC) -> pd.DataFrame:
+    """
+    Parse fixed-width sinfo records one line at a time into typed columns.
+
+    Each field is sliced at its offset in the record, so that empty fields or
+    fields containing spaces cannot shift the following columns. A field that
+    fills its whole width may have been truncated by sinfo and is rejected,
+    except for the lists of `TRUNCATED_LISTS` that lose their last item.
+
+    Parameters
+    ----------
+    lines : iterable
+        Lines of sinfo output (e.g. a file or a subprocess pipe).
+    spec : list
+        (column name, sinfo field, width, dtype) of each output field (the
+        fields missing at the end of shorter records are empty).
+
+    Returns
+    -------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores.
+
+    Raises
+    ------
+    ValueError
+        If a field value is as wide as its column (i.e. possibly truncated),
+        and not one of the `TRUNCATED_LISTS`.
+    """
+    slices, start = [], 0
+    for _, _, width, _ in spec:
+        slices.append(slice(start, start + width))
+        start += width
+    # one buffer per column: numeric arrays or lists of strings
+    typecodes = {int: 'q', float: 'd'}
+    parsers = {int: int, float: parse_float, str: str}
+    buffers = [array(typecodes[dtype]) if dtype in typecodes else []
+               for _, _, _, dtype in spec]
+    fields = [(buf, parsers[dtype], sl, field, col in TRUNCATED_LISTS)
+              for buf, sl, (col, field, _, dtype) in zip(buffers, slices,
+                                                         spec)]
+    for ldx, line in enumerate(lines):
+        line = line.rstrip('\n')
+        # "CLUSTER: name" headers are printed by `sinfo --clusters`
+        if not line.strip() or line.startswith('CLUSTER: '):
+            continue
+        for buf, parse, sl, field, truncated in fields:
+            value = line[sl]
+            if len(value) == sl.stop - sl.start and value[-1] != ' ':
+                if truncated:
+                    buf.append(value.rpartition(',')[0])
+                    continue
+                raise ValueError(
+                    'sinfo field %s truncated at %s characters on line %s '
+                    '("%s"): widen it in SINFO_SPEC' % (
+                        field, sl.stop - sl.start, ldx + 1, value))
+            buf.append(parse(value.strip()))
+    sinfo = pd.DataFrame({
+        col: np.frombuffer(buf, dtype=buf.typecode) if dtype in typecodes
+        else buf for buf, (col, _, _, dtype) in zip(buffers, spec)
+    }, columns=[col for col, _, _, _ in spec])
+    return sinfo
+
+
+def read_json(data: dict) -> pd.DataFrame:
+    """
+    Parse the nodes records of `sinfo --json` into the sinfo table columns.
+
+    The "nodes" schema of Slurm's REST data parser is expected (i.e. one entry
+    per node listing its partitions, as printed from Slurm 21.08 to 22.05),
+    and a record is made for each partition the node belongs to, as with
+    `sinfo --Node`. From Slurm 23.02, `sinfo --json` prints a "sinfo" list of
+    groups of nodes with the ranges of their memory and loads instead, from
+    which the usage of each node cannot be known.
+
+    Parameters
+    ----------
+    data : dict
+        Decoded JSON output of `sinfo --json`.
+
+    Returns
+    -------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores.
+
+    Raises
+    ------
+    ValueError
+        If the JSON document does not have a "nodes" list.
+    """
+    if 'sinfo' in data and 'nodes' not in data:
+        raise ValueError('The sinfo JSON output only has groups of nodes '
+                         '("sinfo" records, Slurm >= 23.02): unset $%s to '
+                         'parse the fixed-width output' % SINFO_JSON_ENV)
+    if not isinstance(data.get('nodes'), list):
+        raise ValueError('No "nodes" records in the sinfo JSON output')
+
+    def number(value):
+        # newer data parsers wrap numbers as {"set": bool, "number": value}
+        if isinstance(value, dict):
+            return value.get('number') if value.get('set', True) else None
+        return value
+
+    records = []
+    for node in data['nodes']:
+        state = node.get('state', '')
+        if isinstance(state, list):
+            state = '+'.join(state)
+        total = number(node.get('cpus', 0)) or 0
+        alloc = number(node.get('alloc_cpus', 0)) or 0
+        idle = number(node.get('idle_cpus', total - alloc))
+        cpus = '%s/%s/%s/%s' % (alloc, idle, total - alloc - idle, total)
+        cpu_load = number(node.get('cpu_load'))
+        free_mem = number(node.get('free_memory', node.get('free_mem')))
+        features = node.get('features') or ''
+        if isinstance(features, dict):
+            # newer data parsers: {"total": "a,b", "active": "a"}
+            features = features.get('total') or ''
+        if isinstance(features, list):
+            features = ','.join(features)
+        for partition in node.get('partitions') or ['']:
+            records.append([
+                node['name'], partition, state.lower(),
+                float('nan') if cpu_load is None else cpu_load / 100, cpus,
+                number(node.get('sockets')), number(node.get('cores')),
+                number(node.get('threads')), number(node.get('real_memory')),
+                float('nan') if free_mem is None else free_mem,
+                node.get('gres') or '', node.get('gres_used') or '',
+                features])
+    sinfo = pd.DataFrame(records, columns=SINFO_COLUMNS + GRES_COLUMNS)
+    dtypes = {col: dtype for col, _, _, dtype in SINFO_SPEC if dtype is not str}
+    sinfo = sinfo.astype(dtypes)
+    return sinfo
+
+
+def start_sinfo(cmd: list, slurm_conf: str = None,
+                timeout: float = None) -> subprocess.Popen:
+    """Start a sinfo command, in its own process group if it may have to be
+    killed (with `kill_sinfo`) once the timeout expires."""
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            universal_newlines=True,
+                            env=get_sinfo_env(slurm_conf),
+                            start_new_session=bool(timeout))
+    return proc
+
+
+def kill_sinfo(proc: subprocess.Popen) -> None:
+    """Kill a sinfo command started with a timeout, and its children (e.g.
+    of a wrapper script) that would otherwise keep its output open."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        # already exited
+        pass
+
+
+def run_sinfo(cmd: list, slurm_conf: str = None, timeout: float = None,
+              stage: str = None) -> str:
+    """
+    Run a sinfo command to completion.
+
+    Parameters
+    ----------
+    cmd : list
+        sinfo command and arguments.
+    slurm_conf : str
+        Slurm configuration file of the cluster to query ($SLURM_CONF).
+    timeout : float
+        Number of seconds after which sinfo is killed.
+    stage : str
+        Name of the run in the timing trace (default to the command name).
+
+    Returns
+    -------
+    out : str
+        Standard output of sinfo.
+
+    Raises
+    ------
+    TimeoutError
+        If sinfo did not complete in time (e.g. a slow controller).
+    OSError
+        If sinfo exited with an error.
+    """
+    with timed(stage or cmd[0]):
+        proc = start_sinfo(cmd, slurm_conf, timeout)
+        try:
+            out, _ = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_sinfo(proc)
+            proc.communicate()
+            raise TimeoutError('`%s` timed out after %ss' % (' '.join(cmd),
+                                                            timeout))
+    if proc.returncode:
+        raise OSError('`%s` exited with status %s' % (
+            ' '.join(cmd), proc.returncode))
+    return out
+
+
+def get_sinfo_fixed_width(cluster: str = None, slurm_conf: str = None,
+                          timeout: float = None,
+                          filters: dict = None) -> pd.DataFrame:
+    """
+    Run sinfo and parse its fixed-width output as it is streamed.
+
+    The filters are applied by sinfo, except those it cannot express (see
+    `Xsinfo.filters.split_filters`) that are applied to the parsed table.
+
+    Parameters
+    ----------
+    cluster : str
+        Name of the cluster to query (sinfo --clusters), if not the local one.
+    slurm_conf : str
+        Slurm configuration file of the cluster to query ($SLURM_CONF).
+    timeout : float
+        Number of seconds after which sinfo is killed.
+    filters : dict
+        Nodes filters (see `Xsinfo.filters.parse_filters`).
+
+    Returns
+    -------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores.
+    """
+    cmd = get_sinfo_cmd(cluster=cluster, filters=filters)
+    # the output is parsed as it is streamed, i.e. during the sinfo latency
+    with timed('sinfo') as record:
+        proc = start_sinfo(cmd, slurm_conf, timeout)
+        expired = threading.Event()
+        timer = None
+        if timeout:
+            # the output is still parsed as it comes, until sinfo is killed
+            timer = threading.Timer(
+                timeout, lambda: (expired.set(), kill_sinfo(proc)))
+            timer.start()
+        try:
+            sinfo = read_fixed_width(proc.stdout)
+            record['rows'] = sinfo.shape[0]
+        except ValueError:
+            # e.g. a record cut when sinfo was killed
+            if not expired.is_set():
+                raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+            proc.stdout.close()
+            proc.wait()
+    if expired.is_set():
+        raise TimeoutError('`%s` timed out after %ss' % (' '.join(cmd),
+                                                        timeout))
+    if proc.returncode:
+        raise OSError('`%s` exited with status %s' % (
+            ' '.join(cmd), proc.returncode))
+    rest = split_filters(filters)[1]
+    if rest:
+        sinfo = filter_sinfo(sinfo, rest)
+    return sinfo
+
+
+def get_sinfo_json(cluster: str = None, slurm_conf: str = None,
+                   timeout: float = None,
+                   filters: dict = None) -> pd.DataFrame:
+    """
+    Run `sinfo --json` and parse its nodes records.
+
+    The filters are passed to sinfo, but as its nodes records keep all the
+    partitions of the nodes, they are also applied to the parsed table.
+
+    Parameters
+    ----------
+    cluster : str
+        Name of the cluster to query (sinfo --clusters), if not the local one.
+    slurm_conf : str
+        Slurm configuration file of the cluster to query ($SLURM_CONF).
+    timeout : float
+        Number of seconds after which sinfo is killed.
+    filters : dict
+        Nodes filters (see `Xsinfo.filters.parse_filters`).
+
+    Returns
+    -------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores.
+    """
+    cmd = ['sinfo', '--json'] + split_filters(filters)[0]
+    if cluster:
+        cmd[1:1] = ['--clusters', cluster]
+    out = run_sinfo(cmd, slurm_conf, timeout)
+    with timed('read_json') as record:
+        sinfo = read_json(json.loads(out))
+        record['rows'] = sinfo.shape[0]
+    if filters:
+        sinfo = filter_sinfo(sinfo, filters)
+    return sinfo
+
+
+def get_sinfo(use_json: bool = None, cluster: str = None,
+              slurm_conf: str = None, timeout: float = None,
+              filters: dict = None) -> pd.DataFrame:
+    """
+    Run subprocess to collect the nodes and cores
+    that are idle and available for compute.
+
+    Parameters
+    ----------
+    use_json : bool
+        Parse `sinfo --json` (True) or the fixed-width output (False).
+        By default, the fixed-width output is parsed as it is streamed (one
+        query of the controller), and `sinfo --json` only if
+        $XSINFO_SINFO_JSON is set to 1 (Slurm 21.08 to 22.05, see
+        `read_json`).
+    cluster : str
+        Name of the cluster to query (sinfo --clusters), if not the local one.
+    slurm_conf : str
+        Slurm configuration file of the cluster to query ($SLURM_CONF).
+    timeout : float
+        Number of seconds after which sinfo is killed.
+    filters : dict
+        Nodes filters (see `Xsinfo.filters.parse_filters`), pushed down to
+        sinfo when possible.
+
+    Returns
+    -------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores.
+
+    Raises
+    ------
+    TimeoutError
+        If sinfo did not complete in time.
+    """
+    if use_json is None:
+        use_json = os.environ.get(SINFO_JSON_ENV) == '1'
+    if use_json:
+        return get_sinfo_json(cluster, slurm_conf, timeout, filters)
+    return get_sinfo_fixed_width(cluster, slurm_conf, timeout, filters)
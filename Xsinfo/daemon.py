@@ -0,0 +1,173 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import sys
+import time
+from datetime import datetime
+
+from Xsinfo.backends import get_backend
+from Xsinfo.federation import collect_clusters, CLUSTER_TIMEOUT
+from Xsinfo.history import record_history, HISTORY_KEEP
+from Xsinfo.timing import timed, start_poll, stop_poll, write_prometheus
+from Xsinfo.xsinfo import process_sinfo, summarize, get_shared_nodes
+from Xsinfo.summary import write_summary, get_summary_rows
+from Xsinfo.delta import init_state, update_state, write_deltas
+from Xsinfo.snapshot import (
+    write_snapshot, prune_snapshots, get_clusters_dir, SNAPSHOT_FORMAT)
+
+
+def collect_snapshot(snapshot_dir: str, keep: int, keep_age: float,
+                     fmt: str = SNAPSHOT_FORMAT, incremental: bool = False,
+                     state: dict = None, backend: str = 'slurm',
+                     clusters: list = None, timeout: float = CLUSTER_TIMEOUT,
+                     history: str = None,
+                     history_keep: float = HISTORY_KEEP) -> tuple:
+    """Collect, process and atomically write one snapshot of the nodes usage
+    (and its summary).
+
+    Parameters
+    ----------
+    snapshot_dir : str
+        Shared snapshots directory.
+    keep : int
+        Number of most recent snapshots to keep in the directory.
+    keep_age : float
+        Maximum age (in seconds) of the snapshots kept in the directory.
+    fmt : str
+        Snapshot file format: "npz", "feather" or "tsv".
+    incremental : bool
+        Only process the records that changed since the previous collection
+        and write their delta records next to the snapshot.
+    state : dict
+        Incremental state of the previous collection (None for the first).
+    backend : str
+        Scheduler backend collecting the nodes usage ("slurm" or "torque"),
+        in a sub-directory named after it if not Slurm.
+    clusters : list
+        (name, slurm.conf path or None) of the Slurm clusters to collect
+        concurrently and merge, in a sub-directory named after them.
+    timeout : float
+        Number of seconds after which the sinfo of a federated cluster is
+        killed (and the cluster left out).
+    history : str
+        SQLite history file to which the usage of all the nodes is appended.
+    history_keep : float
+        Number of seconds after which the history rows are removed.
+
+    Returns
+    -------
+    snapshot : str
+        Path to the written snapshot file.
+    state : dict
+        Incremental state of this collection (None if not incremental).
+    """
+    taken = datetime.now()
+    with timed('collect') as record:
+        snapshot_dir = get_clusters_dir(
+            snapshot_dir, [name for name, _ in clusters or []], backend)
+        if clusters:
+            sinfo = collect_clusters(clusters, timeout)
+        else:
+            sinfo = get_backend(backend)['collect']()
+        record['rows'] = sinfo.shape[0]
+    deltas = None
+    if not incremental:
+        sinfo_cpu = process_sinfo(sinfo)
+    elif state is None:
+        state = init_state(sinfo)
+        sinfo_cpu = state['sinfo_cpu']
+    else:
+        state, deltas = update_state(state, sinfo)
+        sinfo_cpu = state['sinfo_cpu']
+    with timed('write_snapshot'):
+        snapshot = write_snapshot(sinfo_cpu, snapshot_dir, taken, fmt)
+    with timed('summarize'):
+        shared = state['shared'] if incremental else get_shared_nodes(
+            sinfo_cpu)
+        write_summary(snapshot, get_summary_rows(summarize(sinfo_cpu)),
+                      shared)
+    if deltas is not None:
+        write_deltas(deltas, snapshot)
+    prune_snapshots(snapshot_dir, keep, keep_age)
+    if history:
+        with timed('record_history') as record:
+            record['rows'] = record_history(history, sinfo, taken,
+                                            keep=history_keep)
+    return snapshot, state
+
+
+def run_daemon(snapshot_dir: str, interval: float, keep: int,
+               keep_age: float = None, fmt: str = SNAPSHOT_FORMAT,
+               incremental: bool = False, iterations: int = None,
+               backend: str = 'slurm', clusters: list = None,
+               timeout: float = CLUSTER_TIMEOUT, history: str = None,
+               history_keep: float = HISTORY_KEEP,
+               metrics: str = None) -> None:
+    """Poll sinfo on a fixed interval and share each snapshot with all users.
+
+    A failed collection is reported on stderr and retried at the next poll,
+    so that clients keep reading the last complete snapshot meanwhile.
+
+    Parameters
+    ----------
+    snapshot_dir : str
+        Shared snapshots directory (e.g. readable by all users of login nodes).
+    interval : float
+        Number of seconds between the start of two collections.
+    keep : int
+        Number of most recent snapshots to keep in the directory.
+    keep_age : float
+        Maximum age (in seconds) of the snapshots kept in the directory.
+    fmt : str
+        Snapshot file format: "npz", "feather" or "tsv".
+    incremental : bool
+        Keep the previous collection in memory to only process the records
+        that changed and write their delta records next to each snapshot.
+    iterations : int
+        Stop after this number of collections (default to run forever).
+    backend : str
+        Scheduler backend collecting the nodes usage ("slurm" or "torque").
+    clusters : list
+        (name, slurm.conf path or None) of the Slurm clusters to collect
+        concurrently and merge.
+    timeout : float
+        Number of seconds after which the sinfo of a federated cluster is
+        killed (and the cluster left out).
+    history : str
+        SQLite history file to which the usage of all the nodes is appended.
+    history_keep : float
+        Number of seconds after which the history rows are removed.
+    metrics : str
+        File to which the timing of the stages of each poll is written, as
+        Prometheus metrics (see `Xsinfo.timing.write_prometheus`).
+    """
+    print('> Xsinfo daemon: polling %s every %ss into %s' % (
+        get_backend(backend)['command'], interval, snapshot_dir), flush=True)
+    n, failures, state = 0, 0, None
+    while iterations is None or n < iterations:
+        start = time.monotonic()
+        if metrics:
+            mark = start_poll()
+        try:
+            snapshot, state = collect_snapshot(
+                snapshot_dir, keep, keep_age, fmt, incremental, state, backend,
+                clusters, timeout, history, history_keep)
+            print('> Written %s (%.2fs)' % (
+                snapshot, time.monotonic() - start), flush=True)
+        except Exception as err:
+            # a failed poll (e.g. an unexpected record) is logged and the
+            # next one is tried, rather than stopping the snapshots
+            failures += 1
+            print('> Collection failed: %s: %s' % (type(err).__name__, err),
+                  file=sys.stderr, flush=True)
+        n += 1
+        if metrics:
+            write_prometheus(metrics, stop_poll(mark), {
+                'xsinfo_polls_total': n,
+                'xsinfo_poll_failures_total': failures,
+                'xsinfo_poll_interval_seconds': interval})
+        if iterations is None or n < iterations:
+            time.sleep(max(0., interval - (time.monotonic() - start)))
@@ -0,0 +1,320 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import json
+import numpy as np
+import pandas as pd
+
+from Xsinfo.xsinfo import (
+    normalize_sinfo, process_nodes, get_shared_nodes, change_dtypes,
+    bin_loads)
+from Xsinfo.schema import apply_schema
+from Xsinfo.snapshot import atomic_write, snapshot_stem
+
+# columns that change at (almost) every poll but do not change which nodes are
+# kept nor their cores and GPUs: refreshed in place rather than re-processed
+LOAD_COLUMNS = ['cpu_load', 'free_mem']
+
+
+def init_state(sinfo: pd.DataFrame) -> dict:
+    """
+    Fully process a first sinfo collection into an incremental state.
+
+    Parameters
+    ----------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores, per partition.
+
+    Returns
+    -------
+    state : dict
+        "nodes": the collected nodes table (one row per node),
+        "membership": the (node, partition) of the sinfo records,
+        "first": the position of the first record of each node,
+        "sinfo_cpu": the processed nodes table,
+        "rows": the position of its nodes in the collected nodes table,
+        "shared": the nodes per set of partitions.
+    """
+    nodes, membership = normalize_sinfo(sinfo)
+    sinfo_cpu = process_nodes(nodes).reset_index(drop=True)
+    state = {
+        'nodes': nodes,
+        'membership': membership,
+        'first': get_first_records(membership),
+        'sinfo_cpu': sinfo_cpu,
+        'rows': get_rows(nodes, sinfo_cpu),
+        'shared': get_shared_nodes(sinfo_cpu)}
+    return state
+
+
+def get_first_records(membership: pd.DataFrame) -> np.ndarray:
+    """Position of the first sinfo record of each node, i.e. of the rows of
+    the nodes table (see `Xsinfo.xsinfo.normalize_sinfo`)."""
+    return np.flatnonzero(~membership.node.duplicated().to_numpy())
+
+
+def get_rows(nodes: pd.DataFrame, sinfo_cpu: pd.DataFrame) -> np.ndarray:
+    """Position of the processed nodes in the collected nodes table."""
+    return pd.Index(nodes.node).get_indexer(sinfo_cpu.node)
+
+
+def renormalize_sinfo(state: dict, sinfo: pd.DataFrame) -> tuple:
+    """
+    Normalize a new sinfo collection, reusing the partitions of the nodes of
+    the previous poll if the nodes and their partitions did not change.
+
+    Parameters
+    ----------
+    state : dict
+        Incremental state of the previous poll (see `init_state`).
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores, per partition, at the
+        current poll.
+
+    Returns
+    -------
+    nodes : pd.DataFrame
+        sinfo about the nodes, one row per node (see `normalize_sinfo`).
+    membership : pd.DataFrame
+        Node (column "node") to partition (column "partition") membership.
+    first : np.ndarray
+        Position of the first record of each node.
+    """
+    membership = sinfo[['node', 'partition']].reset_index(drop=True)
+    if not membership.equals(state['membership']):
+        nodes, membership = normalize_sinfo(sinfo)
+        return nodes, membership, get_first_records(membership)
+    first = state['first']
+    nodes = sinfo.iloc[first].drop(columns='partition')
+    nodes.insert(1, 'partitions', state['nodes']['partitions'].to_numpy())
+    return nodes.reset_index(drop=True), membership, first
+
+
+def differ(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """Whether each pair of values differ, the missing values being equal
+    (only the few unequal values are checked for missing values)."""
+    changed = np.asarray(old != new, dtype=bool)
+    unequal = np.flatnonzero(changed)
+    changed[unequal] = ~(pd.isna(old[unequal]) & pd.isna(new[unequal]))
+    return changed
+
+
+def diff_nodes(previous: pd.DataFrame, current: pd.DataFrame,
+               cols: list = None) -> pd.DataFrame:
+    """
+    Find the nodes that were added, removed or changed between polls.
+
+    Parameters
+    ----------
+    previous : pd.DataFrame
+        Nodes table collected at the previous poll.
+    current : pd.DataFrame
+        Nodes table collected at the current poll.
+    cols : list
+        Columns to compare (default: all of them).
+
+    Returns
+    -------
+    diff : pd.DataFrame
+        Old ("<column>_old") and new ("<column>_new") values of the nodes
+        that differ, with their "change" (added, removed or changed).
+    """
+    if cols is None:
+        cols = [x for x in current.columns if x != 'node']
+    if previous['node'].equals(current['node']):
+        # same nodes in the same order: compared row by row, without merging
+        changed = np.zeros(current.shape[0], dtype=bool)
+        for col in cols:
+            changed |= differ(previous[col].to_numpy(),
+                              current[col].to_numpy())
+        diff = pd.concat([
+            current.loc[changed, ['node']],
+            previous.loc[changed, cols].add_suffix('_old'),
+            current.loc[changed, cols].add_suffix('_new')], axis=1)
+        diff['change'] = 'changed'
+        return diff.reset_index(drop=True)
+    # nullable integers, so that the outer merge does not make them floats
+    ints = {x: 'Int64' for x in cols if current[x].dtype.kind in 'iu'}
+    merged = previous[['node'] + cols].astype(ints).merge(
+        current[['node'] + cols].astype(ints), on='node', how='outer',
+        suffixes=('_old', '_new'), indicator=True)
+    changed = np.zeros(merged.shape[0], dtype=bool)
+    for col in cols:
+        old, new = merged['%s_old' % col], merged['%s_new' % col]
+        unequal = (old != new).fillna(True) & ~(old.isna() & new.isna())
+        changed |= unequal.to_numpy(dtype=bool)
+    merged['change'] = merged['_merge'].map({
+        'left_only': 'removed', 'right_only': 'added', 'both': 'changed'})
+    diff = merged.loc[changed].drop(columns='_merge').reset_index(drop=True)
+    return diff
+
+
+def get_deltas(diff: pd.DataFrame) -> list:
+    """
+    Get small delta records (only the changed fields) for downstream tools.
+
+    Parameters
+    ----------
+    diff : pd.DataFrame
+        Nodes that differ between polls (see `diff_nodes`).
+
+    Returns
+    -------
+    deltas : list
+        One dict per changed node: "node", "change" and "fields" mapping
+        each changed column to its [old, new] values.
+    """
+    cols = [x[:-4] for x in diff.columns if x.endswith('_old')]
+    olds = diff[['%s_old' % x for x in cols]].astype(object)
+    news = diff[['%s_new' % x for x in cols]].astype(object)
+    olds = olds.where(olds.notna(), None).values.tolist()
+    news = news.where(news.notna(), None).values.tolist()
+    deltas = []
+    for (node, change), old, new in zip(
+            diff[['node', 'change']].values.tolist(), olds, news):
+        deltas.append({
+            'node': node, 'change': change,
+            'fields': {col: [o, n] for col, o, n in zip(cols, old, new)
+                       if o != n}})
+    return deltas
+
+
+def refresh_loads(sinfo_cpu: pd.DataFrame, nodes: pd.DataFrame,
+                  rows: np.ndarray) -> None:
+    """
+    Refresh the cpu and memory loads of the processed nodes (and their bins),
+    in place, from their current collection.
+
+    Parameters
+    ----------
+    sinfo_cpu : pd.DataFrame
+        Processed nodes table.
+    nodes : pd.DataFrame
+        Nodes table collected at the current poll.
+    rows : np.ndarray
+        Position of the processed nodes in the collected nodes table.
+    """
+    if not sinfo_cpu.shape[0]:
+        return
+    for col in LOAD_COLUMNS:
+        sinfo_cpu[col] = nodes[col].to_numpy(dtype=float)[rows]
+    # free memory (MiB) to GiB, memory load and dtypes
+    change_dtypes(sinfo_cpu)
+    bin_loads(sinfo_cpu)
+
+
+def update_shared(shared: dict, sinfo_cpu: pd.DataFrame,
+                  partitions: list) -> dict:
+    """
+    Group again only the nodes of the sets of partitions that some nodes left
+    or joined (see `Xsinfo.xsinfo.get_shared_nodes`).
+
+    Parameters
+    ----------
+    shared : dict
+        Condensed node names per set of partitions, at the previous poll.
+    sinfo_cpu : pd.DataFrame
+        Processed nodes table of the current poll.
+    partitions : list
+        Previous and current comma-separated partitions of the changed
+        nodes.
+
+    Returns
+    -------
+    shared : dict
+        Condensed node names per set of partitions, at the current poll.
+    """
+    def get_key(parts):
+        return ','.join(sorted(set(parts.split(','))))
+
+    keys = set(get_key(x) for x in partitions)
+    affected = [x for x in sinfo_cpu['partitions'].unique().tolist()
+                if get_key(x) in keys]
+    shared = dict((key, nodes) for key, nodes in shared.items()
+                  if key not in keys)
+    shared.update(get_shared_nodes(
+        sinfo_cpu.loc[sinfo_cpu['partitions'].isin(affected)]))
+    return dict(sorted(shared.items()))
+
+
+def update_state(state: dict, sinfo: pd.DataFrame) -> tuple:
+    """
+    Update the processed tables with a new sinfo collection, processing
+    (dtypes, loads bins and partitions sharing) only the nodes whose state,
+    cores, memory, GPUs or partitions changed. The loads of the other nodes
+    are refreshed in place (see `LOAD_COLUMNS`), and the nodes table is
+    only normalized again if the nodes or their partitions changed.
+
+    Parameters
+    ----------
+    state : dict
+        Incremental state of the previous poll (see `init_state`).
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores, per partition, at the
+        current poll.
+
+    Returns
+    -------
+    state : dict
+        Incremental state of the current poll.
+    deltas : list
+        Delta records of the changes since the previous poll (the loads
+        changes are not recorded).
+    """
+    nodes, membership, first = renormalize_sinfo(state, sinfo)
+    cols = [x for x in nodes.columns if x not in ['node'] + LOAD_COLUMNS]
+    diff = diff_nodes(state['nodes'], nodes, cols)
+    sinfo_cpu = state['sinfo_cpu']
+    rows = state['rows']
+    shared = state['shared']
+    if diff.shape[0]:
+        touched = diff.node.values
+        reprocessed = process_nodes(nodes.loc[nodes.node.isin(touched)])
+        kept = sinfo_cpu.loc[~sinfo_cpu.node.isin(touched)]
+        # same rows order as when processing the full collection
+        sinfo_cpu = pd.concat([kept, reprocessed])
+        order = pd.Index(nodes.node).get_indexer(sinfo_cpu.node)
+        sinfo_cpu = sinfo_cpu.iloc[np.argsort(order, kind='stable')]
+        sinfo_cpu = sinfo_cpu.reset_index(drop=True)
+        # the categories of the kept and re-processed nodes differ
+        apply_schema(sinfo_cpu)
+        rows = np.sort(order)
+        partitions = pd.concat([diff.partitions_old, diff.partitions_new])
+        shared = update_shared(shared, sinfo_cpu,
+                               partitions.dropna().tolist())
+    elif first is not state['first']:
+        # same nodes, but some records were moved
+        rows = get_rows(nodes, sinfo_cpu)
+    refresh_loads(sinfo_cpu, nodes, rows)
+    state = {
+        'nodes': nodes,
+        'membership': membership,
+        'first': first,
+        'sinfo_cpu': sinfo_cpu,
+        'rows': rows,
+        'shared': shared}
+    return state, get_deltas(diff)
+
+
+def write_deltas(deltas: list, snapshot: str) -> str:
+    """
+    Write the delta records of a snapshot next to it, as JSON.
+
+    Parameters
+    ----------
+    deltas : list
+        Delta records of the changes since the previous snapshot.
+    snapshot : str
+        Path to the snapshot file.
+
+    Returns
+    -------
+    output : str
+        Path to the "<snapshot>.delta.json" file.
+    """
+    output = '%s.delta.json' % snapshot_stem(snapshot)
+    atomic_write(output, lambda o: json.dump(deltas, o))
+    return output
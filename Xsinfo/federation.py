@@ -0,0 +1,141 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Federated collection of several Slurm clusters, queried concurrently and
+merged into one sinfo table with a "cluster" column."""
+
+import sys
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from Xsinfo.collect import get_sinfo
+
+# seconds after which the sinfo of a cluster is killed (slow controller)
+CLUSTER_TIMEOUT = 30.
+
+
+def parse_clusters(clusters: str) -> list:
+    """
+    Parse the clusters to federate, e.g. "a,b" or "a,b=/etc/slurm-b.conf".
+
+    Parameters
+    ----------
+    clusters : str
+        Comma-separated cluster names, each queried with `sinfo --clusters`
+        or, if followed by "=<path>", with this Slurm configuration file.
+
+    Returns
+    -------
+    clusters : list
+        (name, slurm.conf path or None) of each cluster.
+
+    Raises
+    ------
+    ValueError
+        If a cluster name is empty or repeated.
+    """
+    parsed = []
+    for cluster in clusters.split(','):
+        name, _, slurm_conf = cluster.strip().partition('=')
+        name = name.strip()
+        if not name or ':' in name or '+' in name:
+            raise ValueError('Invalid cluster name "%s"' % name)
+        if name in dict(parsed):
+            raise ValueError('Cluster "%s" given twice' % name)
+        parsed.append((name, slurm_conf.strip() or None))
+    return parsed
+
+
+def collect_cluster(name: str, slurm_conf: str = None,
+                    timeout: float = CLUSTER_TIMEOUT,
+                    filters: dict = None) -> pd.DataFrame:
+    """
+    Collect the nodes usage of one cluster.
+
+    The node names are qualified by the cluster name (e.g. "a:c1-1"), so
+    that the nodes of different clusters never collide once merged.
+
+    Parameters
+    ----------
+    name : str
+        Cluster name.
+    slurm_conf : str
+        Slurm configuration file of the cluster (default to the name being
+        queried with `sinfo --clusters`).
+    timeout : float
+        Number of seconds after which sinfo is killed.
+    filters : dict
+        Nodes filters (see `Xsinfo.filters.parse_filters`), on the node names
+        of the cluster (i.e. not qualified).
+
+    Returns
+    -------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores, with a "cluster" column.
+    """
+    sinfo = get_sinfo(cluster=None if slurm_conf else name,
+                      slurm_conf=slurm_conf, timeout=timeout, filters=filters)
+    sinfo['node'] = name + ':' + sinfo.node
+    sinfo.insert(0, 'cluster', name)
+    return sinfo
+
+
+def collect_clusters(clusters: list, timeout: float = CLUSTER_TIMEOUT,
+                     collect=collect_cluster,
+                     filters: dict = None) -> pd.DataFrame:
+    """
+    Collect the nodes usage of several clusters concurrently.
+
+    A cluster that fails or times out is reported on stderr and left out of
+    the merged table, so that one slow controller does not block the others.
+    The timeout is a single deadline for the whole collection of each
+    cluster (i.e. running sinfo and parsing its output).
+
+    Parameters
+    ----------
+    clusters : list
+        (name, slurm.conf path or None) of each cluster.
+    timeout : float
+        Number of seconds after which the collection of each cluster is left
+        out (and its sinfo killed).
+    collect : callable
+        Function collecting one cluster (see `collect_cluster`).
+    filters : dict
+        Nodes filters (see `Xsinfo.filters.parse_filters`).
+
+    Returns
+    -------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores of all the clusters.
+
+    Raises
+    ------
+    OSError
+        If no cluster could be collected.
+    """
+    # sinfo runs in subprocesses, so threads are enough to wait for them all
+    deadline = time.monotonic() + timeout
+    pool = ThreadPoolExecutor(max_workers=len(clusters))
+    futures = [(name, pool.submit(collect, name, slurm_conf, timeout, filters))
+               for name, slurm_conf in clusters]
+    # the late clusters are not waited for (their sinfo is killed anyway)
+    pool.shutdown(wait=False)
+    tables = []
+    for name, future in futures:
+        try:
+            tables.append(future.result(
+                timeout=max(0., deadline - time.monotonic())))
+        except TimeoutError:
+            print('> Cluster %s left out: not collected within %ss' % (
+                name, timeout), file=sys.stderr)
+        except (OSError, ValueError) as err:
+            print('> Cluster %s left out: %s' % (name, err), file=sys.stderr)
+    if not tables:
+        raise OSError('No cluster could be collected: %s' % ', '.join(
+            [name for name, _ in clusters]))
+    sinfo = pd.concat(tables, ignore_index=True)
+    return sinfo
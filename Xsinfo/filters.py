@@ -0,0 +1,219 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Selection of the nodes to report by partition, state and name.
+
+The filters are pushed down to sinfo (-p, -t and -n) so that the controller
+only sends the relevant records, and applied to the nodes table for what sinfo
+cannot express (glob patterns, unknown states) or does not filter (pbsnodes,
+the partitions of the `sinfo --json` nodes records, snapshots)."""
+
+from fnmatch import fnmatchcase
+
+from Xsinfo.hostlist import split_hostlist, expand_hostlist
+
+# states accepted by `sinfo --states`, and the start of the long states
+# (`sinfo -O StateLong`) that they select
+SINFO_STATES = {
+    'alloc': 'allocated', 'allocated': 'allocated',
+    'comp': 'completing', 'completing': 'completing',
+    'down': 'down', 'drain': 'drain', 'drained': 'drained',
+    'draining': 'draining', 'fail': 'fail', 'failing': 'failing',
+    'future': 'future', 'futr': 'future', 'idle': 'idle', 'maint': 'maint',
+    'mix': 'mixed', 'mixed': 'mixed', 'planned': 'planned',
+    'resv': 'reserved', 'reserved': 'reserved',
+    'unk': 'unknown', 'unknown': 'unknown'}
+# flags appended to the long states, e.g. "down*" for a non-responding node
+STATE_FLAGS = '*~#!%$@^-'
+GLOB_CHARS = '*?'
+
+
+def parse_filters(partitions: str = None, states: str = None,
+                  nodes: str = None) -> dict:
+    """
+    Parse the nodes filters given on the command line.
+
+    Parameters
+    ----------
+    partitions : str
+        Comma-separated partition names or glob patterns (e.g. "gpu*").
+    states : str
+        Comma-separated node states (e.g. "idle,mix"), case-insensitive.
+    nodes : str
+        Hostlist expression (e.g. "c1-[1-4],c2-*"), possibly with glob
+        patterns.
+
+    Returns
+    -------
+    filters : dict
+        "partitions", "states" and "nodes" lists of the given filters, or
+        None if no filter is given.
+
+    Raises
+    ------
+    ValueError
+        If a filter is empty or the hostlist expression is invalid.
+    """
+    filters = {}
+    for key, value in [('partitions', partitions), ('states', states),
+                       ('nodes', nodes)]:
+        if value is None:
+            continue
+        if key == 'nodes':
+            values = split_hostlist(value)
+        else:
+            values = [x.strip() for x in value.split(',') if x.strip()]
+        if key == 'states':
+            values = [x.lower() for x in values]
+        if not values:
+            raise ValueError('Empty %s filter' % key[:-1])
+        filters[key] = values
+    return filters or None
+
+
+def is_glob(pattern: str) -> bool:
+    """Whether a partition or node name is a glob pattern."""
+    return any(char in pattern for char in GLOB_CHARS)
+
+
+def split_filters(filters: dict) -> tuple:
+    """
+    Split the filters into the sinfo arguments applying them and the filters
+    that sinfo cannot express.
+
+    Parameters
+    ----------
+    filters : dict
+        Nodes filters (see `parse_filters`), or None.
+
+    Returns
+    -------
+    args : list
+        sinfo arguments (-p, -t and -n).
+    rest : dict
+        Filters to apply to the sinfo table (see `filter_sinfo`), or None.
+    """
+    args, rest = [], {}
+    for key, values in (filters or {}).items():
+        if key == 'states':
+            pushed = all(x in SINFO_STATES for x in values)
+        else:
+            pushed = not any(is_glob(x) for x in values)
+        if pushed:
+            args.extend([{'partitions': '-p', 'states': '-t',
+                          'nodes': '-n'}[key], ','.join(values)])
+        else:
+            rest[key] = values
+    return args, rest or None
+
+
+def match_names(names: list, patterns: list) -> list:
+    """
+    Match names against partition names or hostlist expressions.
+
+    Parameters
+    ----------
+    names : list
+        Distinct names, e.g. partitions or nodes.
+    patterns : list
+        Names, hostlist expressions or glob patterns.
+
+    Returns
+    -------
+    matches : list
+        Whether each name matches one of the patterns.
+    """
+    exact = set()
+    globs = []
+    for pattern in patterns:
+        if is_glob(pattern):
+            globs.append(pattern)
+        else:
+            exact.update(expand_hostlist(pattern))
+    return [name in exact or any(fnmatchcase(name, x) for x in globs)
+            for name in names]
+
+
+def match_states(statuses: list, states: list) -> list:
+    """
+    Match node states as `sinfo --states` does, i.e. on any of the states of
+    a combined state (e.g. "idle+planned"), and ignoring the flags (e.g. the
+    "*" of a non-responding node).
+
+    Parameters
+    ----------
+    statuses : list
+        Distinct long states of the nodes (e.g. "mixed", "drained*").
+    states : list
+        Requested states, lowercase (e.g. "mix", "drain"), also abbreviated.
+
+    Returns
+    -------
+    matches : list
+        Whether each status matches one of the states.
+    """
+    prefixes = tuple(SINFO_STATES.get(x, x) for x in states)
+    matches = []
+    for status in statuses:
+        parts = str(status).lower().rstrip(STATE_FLAGS).split('+')
+        matches.append(any(x.rstrip(STATE_FLAGS).startswith(prefixes)
+                           for x in parts))
+    return matches
+
+
+def filter_sinfo(sinfo, filters: dict):
+    """
+    Keep the nodes selected by the filters.
+
+    Each filter is matched on the distinct values of its column only, and
+    the nodes of a processed table (one row per node, with the comma-separated
+    "partitions") only keep the selected partitions, as when sinfo filters
+    them.
+
+    Parameters
+    ----------
+    sinfo : pd.DataFrame
+        sinfo about the nodes, one row per node and partition ("partition"
+        column) or one row per node ("partitions" column).
+    filters : dict
+        Nodes filters (see `parse_filters`), or None.
+
+    Returns
+    -------
+    sinfo : pd.DataFrame
+        Rows of the selected nodes (and partitions).
+    """
+    import numpy as np
+    import pandas as pd
+    if not filters:
+        return sinfo
+    keep = np.ones(sinfo.shape[0], dtype=bool)
+    partitions = None
+    if 'partitions' in filters:
+        col = 'partition' if 'partition' in sinfo.columns else 'partitions'
+        codes, uniques = pd.factorize(sinfo[col].astype(str))
+        kept = []
+        for value in uniques:
+            parts = value.split(',')
+            matches = match_names([x.rstrip('*') for x in parts],
+                                  filters['partitions'])
+            kept.append(','.join([x for x, m in zip(parts, matches) if m]))
+        partitions = np.asarray(kept, dtype=object)[codes]
+        keep &= partitions != ''
+    if 'states' in filters:
+        codes, uniques = pd.factorize(sinfo.status.astype(str))
+        keep &= np.asarray(match_states(uniques, filters['states']),
+                           dtype=bool)[codes]
+    if 'nodes' in filters:
+        # federated nodes are qualified by their cluster (e.g. "a:c1-1")
+        names = sinfo.node.astype(str).str.split(':').str[-1]
+        codes, uniques = pd.factorize(names)
+        keep &= np.asarray(match_names(uniques, filters['nodes']),
+                           dtype=bool)[codes]
+    filtered = sinfo.loc[keep].copy()
+    if partitions is not None and 'partition' not in sinfo.columns:
+        filtered['partitions'] = partitions[keep]
+    return filtered
@@ -0,0 +1,317 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import re
+import numpy as np
+import pandas as pd
+
+from Xsinfo.gres import count_gres_types
+from Xsinfo.hostlist import compress_hostlist
+from Xsinfo.schema import to_display, MIB_PER_GIB
+from Xsinfo.partitions import index_partitions, get_partition_mask
+
+# memory units relative to the unit of the "free_mem" column (GiB), binary as
+# in Slurm (i.e. --mem=1G is 1024M)
+MEM_UNITS = {'K': 1. / MIB_PER_GIB ** 2, 'M': 1. / MIB_PER_GIB, 'G': 1.,
+             'T': float(MIB_PER_GIB)}
+FIT_COLUMNS = ['node', 'partitions', 'cpus_avail', 'free_mem', 'gpus_avail',
+               'cpu_load', 'mem_load']
+
+
+def parse_mem(value) -> float:
+    """
+    Parse an amount of memory such as "200G", "500M" or "1.5T".
+
+    Parameters
+    ----------
+    value : str or float
+        Amount of memory, in GiB if it has no unit.
+
+    Returns
+    -------
+    mem : float
+        Amount of memory in GiB.
+
+    Raises
+    ------
+    ValueError
+        If the amount cannot be parsed.
+    """
+    match = re.fullmatch(r'\s*([0-9.]+)\s*([KMGT]?)B?\s*', str(value), re.I)
+    if not match:
+        raise ValueError('Invalid amount of memory "%s" (e.g. 500M, 200G, '
+                         '1T)' % value)
+    number, unit = match.groups()
+    mem = float(number) * MEM_UNITS[(unit or 'G').upper()]
+    return mem
+
+
+def index_gpu_types(nodes: pd.DataFrame) -> dict:
+    """
+    Get the available GPUs of each type on each node.
+
+    Only the GRES of the nodes having GPUs are parsed.
+
+    Parameters
+    ----------
+    nodes : pd.DataFrame
+        Processed nodes table, with a positional index.
+
+    Returns
+    -------
+    gpu_types : dict
+        Number of available GPUs on each node (array), per GPU type (e.g.
+        "a100", the untyped GPUs being left out).
+    """
+    if 'gres' not in nodes.columns or 'gpus' not in nodes.columns:
+        return {}
+    rows = np.flatnonzero(nodes['gpus'].to_numpy() > 0)
+    gpus = count_gres_types(nodes['gres'].iloc[rows])
+    used = count_gres_types(nodes['gres_used'].iloc[rows]).reindex(
+        columns=gpus.columns, fill_value=0)
+    avail = (gpus - used).clip(lower=0)
+    gpu_types = {}
+    for gpu_type in avail.columns:
+        if gpu_type:
+            gpu_types[gpu_type] = np.zeros(nodes.shape[0], dtype=np.int64)
+            gpu_types[gpu_type][rows] = avail[gpu_type].to_numpy()
+    return gpu_types
+
+
+def index_features(nodes: pd.DataFrame) -> dict:
+    """
+    Get the nodes having each feature.
+
+    Only the few distinct lists of features are split, and their nodes then
+    found by code.
+
+    Parameters
+    ----------
+    nodes : pd.DataFrame
+        Processed nodes table, with a positional index.
+
+    Returns
+    -------
+    features : dict
+        Boolean mask of the nodes having each feature.
+    """
+    if 'features' not in nodes.columns:
+        return {}
+    codes, lists = pd.factorize(nodes['features'].fillna('').astype(str))
+    sets = {}
+    for code, features in enumerate(lists):
+        for feature in features.split(','):
+            if feature:
+                sets.setdefault(feature, []).append(code)
+    features = dict((feature, np.isin(codes, set_codes))
+                    for feature, set_codes in sets.items())
+    return features
+
+
+def index_nodes(sinfo_cpu: pd.DataFrame) -> dict:
+    """
+    Index the processed nodes table once for any number of fit queries.
+
+    Parameters
+    ----------
+    sinfo_cpu : pd.DataFrame
+        sinfo about the nodes with available cores expanded per current usage.
+
+    Returns
+    -------
+    index : dict
+        "nodes": the nodes table (with a positional index),
+        "cpus"/"mem"/"gpus": the available cores, free memory (floats, nan
+        if unknown) and available GPUs of the nodes,
+        "cpus_order"/"cpus_sorted": node positions sorted per available
+        cores, and these sorted numbers of cores,
+        "mem_order"/"mem_sorted": node positions sorted per free memory
+        (nodes with unknown free memory excluded), and these sorted amounts,
+        "partitions": boolean mask of the nodes of each partition (without
+        the "*" marking the default partition),
+        "gpu_types": available GPUs of each node per GPU type (see
+        `index_gpu_types`),
+        "features": boolean mask of the nodes having each feature.
+    """
+    nodes = sinfo_cpu.reset_index(drop=True)
+    if 'gpus_avail' not in nodes.columns:
+        # snapshots processed before the GPUs were counted
+        nodes['gpus_avail'] = 0
+    cpus = nodes.cpus_avail.to_numpy(dtype=float)
+    cpus_order = np.argsort(cpus, kind='stable')
+    mem = nodes.free_mem.to_numpy(dtype=float)
+    mem_order = np.argsort(mem, kind='stable')
+    mem_order = mem_order[~np.isnan(mem[mem_order])]
+    # rows of the partition x node bitmap, i.e. without copies
+    bitmap = index_partitions(nodes)
+    partitions = dict((partition, get_partition_mask(bitmap, partition))
+                      for partition in bitmap['rows'])
+    index = {
+        'nodes': nodes,
+        'cpus': cpus,
+        'mem': mem,
+        'gpus': nodes.gpus_avail.to_numpy(),
+        'cpus_order': cpus_order,
+        'cpus_sorted': cpus[cpus_order],
+        'mem_order': mem_order,
+        'mem_sorted': mem[mem_order],
+        'partitions': partitions,
+        'gpu_types': index_gpu_types(nodes),
+        'features': index_features(nodes)}
+    return index
+
+
+def fit_nodes(index: dict, cpus: int = 1, mem: float = 0., nodes: int = 1,
+              partition: str = None, gpus: int = 0, gpu_type: str = None,
+              features: list = None) -> pd.DataFrame:
+    """
+    Find the nodes on which cores, memory and GPUs can be allocated right now.
+
+    The nodes having enough available cores and enough free memory are found
+    by binary search in the sorted indexes, and only the smallest of these
+    two candidate sets is checked against the other resource. Candidates are
+    ranked best-fit first (i.e. fewest GPUs, then cores, then memory left
+    once allocated, and lowest cpu load), to keep the largest nodes for the
+    largest requests and the GPU nodes for the GPU requests.
+
+    Parameters
+    ----------
+    index : dict
+        Indexed nodes table (see `index_nodes`).
+    cpus : int
+        Number of cores needed on each node.
+    mem : float
+        Amount of memory (in GiB) needed on each node.
+    nodes : int
+        Number of nodes needed.
+    partition : str
+        Only consider the nodes of this partition.
+    gpus : int
+        Number of GPUs needed on each node.
+    gpu_type : str
+        Type of the GPUs needed (e.g. "a100"), at least one if `gpus` is 0.
+    features : list
+        Only consider the nodes having all these features.
+
+    Returns
+    -------
+    fits : pd.DataFrame
+        Candidate nodes, ranked, or an empty table if fewer than `nodes`
+        nodes fit (with the available GPUs of `gpu_type` as "gpus_avail").
+    """
+    table = index['nodes']
+    lo_cpus = np.searchsorted(index['cpus_sorted'], cpus, side='left')
+    by_cpus = index['cpus_order'][lo_cpus:]
+    if mem > 0:
+        lo_mem = np.searchsorted(index['mem_sorted'], mem, side='left')
+        by_mem = index['mem_order'][lo_mem:]
+        if by_mem.size < by_cpus.size:
+            candidates = by_mem[index['cpus'][by_mem] >= cpus]
+        else:
+            candidates = by_cpus[index['mem'][by_cpus] >= mem]
+    else:
+        candidates = by_cpus
+    gpus_avail = index['gpus']
+    if gpu_type is not None:
+        gpus = max(gpus, 1)
+        gpus_avail = index['gpu_types'].get(
+            gpu_type, np.zeros(table.shape[0], dtype=np.int64))
+    if gpus > 0:
+        candidates = candidates[gpus_avail[candidates] >= gpus]
+    masks = []
+    if partition is not None:
+        masks.append(index['partitions'].get(partition.rstrip('*')))
+    masks.extend(index['features'].get(feature) for feature in features or [])
+    for mask in masks:
+        if mask is None:
+            candidates = candidates[:0]
+        else:
+            candidates = candidates[mask[candidates]]
+    if candidates.size < nodes:
+        candidates = candidates[:0]
+    fits = table.iloc[candidates][FIT_COLUMNS]
+    if gpu_type is not None:
+        fits = fits.assign(gpus_avail=gpus_avail[candidates].astype(
+            table.gpus_avail.dtype))
+    fits = fits.sort_values(['gpus_avail', 'cpus_avail', 'free_mem',
+                             'cpu_load'], kind='stable')
+    return fits
+
+
+def show_fit(fits: pd.DataFrame, cpus: int, mem: float, nodes: int,
+             gpus: int = 0, gpu_type: str = None,
+             features: list = None) -> None:
+    """
+    Show the nodes to use and the other candidate nodes for a request.
+
+    Parameters
+    ----------
+    fits : pd.DataFrame
+        Ranked candidate nodes (see `fit_nodes`).
+    cpus : int
+        Number of cores needed on each node.
+    mem : float
+        Amount of memory (in GiB) needed on each node.
+    nodes : int
+        Number of nodes needed.
+    gpus : int
+        Number of GPUs needed on each node.
+    gpu_type : str
+        Type of the GPUs needed.
+    features : list
+        Features of the nodes needed.
+    """
+    if gpu_type is not None:
+        gpus = '%s %s' % (max(gpus, 1), gpu_type)
+    need = '%s cpus%s and %gGiB' % (
+        cpus, ', %s gpus' % gpus if gpus else '', mem)
+    if features:
+        need = '%s (%s)' % (need, ','.join(features))
+    if not fits.shape[0]:
+        print('# No %s node(s) with %s free' % (nodes, need))
+        return
+    print('# %s node(s) with %s free: %s' % (
+        nodes, need, compress_hostlist(fits.node.iloc[:nodes])))
+    print('\t'.join(FIT_COLUMNS))
+    for row in to_display(fits).values.tolist():
+        print('\t'.join('nan' if x is pd.NA else str(x) for x in row))
+
+
+def run_fit(sinfo_cpu: pd.DataFrame, cpus: int, mem: float, nodes: int,
+            partition: str = None, gpus: int = 0, gpu_type: str = None,
+            features: list = None) -> pd.DataFrame:
+    """
+    Find and show the nodes on which a request can be placed right now.
+
+    Parameters
+    ----------
+    sinfo_cpu : pd.DataFrame
+        sinfo about the nodes with available cores expanded per current usage.
+    cpus : int
+        Number of cores needed on each node.
+    mem : float
+        Amount of memory (in GiB) needed on each node.
+    nodes : int
+        Number of nodes needed.
+    partition : str
+        Only consider the nodes of this partition.
+    gpus : int
+        Number of GPUs needed on each node.
+    gpu_type : str
+        Type of the GPUs needed (e.g. "a100").
+    features : list
+        Only consider the nodes having all these features.
+
+    Returns
+    -------
+    fits : pd.DataFrame
+        Candidate nodes, ranked, or an empty table if fewer than `nodes`
+        nodes fit.
+    """
+    fits = fit_nodes(index_nodes(sinfo_cpu), cpus, mem, nodes, partition,
+                     gpus, gpu_type, features)
+    show_fit(fits, cpus, mem, nodes, gpus, gpu_type, features)
+    return fits
@@ -0,0 +1,344 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Forecast of the cores and memory becoming available, from the end times of
+the running jobs (as estimated by Slurm from their time limits), so that a
+node whose jobs finish in 5 minutes can be preferred to a node half-loaded
+for days."""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from Xsinfo.collect import get_sinfo, run_sinfo
+from Xsinfo.hostlist import expand_hostlist
+from Xsinfo.schema import mib_to_gib, apply_schema, MIB_PER_GIB
+from Xsinfo.xsinfo import (
+    normalize_sinfo, expand_cpus, change_dtypes, expand_gres)
+
+# running jobs: nodes (hostlist), cores, number of nodes, allocated resources
+# (e.g. "cpu=20,mem=20G,node=2", whose memory is that of all the nodes, also
+# for the jobs requesting memory per core, unlike the "%m" of squeue) and end
+# time (e.g. "2022-03-07T12:00:00", or "N/A" without time limit)
+SQUEUE_CMD = ['squeue', '-h', '-t', 'RUNNING', '-O',
+              'NodeList:4096|,NumCPUs:12|,NumNodes:12|,tres-alloc:1024|,'
+              'EndTime:24']
+SQUEUE_COLUMNS = ['nodelist', 'cpus', 'nodes', 'tres', 'end']
+SQUEUE_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+# memory units of squeue, in MiB
+SQUEUE_MEM_UNITS = {'': 1., 'K': 1 / 1024, 'M': 1., 'G': 1024.,
+                    'T': 1024. ** 2}
+# states of the nodes whose cores are given to new jobs once freed (i.e. not
+# down, drained, draining or reserved)
+FORECAST_STATES = ['idle', 'mixed', 'allocated', 'completing']
+
+
+def read_squeue(lines, now: datetime = None) -> pd.DataFrame:
+    """
+    Parse the running jobs listed by `SQUEUE_CMD` into one row per job and
+    node.
+
+    The hostlist of each distinct node list is only expanded once, so that
+    the number of expansions does not grow with the number of jobs (most
+    jobs run on one node, whose name needs no expansion).
+
+    Parameters
+    ----------
+    lines : iterable
+        Output lines of squeue.
+    now : datetime
+        Current time (default to now).
+
+    Returns
+    -------
+    jobs : pd.DataFrame
+        "node", "cpus" (cores of the job on the node, i.e. evenly split across
+        its nodes), "mem" (MiB on the node, split likewise) and "end" (seconds
+        until the job ends, 0 if overdue, inf without time limit).
+    """
+    if now is None:
+        now = datetime.now()
+    rows = [[field.strip() for field in line.split('|')]
+            for line in lines if line.strip()]
+    rows = [row for row in rows if len(row) == len(SQUEUE_COLUMNS)]
+    jobs = pd.DataFrame(rows, columns=SQUEUE_COLUMNS)
+    n_nodes = pd.to_numeric(jobs.nodes, errors='coerce').fillna(1).clip(1)
+    cpus = pd.to_numeric(jobs.cpus, errors='coerce').fillna(0) // n_nodes
+    mem = jobs.tres.astype(str).str.upper().str.extract(
+        r'(?:^|,)MEM=([0-9.]+)([KMGT]?)')
+    mem = pd.to_numeric(mem[0], errors='coerce').fillna(0) * mem[1].fillna(
+        '').map(SQUEUE_MEM_UNITS) / n_nodes
+    end = pd.to_datetime(jobs.end, format=SQUEUE_TIME_FORMAT, errors='coerce')
+    end = ((end - pd.Timestamp(now)).dt.total_seconds()).clip(lower=0)
+    # one expansion per distinct node list
+    names = dict((nodelist, expand_hostlist(nodelist))
+                 for nodelist in pd.unique(jobs.nodelist))
+    jobs = pd.DataFrame({
+        'node': jobs.nodelist.map(names), 'cpus': cpus.astype('int64'),
+        'mem': mem.astype(float), 'end': end.fillna(np.inf).astype(float)})
+    jobs = jobs.explode('node', ignore_index=True)
+    jobs = jobs.loc[jobs.node.notna()].reset_index(drop=True)
+    return jobs
+
+
+def get_squeue(now: datetime = None, timeout: float = None) -> pd.DataFrame:
+    """
+    Run squeue and parse the running jobs (see `read_squeue`).
+
+    Parameters
+    ----------
+    now : datetime
+        Current time (default to now).
+    timeout : float
+        Number of seconds after which squeue is killed.
+
+    Returns
+    -------
+    jobs : pd.DataFrame
+        Cores, memory and end of each running job, per node.
+    """
+    out = run_sinfo(SQUEUE_CMD, timeout=timeout)
+    return read_squeue(out.splitlines(), now)
+
+
+def get_forecast_table(sinfo: pd.DataFrame) -> pd.DataFrame:
+    """
+    Get the current usage of the nodes whose cores can be given to new jobs,
+    including the fully allocated ones (that the processed nodes table leaves
+    out).
+
+    Parameters
+    ----------
+    sinfo : pd.DataFrame
+        sinfo about the nodes, per partition (as collected).
+
+    Returns
+    -------
+    nodes : pd.DataFrame
+        One row per node, with the available cores ("cpus_avail"), free
+        memory (GiB, as "free_mem" of the processed nodes table), the loads and
+        the available GPUs.
+    """
+    nodes, _ = normalize_sinfo(sinfo)
+    states = nodes.status.astype(str).str.rstrip('*~#!%$@^-+')
+    nodes = expand_cpus(nodes.loc[states.isin(FORECAST_STATES).values])
+    nodes = nodes.reset_index(drop=True)
+    change_dtypes(nodes)
+    expand_gres(nodes)
+    return nodes
+
+
+def get_releases(jobs: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sum the cores and memory released on each node at each job end time.
+
+    Parameters
+    ----------
+    jobs : pd.DataFrame
+        Running jobs, per node (see `read_squeue`).
+
+    Returns
+    -------
+    releases : pd.DataFrame
+        "node", "end" (seconds), and the "cpus" and "mem" (MiB) released.
+    """
+    releases = jobs.groupby(['node', 'end'], sort=False, as_index=False)[
+        ['cpus', 'mem']].sum()
+    return releases
+
+
+def forecast_nodes(nodes: pd.DataFrame, jobs: pd.DataFrame,
+                   within: float) -> pd.DataFrame:
+    """
+    Get the cores and memory of each node that will be available within a
+    delay, once its jobs ending by then are done.
+
+    The jobs are matched to the nodes by hashing (i.e. in time linear in the
+    number of jobs plus nodes), and the jobs of unknown nodes (e.g. of
+    drained nodes) are ignored.
+
+    Parameters
+    ----------
+    nodes : pd.DataFrame
+        Current usage of the nodes (see `get_forecast_table`).
+    jobs : pd.DataFrame
+        Running jobs, per node (see `read_squeue`).
+    within : float
+        Delay, in seconds.
+
+    Returns
+    -------
+    forecast : pd.DataFrame
+        The nodes having available cores within the delay, with their
+        "cpus_avail" and "free_mem" (GiB) at that time.
+    """
+    ending = jobs.loc[jobs.end <= within]
+    released = ending.groupby('node', sort=False)[['cpus', 'mem']].sum()
+    released = released.reindex(nodes.node, fill_value=0)
+    forecast = nodes.copy()
+    forecast['cpus_avail'] = np.minimum(
+        forecast.cpus_avail + released.cpus.to_numpy(dtype=float),
+        (forecast.total - forecast.other).astype(float))
+    released_mem = mib_to_gib(released.mem)
+    forecast['free_mem'] = np.minimum(forecast.free_mem + released_mem,
+                                      mib_to_gib(forecast.mem))
+    # back to the dtypes of the nodes table (e.g. 128 cores, not 128.0)
+    apply_schema(forecast)
+    forecast = forecast.loc[forecast.cpus_avail > 0].reset_index(drop=True)
+    return forecast
+
+
+def forecast_partitions(nodes: pd.DataFrame,
+                        jobs: pd.DataFrame) -> pd.DataFrame:
+    """
+    Get the step function of the cores and memory available in each
+    partition over time, as the running jobs end.
+
+    Parameters
+    ----------
+    nodes : pd.DataFrame
+        Current usage of the nodes (see `get_forecast_table`).
+    jobs : pd.DataFrame
+        Running jobs, per node (see `read_squeue`).
+
+    Returns
+    -------
+    steps : pd.DataFrame
+        Per partition (without the "*" of the default partition), sorted by
+        time: the "end" (seconds, 0 for the current availability) from which
+        "cpus_avail" cores and "free_mem" GiB are available in the partition.
+    """
+    membership = nodes[['node', 'partitions']].assign(
+        partition=nodes.partitions.str.split(',')).explode('partition')
+    membership['partition'] = membership.partition.str.rstrip('*')
+    membership = membership[['node', 'partition']]
+    now = nodes[['node', 'cpus_avail', 'free_mem']].rename(
+        columns={'free_mem': 'mem'}).assign(end=0.)
+    releases = get_releases(jobs)
+    # only the nodes whose cores can be given to new jobs
+    releases = releases.loc[releases.node.isin(nodes.node)]
+    releases = releases.rename(columns={'cpus': 'cpus_avail'}).assign(
+        mem=releases.mem / MIB_PER_GIB)
+    changes = pd.concat([now, releases], ignore_index=True).sort_values(
+        ['node', 'end'], kind='stable')
+    # capped at the cores and memory of each node (as in `forecast_nodes`),
+    # i.e. the release that would go beyond only adds what is left
+    caps = nodes.set_index('node')
+    caps = pd.DataFrame({
+        'cpus_avail': (caps.total - caps.other).astype(float),
+        'mem': mib_to_gib(caps.mem).astype(float)}).reindex(changes.node)
+    per_node = changes.groupby('node', sort=False)
+    for col in ['cpus_avail', 'mem']:
+        available = np.minimum(
+            per_node[col].cumsum().to_numpy(dtype=float),
+            caps[col].to_numpy())
+        changes[col] = available - pd.Series(
+            available, index=changes.index).groupby(
+                changes.node.values, sort=False).shift(fill_value=0.)
+    changes = changes.merge(membership, on='node')
+    steps = changes.groupby(['partition', 'end'], as_index=False)[
+        ['cpus_avail', 'mem']].sum()
+    steps[['cpus_avail', 'free_mem']] = steps.groupby('partition')[
+        ['cpus_avail', 'mem']].cumsum().values
+    steps['free_mem'] = np.floor(steps.free_mem)
+    steps = steps[['partition', 'end', 'cpus_avail', 'free_mem']]
+    return steps
+
+
+def sample_forecast(steps: pd.DataFrame, horizons: list) -> pd.DataFrame:
+    """
+    Get the cores and memory available in each partition at some delays.
+
+    Parameters
+    ----------
+    steps : pd.DataFrame
+        Step function of each partition (see `forecast_partitions`).
+    horizons : list
+        Delays, in seconds (0 for now).
+
+    Returns
+    -------
+    forecast : pd.DataFrame
+        "partition", "within" (seconds), "cpus_avail" and "free_mem" (GiB).
+    """
+    forecast = []
+    for partition, partition_steps in steps.groupby('partition', sort=True):
+        ends = partition_steps.end.to_numpy()
+        rows = np.searchsorted(ends, horizons, side='right') - 1
+        for within, row in zip(horizons, rows):
+            forecast.append([partition, within] + partition_steps[
+                ['cpus_avail', 'free_mem']].iloc[max(row, 0)].tolist())
+    forecast = pd.DataFrame(forecast, columns=[
+        'partition', 'within', 'cpus_avail', 'free_mem'])
+    return forecast
+
+
+def show_forecast(forecast: pd.DataFrame) -> None:
+    """
+    Show the cores and memory available in each partition at some delays.
+
+    Parameters
+    ----------
+    forecast : pd.DataFrame
+        Availability per partition and delay (see `sample_forecast`).
+    """
+    print('partition\twithin(min)\tcpus\tmem(gb)')
+    for partition, within, cpus, mem in forecast.values.tolist():
+        print('%s\t%g\t%d\t%d' % (partition, within / 60, cpus, mem))
+
+
+def collect_forecast(timeout: float = None, filters: dict = None) -> tuple:
+    """
+    Collect the current usage of the nodes and their running jobs.
+
+    Parameters
+    ----------
+    timeout : float
+        Number of seconds after which sinfo or squeue is killed.
+    filters : dict
+        Only collect the nodes selected by these filters (see
+        `Xsinfo.filters.parse_filters`), whose other jobs are then ignored.
+
+    Returns
+    -------
+    nodes : pd.DataFrame
+        Current usage of the nodes (see `get_forecast_table`).
+    jobs : pd.DataFrame
+        Running jobs, per node (see `read_squeue`).
+    """
+    now = datetime.now()
+    nodes = get_forecast_table(get_sinfo(timeout=timeout, filters=filters))
+    jobs = get_squeue(now, timeout)
+    return nodes, jobs
+
+
+def run_forecast(horizons: list, partition: str = None,
+                 filters: dict = None) -> pd.DataFrame:
+    """
+    Collect the nodes and running jobs, and show the cores and memory
+    available in each partition at some delays.
+
+    Parameters
+    ----------
+    horizons : list
+        Delays, in seconds.
+    partition : str
+        Only show this partition.
+    filters : dict
+        Only count the nodes selected by these filters (see
+        `Xsinfo.filters.parse_filters`).
+
+    Returns
+    -------
+    forecast : pd.DataFrame
+        Availability per partition and delay (see `sample_forecast`).
+    """
+    steps = forecast_partitions(*collect_forecast(filters=filters))
+    if partition is not None:
+        steps = steps.loc[steps.partition == partition.rstrip('*')]
+    forecast = sample_forecast(steps, horizons)
+    show_forecast(forecast)
+    return forecast
@@ -0,0 +1,92 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Parsing of the generic resources (GRES) of the nodes, as printed by sinfo
+in the "Gres" and "GresUsed" fields, e.g. "gpu:a100:4(S:0-1),shard:8"."""
+
+import pandas as pd
+
+# one "<name>[:<type>]:<count>" item of a comma-separated GRES list (once the
+# parenthesized socket/index details are removed), e.g. "gpu:a100:4"
+GRES_PATTERN = (r'(?:^|,)(?P<name>[^:,]+)(?::(?P<type>[^:,]*))?'
+                r':(?P<count>\d+)(?P<unit>[KMGT]?)(?=,|$)')
+# multipliers of the count suffixes
+GRES_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3,
+              'T': 1024 ** 4}
+
+
+def parse_gres(gres: pd.Series) -> pd.DataFrame:
+    """
+    Parse the GRES lists of the nodes into one row per node and resource.
+
+    Parameters
+    ----------
+    gres : pd.Series
+        GRES list of each node, e.g. "gpu:a100:4(S:0-1)", "gpu:2,shard:8",
+        "gpu:a100:2(IDX:0-1)" (for used GRES) or "(null)".
+
+    Returns
+    -------
+    items : pd.DataFrame
+        Resource "name", "type" ("" if untyped) and "count" (int), indexed by
+        the index of the node in `gres` (level 0) and the item (level 1).
+    """
+    items = gres.fillna('').astype(str).str.replace(
+        r'\([^)]*\)', '', regex=True).str.extractall(GRES_PATTERN)
+    items['type'] = items['type'].fillna('')
+    items['count'] = items['count'].astype('int64') * items['unit'].fillna(
+        '').map(GRES_UNITS).astype('int64')
+    items = items.drop(columns='unit')
+    return items
+
+
+def count_gres(gres: pd.Series, name: str = 'gpu') -> pd.Series:
+    """
+    Count one generic resource on each node, all its types together.
+
+    Parameters
+    ----------
+    gres : pd.Series
+        GRES list of each node (see `parse_gres`).
+    name : str
+        Resource name, e.g. "gpu".
+
+    Returns
+    -------
+    counts : pd.Series
+        Number of this resource on each node (0 if it has none).
+    """
+    items = parse_gres(gres)
+    counts = items.loc[items.name == name, 'count'].groupby(level=0).sum()
+    counts = counts.reindex(gres.index, fill_value=0).astype('int64')
+    return counts
+
+
+def count_gres_types(gres: pd.Series, name: str = 'gpu') -> pd.DataFrame:
+    """
+    Count one generic resource on each node, per type.
+
+    Parameters
+    ----------
+    gres : pd.Series
+        GRES list of each node (see `parse_gres`).
+    name : str
+        Resource name, e.g. "gpu".
+
+    Returns
+    -------
+    counts : pd.DataFrame
+        Number of this resource on each node (rows, 0 if it has none) per
+        type (columns, sorted, "" for the untyped ones).
+    """
+    items = parse_gres(gres)
+    items = items.loc[items.name == name]
+    nodes = items.index.get_level_values(0)
+    counts = items['count'].groupby([nodes, items['type']]).sum().unstack(
+        fill_value=0)
+    counts = counts.reindex(index=gres.index, fill_value=0).astype('int64')
+    counts.columns.name = None
+    return counts
@@ -0,0 +1,387 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Append-only history of the nodes usage, in a SQLite file, to query the
+usage trends (e.g. when is a partition usually free) over weeks.
+
+Each collection adds one row per node to a "samples" table indexed by node and
+time, with the node names dictionary-encoded (integer ids) and the values as
+integers (loads in hundredths of a unit). The values of a row are sums over
+its "n" collections, so that old rows can be merged into coarser time buckets
+(downsampling) while keeping exact averages, and are removed after a while
+(retention). The values that are unknown for some nodes (e.g. the load of a
+down node) also have their number of known values ("<value>_n"), by which
+their sums are averaged. The partitions of each node are recorded with the
+period during which the node belonged to them ("since" and "until", NULL
+while it still does), so that a node moved to another partition is counted
+in each of them at the time of its samples (i.e. at the start of their time
+bucket once downsampled)."""
+
+import sqlite3
+import pandas as pd
+from datetime import datetime
+
+from Xsinfo.gres import count_gres
+from Xsinfo.hostlist import expand_hostlist
+from Xsinfo.schema import MIB_PER_GIB
+from Xsinfo.xsinfo import normalize_sinfo, expand_cpus
+
+# (age, resolution) in seconds: rows older than the age are merged into
+# buckets of the resolution, e.g. 5 minutes after a day, 1 hour after a week
+HISTORY_POLICY = [(86400, 300), (7 * 86400, 3600)]
+# rows older than this are removed (seconds)
+HISTORY_KEEP = 90 * 86400
+# summed values of each sample (loads in hundredths, free memory in MiB)
+HISTORY_VALUES = ['allocated', 'cpus_avail', 'total', 'cpu_load', 'mem_load',
+                  'free_mem', 'gpus_used', 'gpus']
+# values that can be unknown (NULL), with their number of known values
+HISTORY_COUNTED = ['cpu_load', 'mem_load', 'free_mem']
+HISTORY_BY = {
+    'node': 'nodes.name',
+    'partition': 'partitions.name',
+    'time': 's.time',
+    'day': "date(s.time, 'unixepoch', 'localtime')",
+    'weekday': "CAST(strftime('%w', s.time, 'unixepoch', 'localtime') AS INT)",
+    'hour': "CAST(strftime('%H', s.time, 'unixepoch', 'localtime') AS INT)"}
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS partitions (
+    id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS node_partitions (
+    node_id INTEGER NOT NULL, partition_id INTEGER NOT NULL,
+    since INTEGER NOT NULL, until INTEGER,
+    PRIMARY KEY (node_id, partition_id, since)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS samples (
+    node_id INTEGER NOT NULL, time INTEGER NOT NULL, n INTEGER NOT NULL,
+    allocated INTEGER, cpus_avail INTEGER, total INTEGER, cpu_load INTEGER,
+    mem_load INTEGER, free_mem INTEGER, gpus_used INTEGER, gpus INTEGER,
+    cpu_load_n INTEGER, mem_load_n INTEGER, free_mem_n INTEGER,
+    PRIMARY KEY (node_id, time)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS samples_time ON samples (time);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+"""
+
+
+def connect_history(path: str) -> sqlite3.Connection:
+    """
+    Open (or create) a history file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the SQLite history file.
+
+    Returns
+    -------
+    con : sqlite3.Connection
+        Connection, in WAL mode so that readers do not block the daemon.
+    """
+    con = sqlite3.connect(path, timeout=30)
+    con.execute('PRAGMA journal_mode=WAL')
+    con.executescript(HISTORY_SCHEMA)
+    upgrade_history(con)
+    return con
+
+
+def upgrade_history(con: sqlite3.Connection) -> None:
+    """
+    Upgrade an older history file: add the numbers of known values to the
+    samples, as all the collections of a row for the known values (exact for
+    the rows of one collection, i.e. that were not downsampled), and the
+    periods of the partitions of the nodes, as always (since 0, until NULL).
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection to the history file.
+    """
+    columns = [x[1] for x in con.execute(
+        'PRAGMA table_info(node_partitions)')]
+    if 'since' not in columns:
+        with con:
+            con.execute('ALTER TABLE node_partitions RENAME TO '
+                        'node_partitions_old')
+            con.executescript(HISTORY_SCHEMA)
+            con.execute('INSERT INTO node_partitions SELECT node_id, '
+                        'partition_id, 0, NULL FROM node_partitions_old')
+            con.execute('DROP TABLE node_partitions_old')
+    columns = [x[1] for x in con.execute('PRAGMA table_info(samples)')]
+    missing = [x for x in HISTORY_COUNTED if '%s_n' % x not in columns]
+    if not missing:
+        return
+    with con:
+        for col in missing:
+            con.execute('ALTER TABLE samples ADD COLUMN %s_n INTEGER' % col)
+            con.execute('UPDATE samples SET %(col)s_n = CASE WHEN %(col)s IS '
+                        'NULL THEN 0 ELSE n END' % {'col': col})
+
+
+def get_history_table(sinfo: pd.DataFrame) -> pd.DataFrame:
+    """
+    Get the usage of all the nodes (i.e. also those without available cores,
+    that are left out of the processed nodes table).
+
+    Parameters
+    ----------
+    sinfo : pd.DataFrame
+        sinfo about the nodes, per partition (as collected).
+
+    Returns
+    -------
+    usage : pd.DataFrame
+        "node", "partitions" and the `HISTORY_VALUES` of each node, as
+        nullable integers.
+    """
+    nodes, _ = normalize_sinfo(sinfo)
+    usage = expand_cpus(nodes)
+    free_mem = usage.free_mem.astype(float)
+    usage['mem_load'] = 100 * (1 - free_mem / usage.mem.astype(float))
+    usage['mem_load'] = usage.mem_load.clip(0) * 100
+    usage['cpu_load'] = usage.cpu_load.astype(float) * 100
+    usage['free_mem'] = free_mem
+    for col, gres in [('gpus', 'gres'), ('gpus_used', 'gres_used')]:
+        if gres in usage.columns:
+            usage[col] = count_gres(usage[gres])
+        else:
+            usage[col] = 0
+    usage = usage[['node', 'partitions'] + HISTORY_VALUES]
+    usage = usage.astype({col: float for col in HISTORY_VALUES})
+    usage = usage.round().astype({col: 'Int64' for col in HISTORY_VALUES})
+    return usage
+
+
+def get_ids(con: sqlite3.Connection, table: str, names: list) -> dict:
+    """Get the integer id of each name of a dictionary table ("nodes" or
+    "partitions"), adding the new names."""
+    con.executemany('INSERT OR IGNORE INTO %s (name) VALUES (?)' % table,
+                    [(name,) for name in names])
+    ids = dict((name, idx) for idx, name in con.execute(
+        'SELECT id, name FROM %s' % table))
+    return ids
+
+
+def update_membership(con: sqlite3.Connection, membership: list,
+                      time: int) -> None:
+    """
+    Close the periods of the partitions that the collected nodes left, and
+    open those of the partitions they joined.
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection to the history file (in a transaction).
+    membership : list
+        (node id, partition id) of the collected nodes.
+    time : int
+        Collection time (seconds since the epoch).
+    """
+    current = set(membership)
+    nodes = set(node for node, _ in membership)
+    recorded = set(con.execute('SELECT node_id, partition_id FROM '
+                               'node_partitions WHERE until IS NULL'))
+    con.executemany(
+        'UPDATE node_partitions SET until = ? WHERE node_id = ? AND '
+        'partition_id = ? AND until IS NULL',
+        [(time, node, partition) for node, partition in recorded - current
+         if node in nodes])
+    con.executemany(
+        'INSERT OR REPLACE INTO node_partitions VALUES (?, ?, ?, NULL)',
+        [(node, partition, time) for node, partition in current - recorded])
+
+
+def record_history(path: str, sinfo: pd.DataFrame, taken: datetime,
+                   policy: list = HISTORY_POLICY,
+                   keep: float = HISTORY_KEEP) -> int:
+    """
+    Append the usage of all the nodes at one collection time to the history,
+    then downsample and remove its old rows.
+
+    Parameters
+    ----------
+    path : str
+        Path to the SQLite history file.
+    sinfo : pd.DataFrame
+        sinfo about the nodes, per partition (as collected).
+    taken : datetime
+        Collection time.
+    policy : list
+        (age, resolution) in seconds of the downsampling levels.
+    keep : float
+        Number of seconds after which the rows are removed (None to keep all).
+
+    Returns
+    -------
+    rows : int
+        Number of node rows recorded.
+    """
+    usage = get_history_table(sinfo)
+    time = int(taken.timestamp())
+    con = connect_history(path)
+    try:
+        with con:
+            node_ids = get_ids(con, 'nodes', usage.node.tolist())
+            membership = [(node_ids[node], partition.rstrip('*'))
+                          for node, partitions in zip(usage.node,
+                                                      usage.partitions)
+                          for partition in partitions.split(',') if partition]
+            partition_ids = get_ids(
+                con, 'partitions', sorted(set(x for _, x in membership)))
+            update_membership(con, [(node, partition_ids[x])
+                                    for node, x in membership], time)
+            values = usage[HISTORY_VALUES].astype(object).where(
+                usage[HISTORY_VALUES].notna(), None).values.tolist()
+            known = usage[HISTORY_COUNTED].notna().astype(int).values.tolist()
+            con.executemany(
+                'INSERT OR REPLACE INTO samples VALUES (%s)' % ', '.join(
+                    ['?'] * (3 + len(HISTORY_VALUES) + len(HISTORY_COUNTED))),
+                [[node_ids[node], time, 1] + row + counts
+                 for node, row, counts in zip(usage.node, values, known)])
+            downsample_history(con, time, policy)
+            if keep is not None:
+                con.execute('DELETE FROM samples WHERE time < ?',
+                            (time - int(keep),))
+                con.execute('DELETE FROM node_partitions WHERE until < ?',
+                            (time - int(keep),))
+    finally:
+        con.close()
+    return usage.shape[0]
+
+
+def downsample_history(con: sqlite3.Connection, now: int,
+                       policy: list = HISTORY_POLICY) -> None:
+    """
+    Merge the rows older than the age of each downsampling level into time
+    buckets of its resolution (i.e. one row per node and bucket).
+
+    Only the rows that became older than the age of a level since its last
+    run are merged, so that the cost does not grow with the history.
+
+    Parameters
+    ----------
+    con : sqlite3.Connection
+        Connection to the history file (in a transaction).
+    now : int
+        Current time (seconds since the epoch).
+    policy : list
+        (age, resolution) in seconds of the downsampling levels.
+    """
+    sums = ', '.join(['SUM(%s)' % x for x in ['n'] + HISTORY_VALUES + [
+        '%s_n' % x for x in HISTORY_COUNTED]])
+    for age, resolution in sorted(policy):
+        key = 'downsampled_%s' % resolution
+        row = con.execute('SELECT value FROM meta WHERE key = ?',
+                          (key,)).fetchone()
+        start = row[0] if row else 0
+        end = (now - age) // resolution * resolution
+        if end <= start:
+            continue
+        con.execute('DROP TABLE IF EXISTS temp.buckets')
+        con.execute(
+            'CREATE TEMP TABLE buckets AS SELECT node_id, '
+            'time / %(res)s * %(res)s AS time, %(sums)s FROM samples '
+            'WHERE time >= ? AND time < ? GROUP BY node_id, time / %(res)s' % {
+                'res': int(resolution), 'sums': sums}, (start, end))
+        con.execute('DELETE FROM samples WHERE time >= ? AND time < ?',
+                    (start, end))
+        con.execute('INSERT INTO samples SELECT * FROM temp.buckets')
+        con.execute('DROP TABLE temp.buckets')
+        con.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, end))
+
+
+def query_history(path: str, since: datetime = None, until: datetime = None,
+                  by: str = 'node', nodes: str = None,
+                  partition: str = None) -> pd.DataFrame:
+    """
+    Get the average usage per node, partition or time over a period.
+
+    Only the rows of the period (and nodes or partition) are read, by time
+    (or node) index, and aggregated by SQLite.
+
+    Parameters
+    ----------
+    path : str
+        Path to the SQLite history file.
+    since : datetime
+        Start of the period (default to the first record).
+    until : datetime
+        End of the period (default to now).
+    by : str
+        Aggregate per "node", "partition", "time" (collection or bucket),
+        "day", "weekday" (0 is Sunday) or "hour" (of the day).
+    nodes : str
+        Only these nodes (hostlist, e.g. "c1-[1-4]").
+    partition : str
+        Only the nodes of this partition.
+
+    Returns
+    -------
+    usage : pd.DataFrame
+        Per `by` value: number of node samples ("samples") and nodes, the
+        percent of allocated cores ("cpu_usage"), the average available cores,
+        cpu load, memory load, free memory (GiB) and available GPUs of the
+        nodes (the loads and free memory of the nodes reporting them).
+    """
+    if by not in HISTORY_BY:
+        raise ValueError('History can be aggregated by %s (not "%s")' % (
+            ', '.join(HISTORY_BY), by))
+    joins = ['JOIN nodes ON nodes.id = s.node_id']
+    where, params = [], []
+    if by == 'partition' or partition:
+        # the partitions of the node at the time of the sample
+        joins += ['JOIN node_partitions np ON np.node_id = s.node_id AND '
+                  's.time >= np.since AND (np.until IS NULL OR '
+                  's.time < np.until)',
+                  'JOIN partitions ON partitions.id = np.partition_id']
+    if partition:
+        where.append('partitions.name = ?')
+        params.append(partition.rstrip('*'))
+    if since is not None:
+        where.append('s.time >= ?')
+        params.append(int(since.timestamp()))
+    if until is not None:
+        where.append('s.time < ?')
+        params.append(int(until.timestamp()))
+    if nodes:
+        names = expand_hostlist(nodes)
+        where.append('nodes.name IN (%s)' % ', '.join(['?'] * len(names)))
+        params.extend(names)
+    query = (
+        'SELECT %(by)s, SUM(s.n), COUNT(DISTINCT s.node_id), '
+        '100.0 * SUM(s.allocated) / SUM(s.total), '
+        '1.0 * SUM(s.cpus_avail) / SUM(s.n), '
+        'SUM(s.cpu_load) / 100.0 / SUM(s.cpu_load_n), '
+        'SUM(s.mem_load) / 100.0 / SUM(s.mem_load_n), '
+        'SUM(s.free_mem) / %(gib)s / SUM(s.free_mem_n), '
+        '1.0 * SUM(s.gpus - s.gpus_used) / SUM(s.n) '
+        'FROM samples s %(joins)s %(where)s GROUP BY 1 ORDER BY 1' % {
+            'by': HISTORY_BY[by], 'joins': ' '.join(joins),
+            'gib': float(MIB_PER_GIB),
+            'where': 'WHERE %s' % ' AND '.join(where) if where else ''})
+    con = connect_history(path)
+    try:
+        rows = con.execute(query, params).fetchall()
+    finally:
+        con.close()
+    usage = pd.DataFrame(rows, columns=[
+        by, 'samples', 'nodes', 'cpu_usage', 'cpus_avail', 'cpu_load',
+        'mem_load', 'free_mem', 'gpus_avail'])
+    return usage.round(4)
+
+
+def show_history(usage: pd.DataFrame) -> None:
+    """
+    Show the usage per node, partition or time.
+
+    Parameters
+    ----------
+    usage : pd.DataFrame
+        Average usage (see `query_history`).
+    """
+    print('\t'.join(usage.columns))
+    # as objects, so that the integer columns are not printed as floats
+    for row in usage.astype(object).values.tolist():
+        print('\t'.join(['' if x != x else str(x) for x in row]))
@@ -0,0 +1,222 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Compression and expansion of node names following Slurm's hostlist grammar,
+e.g. "c1-[1-3,7],gpu-a100-[0099-0101]" <-> c1-1, c1-2, c1-3, c1-7,
+gpu-a100-0099, gpu-a100-0100, gpu-a100-0101.
+
+Only the last numeric group of each name is ranged when compressing (as does
+Slurm), while any number of bracketed groups can be expanded.
+"""
+
+from itertools import product
+
+
+def split_name(name: str) -> tuple:
+    """
+    Split a node name around its last group of digits.
+
+    Parameters
+    ----------
+    name : str
+        Node name, e.g. "gpu-a100-0123".
+
+    Returns
+    -------
+    prefix : str
+        Characters before the last group of digits, e.g. "gpu-a100-".
+    digits : str
+        Last group of digits, e.g. "0123" (empty if the name has no digit).
+    suffix : str
+        Characters after the last group of digits.
+    """
+    end = len(name)
+    while end and not name[end - 1].isdigit():
+        end -= 1
+    start = end
+    while start and name[start - 1].isdigit():
+        start -= 1
+    return name[:start], name[start:end], name[end:]
+
+
+def get_ranges(numbers: list, width: int) -> str:
+    """
+    Get the condensed ranges of sorted and unique numbers.
+
+    Parameters
+    ----------
+    numbers : list
+        Sorted, unique integers.
+    width : int
+        Number of digits to zero-pad the numbers to.
+
+    Returns
+    -------
+    ranges : str
+        Comma-separated ranges, e.g. "1-3,7".
+    """
+    ranges = []
+    start = prev = numbers[0]
+    for number in numbers[1:] + [None]:
+        if number is not None and number == prev + 1:
+            prev = number
+            continue
+        if start == prev:
+            ranges.append('%0*d' % (width, start))
+        else:
+            ranges.append('%0*d-%0*d' % (width, start, width, prev))
+        start = prev = number
+    return ','.join(ranges)
+
+
+def compress_hostlist(names) -> str:
+    """
+    Compress node names into a Slurm hostlist expression.
+
+    Names are grouped per prefix, suffix and zero-padding of their last
+    numeric group, in order of first appearance, and each group is written
+    as "prefix[ranges]suffix" (or as the single name if the group has one
+    node). Duplicated names are only listed once.
+
+    Parameters
+    ----------
+    names : iterable
+        Node names.
+
+    Returns
+    -------
+    hostlist : str
+        Hostlist expression, e.g. "c1-[1-3,7],c6-5,login".
+    """
+    # numbers with a leading zero keep their width, others are unpadded (0)
+    groups = {}
+    for name in names:
+        prefix, digits, suffix = split_name(name)
+        if not digits:
+            groups.setdefault((name, None, ''), set())
+            continue
+        width = len(digits) if digits[0] == '0' and len(digits) > 1 else 0
+        groups.setdefault((prefix, width, suffix), set()).add(int(digits))
+    # unpadded numbers as long as a padded group join it (e.g. 0999 and 1000)
+    for (prefix, width, suffix), numbers in list(groups.items()):
+        if width == 0:
+            for number in list(numbers):
+                padded = (prefix, len(str(number)), suffix)
+                if padded in groups:
+                    groups[padded].add(number)
+                    numbers.remove(number)
+            if not numbers:
+                del groups[(prefix, width, suffix)]
+
+    hostlist = []
+    for (prefix, width, suffix), numbers in groups.items():
+        if width is None:
+            hostlist.append(prefix)
+        elif len(numbers) == 1:
+            hostlist.append('%s%0*d%s' % (prefix, width, min(numbers), suffix))
+        else:
+            hostlist.append('%s[%s]%s' % (
+                prefix, get_ranges(sorted(numbers), width), suffix))
+    return ','.join(hostlist)
+
+
+def split_hostlist(hostlist: str) -> list:
+    """
+    Split a hostlist expression on the commas that are outside brackets.
+
+    Parameters
+    ----------
+    hostlist : str
+        Hostlist expression, e.g. "c1-[1-3,7],c6-5".
+
+    Returns
+    -------
+    hosts : list
+        Host expressions, e.g. ["c1-[1-3,7]", "c6-5"].
+
+    Raises
+    ------
+    ValueError
+        If the brackets are unbalanced.
+    """
+    hosts, depth, start = [], 0, 0
+    for idx, char in enumerate(hostlist):
+        if char == '[':
+            depth += 1
+        elif char == ']':
+            depth -= 1
+        elif char == ',' and not depth:
+            hosts.append(hostlist[start:idx])
+            start = idx + 1
+        if depth not in (0, 1):
+            raise ValueError('Unbalanced brackets in hostlist "%s"' % hostlist)
+    if depth:
+        raise ValueError('Unbalanced brackets in hostlist "%s"' % hostlist)
+    hosts.append(hostlist[start:])
+    return [x.strip() for x in hosts if x.strip()]
+
+
+def expand_ranges(ranges: str) -> list:
+    """
+    Expand the comma-separated ranges of a bracket, keeping zero-padding.
+
+    Parameters
+    ----------
+    ranges : str
+        Bracket content, e.g. "01-03,7".
+
+    Returns
+    -------
+    numbers : list
+        Numbers as strings, e.g. ["01", "02", "03", "7"].
+
+    Raises
+    ------
+    ValueError
+        If a range is not made of digits or is decreasing.
+    """
+    numbers = []
+    for rng in ranges.split(','):
+        lo, _, hi = rng.strip().partition('-')
+        hi = hi or lo
+        if not (lo.isdigit() and hi.isdigit()) or int(hi) < int(lo):
+            raise ValueError('Invalid hostlist range "%s"' % rng)
+        width = len(lo) if lo[0] == '0' else 0
+        numbers.extend(['%0*d' % (width, x)
+                        for x in range(int(lo), int(hi) + 1)])
+    return numbers
+
+
+def expand_hostlist(hostlist: str) -> list:
+    """
+    Expand a Slurm hostlist expression into node names.
+
+    Parameters
+    ----------
+    hostlist : str
+        Hostlist expression, possibly with several bracketed groups per name,
+        e.g. "rack[1-2]-n[01-02],login".
+
+    Returns
+    -------
+    names : list
+        Node names, e.g. ["rack1-n01", "rack1-n02", "rack2-n01", "rack2-n02",
+        "login"].
+    """
+    names = []
+    for host in split_hostlist(hostlist):
+        parts, pos = [], 0
+        while True:
+            start = host.find('[', pos)
+            if start < 0:
+                parts.append([host[pos:]])
+                break
+            end = host.index(']', start)
+            parts.append([host[pos:start]])
+            parts.append(expand_ranges(host[start + 1:end]))
+            pos = end + 1
+        names.extend([''.join(x) for x in product(*parts)])
+    return names
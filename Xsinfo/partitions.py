@@ -0,0 +1,162 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Partition x node bitmap index of a nodes table, from which the partitions
+sharing nodes, their overlaps and their exclusive nodes are computed with
+array operations (and that other queries can reuse, e.g. to restrict a fit
+to the nodes of a partition)."""
+
+import numpy as np
+import pandas as pd
+
+from Xsinfo.hostlist import compress_hostlist
+
+
+def index_partitions(sinfo_cpu: pd.DataFrame) -> dict:
+    """
+    Index the nodes of each partition as a boolean matrix.
+
+    Parameters
+    ----------
+    sinfo_cpu : pd.DataFrame
+        Nodes table, one row per node with the comma-separated partitions of
+        the node ("partitions").
+
+    Returns
+    -------
+    index : dict
+        "nodes": the node names (in the order of the table),
+        "partitions": the partition names (sorted, with the "*" of the
+        default partition),
+        "matrix": boolean matrix of the nodes (columns) of each partition
+        (rows),
+        "rows": row of each partition in the matrix, by name without "*".
+    """
+    nodes = sinfo_cpu.node.to_numpy(dtype=object)
+    # only the few distinct sets of partitions are split, and their columns
+    # are then broadcast to their nodes
+    sets, unique_sets = pd.factorize(sinfo_cpu.partitions.astype(str))
+    split = [x.split(',') for x in unique_sets]
+    partitions = sorted(set(x for parts in split for x in parts))
+    rows = dict((name, row) for row, name in enumerate(partitions))
+    set_matrix = np.zeros((len(partitions), len(split)), dtype=bool)
+    for col, parts in enumerate(split):
+        set_matrix[[rows[x] for x in parts], col] = True
+    matrix = set_matrix[:, sets]
+    partitions = np.asarray(partitions, dtype=object)
+    index = {
+        'nodes': nodes,
+        'partitions': partitions,
+        'matrix': matrix,
+        'rows': dict((name.rstrip('*'), row)
+                     for row, name in enumerate(partitions))}
+    return index
+
+
+def get_partition_mask(index: dict, partition: str) -> np.ndarray:
+    """
+    Get the boolean mask of the nodes of a partition.
+
+    Parameters
+    ----------
+    index : dict
+        Partition index (see `index_partitions`).
+    partition : str
+        Partition name (with or without the "*" of the default partition).
+
+    Returns
+    -------
+    mask : np.ndarray
+        Nodes of the partition (a view of the index, not to be modified), or
+        None for an unknown partition.
+    """
+    row = index['rows'].get(partition.rstrip('*'))
+    if row is None:
+        return None
+    return index['matrix'][row]
+
+
+def get_overlaps(index: dict) -> pd.DataFrame:
+    """
+    Get the number of nodes shared by each pair of partitions.
+
+    Parameters
+    ----------
+    index : dict
+        Partition index (see `index_partitions`).
+
+    Returns
+    -------
+    overlaps : pd.DataFrame
+        Number of nodes in both the partition of the row and of the column
+        (i.e. the number of nodes of each partition on the diagonal).
+    """
+    matrix = index['matrix'].astype(np.int64)
+    overlaps = pd.DataFrame(matrix @ matrix.T, index=index['partitions'],
+                            columns=index['partitions'])
+    return overlaps
+
+
+def get_exclusive_nodes(index: dict) -> dict:
+    """
+    Get the nodes that belong to only one partition.
+
+    Parameters
+    ----------
+    index : dict
+        Partition index (see `index_partitions`).
+
+    Returns
+    -------
+    exclusive : dict
+        Condensed node names (values) per partition (keys), for the
+        partitions having nodes of their own.
+    """
+    matrix = index['matrix']
+    single = matrix.sum(axis=0) == 1
+    exclusive = {}
+    for partition, mask in zip(index['partitions'], matrix & single):
+        if mask.any():
+            exclusive[partition] = compress_hostlist(
+                sorted(index['nodes'][mask]))
+    return exclusive
+
+
+def group_nodes(index: dict) -> dict:
+    """
+    Group the nodes that belong to the same set of partitions.
+
+    The partitions of each node (matrix column) are packed into a bitset, so
+    that the nodes are grouped by the unique bitsets.
+
+    Parameters
+    ----------
+    index : dict
+        Partition index (see `index_partitions`).
+
+    Returns
+    -------
+    groups : dict
+        Condensed node names (values) per set of comma-separated partitions
+        (keys, sorted).
+    """
+    nodes, matrix = index['nodes'], index['matrix']
+    if not nodes.size:
+        return {}
+    order = np.argsort(nodes, kind='stable')
+    bitsets = np.packbits(matrix[:, order], axis=0).T
+    _, first, groups = np.unique(bitsets, axis=0, return_index=True,
+                                 return_inverse=True)
+    groups = groups.reshape(-1)
+    by_group = order[np.argsort(groups, kind='stable')]
+    sizes = np.bincount(groups, minlength=first.size)
+    shared = {}
+    for column, members in zip(first, np.split(by_group,
+                                               np.cumsum(sizes)[:-1])):
+        parts = ','.join(index['partitions'][matrix[:, order[column]]])
+        shared[parts] = compress_hostlist(nodes[members])
+    shared = dict(sorted(shared.items()))
+    return shared
@@ -0,0 +1,243 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Renderers of the nodes usage (see `Xsinfo.xsinfo.get_cluster_state` and
+`Xsinfo.xsinfo.summarize`) as text, TSV or JSON, kept apart from the data."""
+
+import json
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+# pandas is only imported when needed, so that a cached summary can be
+# rendered without it (see `Xsinfo.summary`)
+if TYPE_CHECKING:
+    import pandas as pd
+
+SUMMARY_COLUMNS = ['load', 'cpus', 'mem', 'av', 'sd', 'nodes', 'names']
+# the stats per gpu load also have the available GPUs
+GPU_SUMMARY_COLUMNS = ['load', 'gpus'] + SUMMARY_COLUMNS[1:]
+SUMMARY_LABELS = {'load': '%', 'mem': 'mem(gb)', 'sd': '±'}
+NODES_COLUMNS = {'cpu_load': 'cpu%', 'cpus_avail': 'freecpu',
+                 'mem_load': 'mem%', 'free_mem': 'freemem'}
+# only shown if some nodes have GPUs
+GPU_NODES_COLUMNS = {'gpus_avail': 'freegpu'}
+
+
+def get_summary_columns(by: str) -> list:
+    """Get the columns of the nodes stats per "cpu", "mem" or "gpu" load."""
+    if by == 'gpu':
+        return GPU_SUMMARY_COLUMNS
+    return SUMMARY_COLUMNS
+
+
+def render_read(snapshot: str, taken: datetime) -> str:
+    """
+    Render the snapshot that was read instead of running sinfo, and its age.
+
+    Parameters
+    ----------
+    snapshot : str
+        Path to the snapshot file.
+    taken : datetime
+        Collection time of the snapshot.
+
+    Returns
+    -------
+    text : str
+        Snapshot path and age.
+    """
+    age = (datetime.now() - taken).total_seconds()
+    return '> Read %s (%ss old)' % (snapshot, round(age))
+
+
+def render_shared(shared: dict) -> str:
+    """
+    Render the partitions sharing the same nodes.
+
+    Parameters
+    ----------
+    shared : dict
+        Condensed node names (values) per set of partitions (keys).
+
+    Returns
+    -------
+    text : str
+        Nodes per set of partitions.
+    """
+    lines = ['\n%s\nAvailable nodes/cpus across partitions:' % ('-' * 35)]
+    for parts, nodes in shared.items():
+        lines.append(' - %s \t:\t %s' % (parts, nodes))
+    lines.append('%s \n' % ('-' * 35))
+    return '\n'.join(lines)
+
+
+def render_summary(summary: dict) -> str:
+    """
+    Render the nodes usage stats per bin of cpu and memory load.
+
+    Parameters
+    ----------
+    summary : dict
+        Nodes stats rows (lists of `get_summary_columns` values) per bin of
+        "cpu", "mem" (and "gpu" or "cpu-mem") load.
+
+    Returns
+    -------
+    text : str
+        Tab-separated stats of each load, after a header.
+    """
+    lines = []
+    for by, rows in summary.items():
+        lines.append('\n# Showing nodes per %s of %s load:' % ('%', by))
+        lines.append('\t'.join([SUMMARY_LABELS.get(x, x)
+                                for x in get_summary_columns(by)]))
+        for row in rows:
+            lines.append('%s%s\t%s' % (row[0], '%', '\t'.join(
+                map(str, row[1:]))))
+    return '\n'.join(lines)
+
+
+def render_nodes(sinfo_cpu: 'pd.DataFrame') -> str:
+    """
+    Render the sinfo table reduced to fields of interest.
+    This can be collect from the stdout by other tools in order to help
+    picking nodes if required (see https://github.com/FranckLejzerowicz/Xpbs).
+
+    Parameters
+    ----------
+    sinfo_cpu : pd.DataFrame
+        sinfo about the nodes with available cores.
+
+    Returns
+    -------
+    text : str
+        Tab-separated loads and free resources of each node, after "##".
+    """
+    import pandas as pd
+    from Xsinfo.schema import to_display
+    names = dict(NODES_COLUMNS)
+    if 'gpus' in sinfo_cpu.columns and (sinfo_cpu.gpus > 0).any():
+        names.update(GPU_NODES_COLUMNS)
+    cols = list(names.values())
+    table = to_display(sinfo_cpu[['node'] + list(names)]).set_index(
+        'node').rename(columns=names)[cols]
+    lines = ['##', '\t%s' % '\t'.join(cols)]
+    for node, *row in zip(table.index, *[table[x].tolist() for x in cols]):
+        # the unknown free memory (missing integer) as the other nan
+        lines.append('%s\t%s' % (node, '\t'.join(
+            'nan' if x is pd.NA else str(x) for x in row)))
+    return '\n'.join(lines)
+
+
+def render_text(state, summary: dict, show: bool = False) -> str:
+    """
+    Render the nodes usage as the human-readable Xsinfo report.
+
+    Parameters
+    ----------
+    state : ClusterState
+        Nodes usage (see `Xsinfo.xsinfo.get_cluster_state`).
+    summary : dict
+        Nodes stats rows per quartile of "cpu" and "mem" load.
+    show : bool
+        Also render the loads and free resources of each node.
+
+    Returns
+    -------
+    text : str
+        Report.
+    """
+    if state.collected:
+        parts = ['> Run %s' % state.command, render_shared(state.shared)]
+        if state.snapshot is not None:
+            parts.append('\n# sinfo written in "%s"' % state.snapshot)
+    else:
+        parts = [render_read(state.snapshot, state.taken)]
+    parts.append(render_summary(summary))
+    if show:
+        parts.append(render_nodes(state.sinfo_cpu))
+    return '\n'.join(parts)
+
+
+def render_tsv(state, summary: dict, show: bool = False) -> str:
+    """
+    Render the nodes usage stats as one table (and the nodes as another).
+
+    Parameters
+    ----------
+    state : ClusterState
+        Nodes usage (see `Xsinfo.xsinfo.get_cluster_state`).
+    summary : dict
+        Nodes stats rows per quartile of "cpu" and "mem" load.
+    show : bool
+        Also render the nodes table, after an empty line.
+
+    Returns
+    -------
+    tsv : str
+        Stats per "by" load ("cpu" or "mem") and quartile ("load").
+    """
+    columns = SUMMARY_COLUMNS
+    if 'gpu' in summary:
+        columns = GPU_SUMMARY_COLUMNS
+    lines = ['\t'.join(['by'] + columns)]
+    for by, rows in summary.items():
+        for row in rows:
+            values = dict(zip(get_summary_columns(by), row))
+            # missing values (e.g. the memory deviation of one node, or the
+            # gpus of the cpu and mem loads) are empty
+            values = [values.get(x, '') for x in columns]
+            lines.append('\t'.join([by] + [
+                '' if x != x else str(x) for x in values]))
+    tsv = '%s\n' % '\n'.join(lines)
+    if show:
+        cols = ['node', 'partitions'] + list(NODES_COLUMNS)
+        if 'gpu' in summary:
+            cols += list(GPU_NODES_COLUMNS)
+        from Xsinfo.schema import to_display
+        nodes = to_display(state.sinfo_cpu[cols])
+        tsv += '\n%s' % nodes.to_csv(sep='\t', index=False)
+    return tsv.rstrip('\n')
+
+
+def render_json(state, summary: dict, show: bool = False) -> str:
+    """
+    Render the nodes usage as one JSON document.
+
+    Parameters
+    ----------
+    state : ClusterState
+        Nodes usage (see `Xsinfo.xsinfo.get_cluster_state`).
+    summary : dict
+        Nodes stats rows per quartile of "cpu" and "mem" load.
+    show : bool
+        Also render the processed nodes table ("nodes").
+
+    Returns
+    -------
+    document : str
+        "snapshot", "taken", "collected", "shared" and "summary" (records
+        per load) keys, and "nodes" if `show`.
+    """
+    document = {
+        'snapshot': state.snapshot,
+        'taken': state.taken.isoformat(),
+        'collected': state.collected,
+        'shared': state.shared,
+        'summary': {x: [dict(zip(get_summary_columns(x), [
+            None if v != v else v for v in row])) for row in rows]
+            for x, rows in summary.items()}}
+    if show:
+        from Xsinfo.schema import to_display
+        document['nodes'] = json.loads(
+            to_display(state.sinfo_cpu).to_json(orient='records'))
+    return json.dumps(document)
+
+
+RENDERERS = {
+    'text': render_text,
+    'tsv': render_tsv,
+    'json': render_json}
@@ -0,0 +1,108 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Schema of the processed nodes table, and the units of its memory columns.
+
+The resources are stored in compact dtypes (cores and GPUs as uint16, the
+memory of the nodes as uint32 MiB), the loads as float32 and the partitions and
+states as categories, which takes about half the memory of the float64 and
+string columns. The memory is converted with binary units (1 GiB = 1024 MiB),
+vectorized, and the unknown free memory of a node stays nan.
+
+This module does not import pandas."""
+
+import numpy as np
+
+MIB_PER_GIB = 1024
+# number of decimals of the loads (%), that float32 keeps
+LOAD_DECIMALS = 4
+# dtype of each column of the processed nodes table
+NODES_DTYPES = {
+    'partitions': 'category',
+    'status': 'category',
+    'socket': 'uint16',
+    'cores': 'uint16',
+    'threads': 'uint16',
+    'allocated': 'uint16',
+    'cpus_avail': 'uint16',
+    'other': 'uint16',
+    'total': 'uint16',
+    # total memory (MiB)
+    'mem': 'uint32',
+    # free memory (whole GiB), float to keep the unknown values (nan)
+    'free_mem': 'float32',
+    'cpu_load': 'float32',
+    'mem_load': 'float32',
+    'gpus': 'uint16',
+    'gpus_used': 'uint16',
+    'gpus_avail': 'uint16',
+    'gpu_load': 'float32'}
+
+
+def mib_to_gib(mib) -> np.ndarray:
+    """
+    Convert amounts of memory from MiB to whole GiB.
+
+    Parameters
+    ----------
+    mib : array-like
+        Amounts of memory (MiB), possibly nan.
+
+    Returns
+    -------
+    gib : np.ndarray
+        Amounts of memory in GiB, rounded down (nan kept).
+    """
+    return np.floor(np.asarray(mib, dtype=float) / MIB_PER_GIB)
+
+
+def apply_schema(table) -> None:
+    """
+    Cast the columns of a nodes table to their dtype of the schema, in place.
+
+    The columns that are not in the table (e.g. the GPUs before they are
+    counted, or in older snapshots) or that already have their dtype are left
+    as they are.
+
+    Parameters
+    ----------
+    table : pd.DataFrame
+        Processed nodes table (see `Xsinfo.xsinfo.process_nodes`).
+    """
+    for col, dtype in NODES_DTYPES.items():
+        if col in table.columns and table[col].dtype != dtype:
+            table[col] = table[col].astype(dtype)
+
+
+def to_display(table):
+    """
+    Get the nodes table with the dtypes in which it is shown or exported.
+
+    The float32 columns become floats rounded to `LOAD_DECIMALS` (i.e. 20.01
+    rather than its float32 approximation 20.010000228881836) and the free
+    memory becomes nullable integers (whole GiB).
+
+    Parameters
+    ----------
+    table : pd.DataFrame
+        Nodes table, or some of its columns.
+
+    Returns
+    -------
+    table : pd.DataFrame
+        Copy of the table.
+    """
+    dtypes = {}
+    for col in table.columns:
+        if col == 'free_mem' and table[col].dtype.kind == 'f':
+            dtypes[col] = 'Int64'
+        elif table[col].dtype == np.float32:
+            dtypes[col] = float
+    table = table.astype(dtypes)
+    rounded = [col for col, dtype in dtypes.items() if dtype is float]
+    if rounded:
+        table[rounded] = table[rounded].round(LOAD_DECIMALS)
+    return table
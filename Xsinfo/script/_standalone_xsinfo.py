@@ -5,28 +5,383 @@
 # ----------------------------------------------------------------------------
 
 import click
-from Xsinfo.xsinfo import run_xsinfo
+from Xsinfo.snapshot import parse_age, SNAPSHOT_FORMATS, SNAPSHOT_FORMAT
 from Xsinfo import __version__
 
 
-@click.command()
+def age_option(ctx, param, value):
+	if value is None:
+		return None
+	try:
+		return parse_age(value)
+	except ValueError as err:
+		raise click.BadParameter(str(err))
+
+
+def ages_option(ctx, param, value):
+	try:
+		return [parse_age(age) for age in value.split(',')]
+	except ValueError as err:
+		raise click.BadParameter(str(err))
+
+
+def start_profile(ctx, profile, cprofile):
+	from Xsinfo.timing import start_trace, stop_trace, write_trace
+	start_trace()
+	profiler = None
+	if cprofile:
+		import cProfile
+		profiler = cProfile.Profile()
+		profiler.enable()
+
+	def report():
+		if profiler is not None:
+			profiler.disable()
+			profiler.dump_stats(cprofile)
+		write_trace(stop_trace(), profile)
+	ctx.call_on_close(report)
+
+
+def clusters_option(ctx, param, value):
+	if value is None:
+		return None
+	from Xsinfo.federation import parse_clusters
+	try:
+		return parse_clusters(value)
+	except ValueError as err:
+		raise click.BadParameter(str(err))
+
+
+@click.group(invoke_without_command=True)
 @click.option(
 	"--torque/--no-torque", default=False, show_default=True,
-	help="Switch from Slurm to Torque."
+	help="Switch from Slurm to Torque (collect the nodes usage with pbsnodes)."
 )
 @click.option(
-	"--refresh", "--no-refresh", default=False, show_default=True,
-	help="Update any sinfo snapshot file written today in ~/.slurm."
+	"--refresh/--no-refresh", default=False, show_default=True,
+	help="Re-collect a sinfo snapshot in ~/.xsinfo even if a recent one exists."
 )
 @click.option(
-	"--show", "--no-show", default=False, show_default=True,
+	"--show/--no-show", default=False, show_default=True,
 	help="Show available cpu and memory per node on top of summaries."
 )
+@click.option(
+	"--snapshot-dir", envvar="XSINFO_SNAPSHOT_DIR", default=None,
+	help="Read the latest snapshot written by `Xsinfo daemon` in this "
+		 "directory instead of running sinfo [env: XSINFO_SNAPSHOT_DIR]."
+)
+@click.option(
+	"--max-age", default="10m", show_default=True, callback=age_option,
+	help="Re-collect the nodes usage if the latest snapshot is older than "
+		 "this (e.g. 90s, 10m, 1h)."
+)
+@click.option(
+	"--format", "fmt", type=click.Choice(SNAPSHOT_FORMATS),
+	default=SNAPSHOT_FORMAT, show_default=True,
+	help="Snapshot file format (feather needs pyarrow, tsv e.g. for Xpbs)."
+)
+@click.option(
+	"--output", type=click.Choice(['text', 'tsv', 'json']), default="text",
+	show_default=True,
+	help="Output format of the nodes usage (tsv and json e.g. for scripts)."
+)
+@click.option(
+	"--clusters", envvar="XSINFO_CLUSTERS", default=None,
+	callback=clusters_option,
+	help="Collect these Slurm clusters concurrently and merge them (e.g. "
+		 "a,b or a,b=/etc/slurm-b/slurm.conf) [env: XSINFO_CLUSTERS]."
+)
+@click.option(
+	"--cluster-timeout", default="30s", show_default=True,
+	callback=age_option,
+	help="Leave out a federated cluster not collected within this delay."
+)
+@click.option(
+	"--partition", "partitions", default=None,
+	help="Only report the nodes of these comma-separated partitions (glob "
+		 "patterns such as gpu* are also accepted)."
+)
+@click.option(
+	"--states", default=None,
+	help="Only report the nodes in these comma-separated states (e.g. "
+		 "idle,mix)."
+)
+@click.option(
+	"--nodelist", default=None,
+	help="Only report these nodes, as a hostlist expression (e.g. "
+		 "c1-[1-8],c2-*)."
+)
+@click.option(
+	"--bins", envvar="XSINFO_BINS", default=None,
+	help="Bins of the loads in the summaries: a number of equal bins (e.g. "
+		 "10) or their edges (e.g. 0,50,80,100) [default: quartiles] "
+		 "[env: XSINFO_BINS]."
+)
+@click.option(
+	"--bins-config", envvar="XSINFO_BINS_CONFIG", default=None,
+	help="JSON file of the bins of each load, e.g. {\"cpu\": 10, \"mem\": "
+		 "[0, 50, 100], \"grid\": true} [env: XSINFO_BINS_CONFIG]."
+)
+@click.option(
+	"--grid/--no-grid", default=False, show_default=True,
+	help="Also summarize the nodes per bins of cpu x mem load."
+)
+@click.option(
+	"--watch", default=None, callback=age_option,
+	help="Keep re-collecting the nodes usage every this often (e.g. 10s) and "
+		 "update the report in place (Ctrl-C to stop)."
+)
+@click.option(
+	"--metrics", default=None,
+	help="With --watch, write the timing of each poll to this file as "
+		 "Prometheus metrics (e.g. for the node exporter textfile collector)."
+)
+@click.option(
+	"--profile", envvar="XSINFO_TRACE", is_flag=False, flag_value="-",
+	default=None,
+	help="Report the wall time, CPU time and rows of each stage on stderr, "
+		 "or in this JSON file [env: XSINFO_TRACE]."
+)
+@click.option(
+	"--cprofile", default=None,
+	help="Also dump the cProfile stats of the run to this file."
+)
 @click.version_option(__version__, prog_name="Xsinfo")
+@click.pass_context
+
+
+def standalone_xsinfo(ctx, torque, refresh, show, snapshot_dir, max_age, fmt,
+					  output, clusters, cluster_timeout, partitions, states,
+					  nodelist, bins, bins_config, grid, watch, metrics, profile, cprofile):
+	if torque and clusters:
+		raise click.UsageError("Only Slurm clusters can be federated.")
+	from Xsinfo.filters import parse_filters
+	try:
+		filters = parse_filters(partitions, states, nodelist)
+	except ValueError as err:
+		raise click.UsageError(str(err))
+	if bins or bins_config or grid:
+		from Xsinfo.bins import get_bins
+		try:
+			bins = get_bins(bins, bins_config, grid)
+		except (OSError, ValueError) as err:
+			raise click.UsageError(str(err))
+	if profile or cprofile:
+		start_profile(ctx, profile, cprofile)
+	ctx.obj = {'refresh': refresh, 'snapshot_dir': snapshot_dir,
+			   'max_age': max_age, 'fmt': fmt,
+			   'backend': 'torque' if torque else 'slurm',
+			   'clusters': clusters, 'timeout': cluster_timeout,
+			   'filters': filters}
+	if ctx.invoked_subcommand is None and watch is not None:
+		from Xsinfo.watch import run_watch
+		try:
+			run_watch(watch, show, ctx.obj['backend'], clusters,
+					  cluster_timeout, metrics=metrics, filters=filters,
+					  bins=bins)
+		except KeyboardInterrupt:
+			pass
+	elif ctx.invoked_subcommand is None:
+		# cache hit fast path: print the summaries of a fresh snapshot, so
+		# that neither pandas nor the snapshot have to be loaded
+		from Xsinfo.summary import show_cached_summary
+		from Xsinfo.timing import timed
+		names = [name for name, _ in clusters or []]
+		cached = False
+		if not (refresh or show or filters or bins):
+			with timed('show_cached_summary'):
+				cached = show_cached_summary(snapshot_dir, max_age, output,
+											 names, ctx.obj['backend'])
+		if not cached:
+			with timed('import'):
+				from Xsinfo.xsinfo import run_xsinfo
+			run_xsinfo(torque, refresh, show, snapshot_dir, max_age, fmt, output,
+					   clusters, cluster_timeout, filters, bins)
+
+
+@standalone_xsinfo.command()
+@click.option(
+	"--snapshot-dir", envvar="XSINFO_SNAPSHOT_DIR", required=True,
+	help="Shared directory in which snapshots are written "
+		 "[env: XSINFO_SNAPSHOT_DIR]."
+)
+@click.option(
+	"--interval", default=60., show_default=True, type=float,
+	help="Number of seconds between two sinfo collections."
+)
+@click.option(
+	"--keep", default=10, show_default=True, type=int,
+	help="Number of most recent snapshots kept in the directory."
+)
+@click.option(
+	"--keep-age", default="1d", show_default=True, callback=age_option,
+	help="Remove the snapshots older than this (e.g. 1h, 1d)."
+)
+@click.option(
+	"--format", "fmt", type=click.Choice(SNAPSHOT_FORMATS),
+	default=SNAPSHOT_FORMAT, show_default=True,
+	help="Snapshot file format (feather needs pyarrow, tsv e.g. for Xpbs)."
+)
+@click.option(
+	"--incremental/--no-incremental", default=False, show_default=True,
+	help="Only re-process the nodes that changed since the previous poll and "
+		 "write their changes in <snapshot>.delta.json."
+)
+@click.option(
+	"--metrics", default=None,
+	help="Write the timing of each poll to this file as Prometheus metrics "
+		 "(e.g. for the node exporter textfile collector)."
+)
+@click.option(
+	"--history", envvar="XSINFO_HISTORY", default=None,
+	help="Also append the usage of all the nodes to this SQLite history file "
+		 "[env: XSINFO_HISTORY]."
+)
+@click.option(
+	"--history-keep", default="90d", show_default=True, callback=age_option,
+	help="Remove the history older than this."
+)
+@click.pass_context
+
+
+def daemon(ctx, snapshot_dir, interval, keep, keep_age, fmt, incremental,
+		   metrics, history, history_keep):
+	"""Poll sinfo and write snapshots shared by all Xsinfo users."""
+	if ctx.obj['filters']:
+		raise click.UsageError(
+			"The daemon snapshots all the nodes: --partition, --states and "
+			"--nodelist do not apply.")
+	from Xsinfo.daemon import run_daemon
+	run_daemon(snapshot_dir, interval, keep, keep_age, fmt, incremental,
+			   backend=ctx.obj['backend'], clusters=ctx.obj['clusters'],
+			   timeout=ctx.obj['timeout'], history=history,
+			   history_keep=history_keep, metrics=metrics)
+
+
+def mem_option(ctx, param, value):
+	from Xsinfo.fit import parse_mem
+	try:
+		return parse_mem(value)
+	except ValueError as err:
+		raise click.BadParameter(str(err))
+
+
+@standalone_xsinfo.command()
+@click.option(
+	"--cpus", default=1, show_default=True, type=click.IntRange(min=1),
+	help="Number of cores needed on each node."
+)
+@click.option(
+	"--mem", default="0", show_default=True, callback=mem_option,
+	help="Amount of memory needed on each node (e.g. 500M, 200G, 1T)."
+)
+@click.option(
+	"--nodes", default=1, show_default=True, type=click.IntRange(min=1),
+	help="Number of nodes needed."
+)
+@click.option(
+	"--partition", default=None,
+	help="Only consider the nodes of this partition."
+)
+@click.option(
+	"--gpus", default=0, show_default=True, type=click.IntRange(min=0),
+	help="Number of GPUs needed on each node."
+)
+@click.option(
+	"--gpu-type", default=None,
+	help="Type of the GPUs needed (e.g. a100), at least one per node."
+)
+@click.option(
+	"--features", default=None,
+	help="Only consider the nodes having all these comma-separated features."
+)
+@click.option(
+	"--within", default=None, callback=age_option,
+	help="Also count the cores and memory of the running jobs that end "
+		 "within this delay (e.g. 30m), from squeue."
+)
+@click.pass_context
+
+
+def fit(ctx, cpus, mem, nodes, partition, gpus, gpu_type, features, within):
+	"""Find the nodes on which cores, memory and GPUs can be allocated now."""
+	from Xsinfo.fit import run_fit
+	if within is None:
+		from Xsinfo.xsinfo import get_cluster_state
+		sinfo_cpu = get_cluster_state(**ctx.obj).sinfo_cpu
+	else:
+		if ctx.obj['backend'] != 'slurm' or ctx.obj['clusters']:
+			raise click.UsageError("--within needs one Slurm cluster.")
+		from Xsinfo.forecast import collect_forecast, forecast_nodes
+		sinfo_cpu = forecast_nodes(
+			*collect_forecast(filters=ctx.obj['filters']), within)
+	if features:
+		features = [x for x in features.split(',') if x]
+	fits = run_fit(sinfo_cpu, cpus, mem, nodes, partition, gpus, gpu_type,
+				   features)
+	if not fits.shape[0]:
+		ctx.exit(1)
+
+
+@standalone_xsinfo.command()
+@click.option(
+	"--within", default="0,15m,1h,4h,1d", show_default=True,
+	callback=ages_option,
+	help="Delays at which to forecast the available cores and memory."
+)
+@click.option(
+	"--partition", default=None,
+	help="Only forecast this partition."
+)
+@click.pass_context
+
+
+def forecast(ctx, within, partition):
+	"""Forecast the cores and memory available per partition as jobs end."""
+	if ctx.obj['backend'] != 'slurm' or ctx.obj['clusters']:
+		raise click.UsageError("The forecast needs one Slurm cluster.")
+	from Xsinfo.forecast import run_forecast
+	run_forecast(within, partition, ctx.obj['filters'])
+
+
+@standalone_xsinfo.command()
+@click.option(
+	"--history", envvar="XSINFO_HISTORY", required=True,
+	help="SQLite history file written by `Xsinfo daemon --history` "
+		 "[env: XSINFO_HISTORY]."
+)
+@click.option(
+	"--since", default="7d", show_default=True, callback=age_option,
+	help="Period of the history to summarize (e.g. 1d, 28d)."
+)
+@click.option(
+	"--by", type=click.Choice(
+		['node', 'partition', 'time', 'day', 'weekday', 'hour']),
+	default="hour", show_default=True,
+	help="Average the usage per node, partition or time (weekday 0 is Sunday)."
+)
+@click.option(
+	"--nodes", default=None,
+	help="Only these nodes (hostlist, e.g. c1-[1-4])."
+)
+@click.option(
+	"--partition", default=None,
+	help="Only the nodes of this partition."
+)
+@click.pass_context
 
 
-def standalone_xsinfo(torque, refresh, show):
-	run_xsinfo(torque, refresh, show)
+def history(ctx, history, since, by, nodes, partition):
+	"""Show the usage trends recorded in the history (e.g. per hour of day)."""
+	if ctx.obj['filters']:
+		raise click.UsageError(
+			"The history is filtered by its own --nodes and --partition "
+			"options (after `history`).")
+	from datetime import datetime, timedelta
+	from Xsinfo.history import query_history, show_history
+	usage = query_history(history, datetime.now() - timedelta(seconds=since),
+						  by=by, nodes=nodes, partition=partition)
+	show_history(usage)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,508 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import os
+import glob
+import tempfile
+from datetime import datetime
+from os.path import basename, dirname, isdir, join
+from typing import NamedTuple, TYPE_CHECKING
+
+# numpy and pandas are only imported to read or write a snapshot, so that
+# finding a fresh snapshot (e.g. on a cache hit) does not pay their import
+if TYPE_CHECKING:
+    import pandas as pd
+
+# snapshots are named after their collection time, so that sorting their
+# names sorts them chronologically
+SNAPSHOT_TIME_FORMAT = '%Y-%m-%dT%H-%M-%S'
+SNAPSHOT_DIR_ENV = 'XSINFO_SNAPSHOT_DIR'
+# snapshots older than this number of seconds are re-collected
+MAX_AGE = 600.
+# bounds on the number and age (in seconds) of the snapshots kept on disk
+KEEP_SNAPSHOTS = 10
+KEEP_SNAPSHOTS_AGE = 24 * 3600.
+AGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# binary formats keep the dtypes (incl. the categorical load bins) and read
+# back without text parsing, while tsv remains for tools such as Xpbs
+SNAPSHOT_FORMATS = ('npz', 'feather', 'tsv')
+SNAPSHOT_FORMAT = 'npz'
+
+
+class ClusterState(NamedTuple):
+    """Nodes usage at a given time, as collected or read from a snapshot."""
+    sinfo_cpu: 'pd.DataFrame'
+    """sinfo about the nodes with available cores expanded per usage"""
+    shared: dict
+    """Condensed node names (values) per set of partitions (keys)"""
+    snapshot: str
+    """Path to the snapshot that was read or written"""
+    taken: datetime
+    """Collection time"""
+    collected: bool
+    """Whether sinfo was run (or the snapshot reused)"""
+    command: str = 'sinfo'
+    """Command run to collect the nodes usage (e.g. "pbsnodes" on Torque)"""
+    filtered: bool = False
+    """Whether only some nodes were kept (so that the snapshot is not used
+    or written for them)"""
+
+
+def parse_age(age: str) -> float:
+    """Parse a duration such as "90", "90s", "10m", "1h" or "2d".
+
+    Parameters
+    ----------
+    age : str
+        Duration, in seconds unless suffixed by a unit (s, m, h or d).
+
+    Returns
+    -------
+    seconds : float
+        Duration in seconds.
+
+    Raises
+    ------
+    ValueError
+        If the duration cannot be parsed.
+    """
+    age = str(age).strip().lower()
+    unit = AGE_UNITS.get(age[-1:])
+    if unit:
+        age = age[:-1]
+    try:
+        seconds = float(age) * (unit or 1)
+    except ValueError:
+        raise ValueError('Invalid duration "%s" (e.g. 90, 90s, 10m, 1h, 2d)'
+                         % age)
+    return seconds
+
+
+def get_cache_dir() -> str:
+    """Get the directory of the current user's own snapshots.
+
+    Returns
+    -------
+    cache_dir : str
+        Path to ~/.xsinfo
+    """
+    cache_dir = '%s/.xsinfo' % os.path.expanduser('~')
+    return cache_dir
+
+
+def get_snapshot_dir(snapshot_dir: str = None) -> str:
+    """Get the directory of the snapshots shared by a collection daemon.
+
+    Parameters
+    ----------
+    snapshot_dir : str
+        Shared snapshots directory, or None to use $XSINFO_SNAPSHOT_DIR.
+
+    Returns
+    -------
+    snapshot_dir : str
+        Shared snapshots directory, or None if no directory is configured.
+    """
+    if not snapshot_dir:
+        snapshot_dir = os.environ.get(SNAPSHOT_DIR_ENV)
+    return snapshot_dir
+
+
+def get_clusters_dir(snapshot_dir: str, clusters: list = None,
+                     backend: str = 'slurm') -> str:
+    """Get the directory of the snapshots of several clusters (federated), or
+    of another scheduler backend than Slurm.
+
+    Parameters
+    ----------
+    snapshot_dir : str
+        Snapshots directory (e.g. ~/.xsinfo), or None.
+    clusters : list
+        Names of the federated clusters, or None for the local cluster.
+    backend : str
+        Scheduler backend collecting the nodes usage (see
+        `Xsinfo.backends.get_backend`).
+
+    Returns
+    -------
+    clusters_dir : str
+        Sub-directory named after the clusters (e.g. ~/.xsinfo/a+b) or after
+        the backend (e.g. ~/.xsinfo/torque), so that their snapshots are never
+        read as those of a single Slurm cluster.
+    """
+    if not snapshot_dir:
+        return snapshot_dir
+    if backend != 'slurm':
+        return join(snapshot_dir, backend)
+    if not clusters:
+        return snapshot_dir
+    clusters_dir = join(snapshot_dir, '+'.join(clusters))
+    return clusters_dir
+
+
+def list_snapshots(snapshot_dir: str) -> list:
+    """List the complete snapshots of a directory, from oldest to newest.
+
+    Parameters
+    ----------
+    snapshot_dir : str
+        Snapshots directory.
+
+    Returns
+    -------
+    snapshots : list
+        Paths to the snapshot files.
+    """
+    snapshots = sorted(
+        [x for x in glob.glob(join(snapshot_dir, '*.*'))
+         if basename(x).count('.') == 1
+         and x.rsplit('.', 1)[-1] in SNAPSHOT_FORMATS], key=basename)
+    return snapshots
+
+
+def is_legacy_snapshot(snapshot: str) -> bool:
+    """Whether a snapshot is a daily snapshot of Xsinfo <= 1.2
+    (YYYY-MM-DD.tsv), i.e. a table per node and partition, without the
+    "partitions" column, that is only listed to be pruned."""
+    name = basename(snapshot).split('.')[0]
+    try:
+        datetime.strptime(name, SNAPSHOT_TIME_FORMAT)
+    except ValueError:
+        return True
+    return False
+
+
+def get_latest_snapshot(snapshot_dir: str) -> str:
+    """Get the most recent snapshot of a directory that can be reused (i.e.
+    not a legacy daily snapshot, see `is_legacy_snapshot`).
+
+    Parameters
+    ----------
+    snapshot_dir : str
+        Snapshots directory.
+
+    Returns
+    -------
+    snapshot : str
+        Path to the newest snapshot file, or None if there is none.
+    """
+    snapshots = [x for x in list_snapshots(snapshot_dir)
+                 if not is_legacy_snapshot(x)]
+    if snapshots:
+        return snapshots[-1]
+    return None
+
+
+def write_npz(table: 'pd.DataFrame', o) -> None:
+    """Write a table as uncompressed NumPy arrays, one (or more) per column.
+
+    Categorical and string columns are stored as integer codes and unicode
+    arrays of their categories / unique values, so that no pickling is needed.
+
+    Parameters
+    ----------
+    table : pd.DataFrame
+        Table to write.
+    o : file
+        Binary file object (or path) to write the .npz archive to.
+    """
+    import numpy as np
+    import pandas as pd
+    arrays, kinds = {}, []
+    for col in table.columns:
+        values = table[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays['%s.codes' % col] = values.cat.codes.values
+            arrays['%s.categories' % col] = np.asarray(
+                values.cat.categories.astype(str), dtype=str)
+            kinds.append('ordered' if values.cat.ordered else 'category')
+        elif values.dtype.kind in 'biuf':
+            arrays[col] = values.values
+            kinds.append(values.dtype.str)
+        else:
+            # dictionary-encoded (node names repeat across partitions)
+            codes, uniques = pd.factorize(values)
+            arrays['%s.codes' % col] = codes.astype(np.int32)
+            arrays['%s.categories' % col] = np.asarray(uniques, dtype=str)
+            kinds.append('str')
+    arrays['__columns__'] = np.asarray(table.columns.astype(str), dtype=str)
+    arrays['__kinds__'] = np.asarray(kinds, dtype=str)
+    np.savez(o, **arrays)
+
+
+def read_npz(path: str) -> 'pd.DataFrame':
+    """Read a table written by `write_npz`.
+
+    Parameters
+    ----------
+    path : str
+        Path to the .npz archive.
+
+    Returns
+    -------
+    table : pd.DataFrame
+        Table with its original dtypes.
+    """
+    import numpy as np
+    import pandas as pd
+    data = {}
+    with np.load(path, allow_pickle=False) as npz:
+        columns = npz['__columns__'].tolist()
+        for col, kind in zip(columns, npz['__kinds__'].tolist()):
+            if kind in ('category', 'ordered'):
+                data[col] = pd.Categorical.from_codes(
+                    npz['%s.codes' % col], npz['%s.categories' % col],
+                    ordered=kind == 'ordered')
+            elif kind == 'str':
+                codes = npz['%s.codes' % col]
+                # code -1 is a missing value, taken from the appended nan
+                uniques = np.append(
+                    npz['%s.categories' % col].astype(object), np.nan)
+                data[col] = uniques[codes]
+            else:
+                data[col] = npz[col]
+    table = pd.DataFrame(data, columns=columns)
+    return table
+
+
+def write_snapshot(sinfo_cpu: 'pd.DataFrame', snapshot_dir: str,
+                   taken: datetime = None,
+                   fmt: str = SNAPSHOT_FORMAT) -> str:
+    """Atomically write a snapshot of the processed sinfo table.
+
+    Parameters
+    ----------
+    sinfo_cpu : pd.DataFrame
+        sinfo about the nodes with available cores.
+    snapshot_dir : str
+        Snapshots directory.
+    taken : datetime
+        Collection time of the snapshot (default to now).
+    fmt : str
+        Snapshot file format: "npz", "feather" (needs pyarrow) or "tsv".
+
+    Returns
+    -------
+    snapshot : str
+        Path to the written snapshot file.
+    """
+    if fmt not in SNAPSHOT_FORMATS:
+        raise ValueError('Snapshot format must be one of %s (not "%s")' % (
+            ', '.join(SNAPSHOT_FORMATS), fmt))
+    if not isdir(snapshot_dir):
+        os.makedirs(snapshot_dir, mode=0o755)
+    if taken is None:
+        taken = datetime.now()
+    snapshot = join(snapshot_dir, '%s.%s' % (
+        taken.strftime(SNAPSHOT_TIME_FORMAT), fmt))
+    table = sinfo_cpu.reset_index(drop=True)
+    if fmt == 'tsv':
+        atomic_write(snapshot, lambda o: table.to_csv(o, index=False, sep='\t'))
+    elif fmt == 'npz':
+        atomic_write(snapshot, lambda o: write_npz(table, o), 'wb')
+    else:
+        atomic_write(snapshot, table.to_feather, 'wb')
+    return snapshot
+
+
+def atomic_write(path: str, write, mode: str = 'w') -> None:
+    """Write a file of a (shared) snapshots directory atomically.
+
+    The content is first written to a hidden temporary file of the same
+    directory and then renamed, so that concurrent readers either see the
+    complete file or no file at all.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file to write.
+    write : callable
+        Function writing the content to the open file object it is passed.
+    mode : str
+        Mode in which the temporary file is opened ("w" or "wb").
+    """
+    fd, tmp = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=dirname(path))
+    try:
+        with os.fdopen(fd, mode) as o:
+            write(o)
+        # readable by all the users of the shared directory
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def prune_snapshots(snapshot_dir: str, keep: int = KEEP_SNAPSHOTS,
+                    keep_age: float = KEEP_SNAPSHOTS_AGE,
+                    now: datetime = None) -> list:
+    """Remove the snapshots of a directory that are too many or too old.
+
+    Parameters
+    ----------
+    snapshot_dir : str
+        Snapshots directory.
+    keep : int
+        Maximum number of most recent snapshots to keep.
+    keep_age : float
+        Maximum age (in seconds) of the snapshots to keep, or None.
+    now : datetime
+        Reference time to compute the snapshots age (default to now).
+
+    Returns
+    -------
+    removed : list
+        Paths to the removed snapshot files.
+    """
+    snapshots = list_snapshots(snapshot_dir)
+    removed = snapshots[:max(len(snapshots) - keep, 0)]
+    if keep_age is not None:
+        removed += [x for x in snapshots[len(removed):]
+                    if snapshot_age(x, now) > keep_age]
+    for snapshot in removed:
+        # along with the files derived from it (e.g. <snapshot>.delta.json)
+        for path in [snapshot] + glob.glob('%s.*' % snapshot_stem(snapshot)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # already pruned by another process
+                pass
+    return removed
+
+
+def read_snapshot(snapshot: str) -> 'pd.DataFrame':
+    """Read a snapshot of the processed sinfo table.
+
+    Parameters
+    ----------
+    snapshot : str
+        Path to the snapshot file (in any of the snapshot formats).
+
+    Returns
+    -------
+    sinfo_cpu : pd.DataFrame
+        sinfo about the nodes with available cores, with the dtypes of the
+        schema (see `Xsinfo.schema.NODES_DTYPES`), also for the tsv and older
+        snapshots.
+    """
+    from Xsinfo.schema import apply_schema
+    fmt = snapshot.rsplit('.', 1)[-1]
+    if fmt == 'npz':
+        sinfo_cpu = read_npz(snapshot)
+    elif fmt == 'feather':
+        from pyarrow import feather
+        sinfo_cpu = feather.read_table(snapshot, memory_map=True).to_pandas()
+    else:
+        import pandas as pd
+        sinfo_cpu = pd.read_table(snapshot, sep='\t')
+    apply_schema(sinfo_cpu)
+    return sinfo_cpu
+
+
+def snapshot_id(snapshot: str) -> str:
+    """Get an identifier of a snapshot file that changes if it is rewritten.
+
+    Parameters
+    ----------
+    snapshot : str
+        Path to the snapshot file.
+
+    Returns
+    -------
+    sid : str
+        Snapshot file name and modification time (in ns).
+    """
+    return '%s@%s' % (basename(snapshot), os.stat(snapshot).st_mtime_ns)
+
+
+def snapshot_stem(snapshot: str) -> str:
+    """Get the path to a snapshot without its format extension.
+
+    Parameters
+    ----------
+    snapshot : str
+        Path to the snapshot file.
+
+    Returns
+    -------
+    stem : str
+        Path to the snapshot file without extension, also used as the prefix
+        of the files derived from the snapshot.
+    """
+    stem = snapshot.rsplit('.', 1)[0]
+    return stem
+
+
+def snapshot_time(snapshot: str) -> datetime:
+    """Get the collection time of a snapshot from its file name.
+
+    Parameters
+    ----------
+    snapshot : str
+        Path to the snapshot file.
+
+    Returns
+    -------
+    taken : datetime
+        Collection time of the snapshot.
+    """
+    name = basename(snapshot).split('.')[0]
+    try:
+        taken = datetime.strptime(name, SNAPSHOT_TIME_FORMAT)
+    except ValueError:
+        # daily snapshots written by Xsinfo <= 1.2 (YYYY-MM-DD.tsv)
+        taken = datetime.strptime(name, '%Y-%m-%d')
+    return taken
+
+
+def snapshot_age(snapshot: str, now: datetime = None) -> float:
+    """Get the number of seconds elapsed since a snapshot was collected.
+
+    Parameters
+    ----------
+    snapshot : str
+        Path to the snapshot file.
+    now : datetime
+        Reference time (default to now).
+
+    Returns
+    -------
+    age : float
+        Age of the snapshot in seconds.
+    """
+    if now is None:
+        now = datetime.now()
+    age = (now - snapshot_time(snapshot)).total_seconds()
+    return age
+
+
+def get_fresh_snapshot(snapshot_dirs: list, max_age: float,
+                       now: datetime = None) -> str:
+    """Get the most recent snapshot across directories, if it is fresh enough.
+
+    Parameters
+    ----------
+    snapshot_dirs : list
+        Snapshots directories (None entries are skipped).
+    max_age : float
+        Maximum age (in seconds) of a snapshot to be reused.
+    now : datetime
+        Reference time (default to now).
+
+    Returns
+    -------
+    snapshot : str
+        Path to the newest snapshot file not older than `max_age`, or None.
+    """
+    snapshots = [get_latest_snapshot(x) for x in snapshot_dirs
+                 if x and isdir(x)]
+    snapshots = [x for x in snapshots if x]
+    if not snapshots:
+        return None
+    snapshot = max(snapshots, key=snapshot_time)
+    if snapshot_age(snapshot, now) > max_age:
+        return None
+    return snapshot
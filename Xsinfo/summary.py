@@ -0,0 +1,133 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Summaries of a snapshot saved next to it ("<snapshot>.summary.json"), so
+that a cache hit can print them without importing pandas nor reading the
+snapshot, i.e. in O(bins) rather than O(nodes)."""
+
+import json
+
+from Xsinfo.render import RENDERERS
+from Xsinfo.snapshot import (
+    atomic_write, get_cache_dir, get_snapshot_dir, get_clusters_dir,
+    get_fresh_snapshot,
+    snapshot_id, snapshot_stem, snapshot_time, ClusterState)
+
+
+def summary_path(snapshot: str) -> str:
+    """Get the path to the summary file of a snapshot."""
+    return '%s.summary.json' % snapshot_stem(snapshot)
+
+
+def get_summary_rows(summary: dict) -> dict:
+    """
+    Get the rows of the nodes stats tables, as persisted and rendered.
+
+    Parameters
+    ----------
+    summary : dict
+        Nodes stats per quartile of "cpu" and "mem" load (see
+        `Xsinfo.xsinfo.summarize`).
+
+    Returns
+    -------
+    rows : dict
+        Nodes stats rows (lists of `SUMMARY_COLUMNS` values) per load.
+    """
+    rows = {x: table.values.tolist() for x, table in summary.items()}
+    return rows
+
+
+def write_summary(snapshot: str, rows: dict, shared: dict) -> str:
+    """
+    Write the summaries of a snapshot next to it, keyed by its identifier.
+
+    Parameters
+    ----------
+    snapshot : str
+        Path to the snapshot file.
+    rows : dict
+        Nodes stats rows per quartile of "cpu" and "mem" load.
+    shared : dict
+        Condensed node names (values) per set of partitions (keys).
+
+    Returns
+    -------
+    output : str
+        Path to the "<snapshot>.summary.json" file.
+    """
+    output = summary_path(snapshot)
+    cached = {'snapshot': snapshot_id(snapshot), 'summary': rows,
+              'shared': shared}
+    atomic_write(output, lambda o: json.dump(cached, o))
+    return output
+
+
+def read_summary(snapshot: str) -> dict:
+    """
+    Read the summaries of a snapshot, if they were written for this snapshot.
+
+    Parameters
+    ----------
+    snapshot : str
+        Path to the snapshot file.
+
+    Returns
+    -------
+    cached : dict
+        "summary": nodes stats rows per quartile of "cpu" and "mem" load and
+        "shared": node names per set of partitions, or None if the snapshot
+        has no (readable) summary file, or one of a previous file of the same
+        name (e.g. rewritten within the same second).
+    """
+    try:
+        with open(summary_path(snapshot)) as f:
+            cached = json.load(f)
+        if cached.get('snapshot') != snapshot_id(snapshot):
+            return None
+    except (OSError, ValueError, AttributeError):
+        return None
+    return cached
+
+
+def show_cached_summary(snapshot_dir: str, max_age: float,
+                        output: str = 'text', clusters: list = None,
+                        backend: str = 'slurm') -> bool:
+    """
+    Show the summaries of a recent enough snapshot, if it has some.
+
+    Parameters
+    ----------
+    snapshot_dir : str
+        Directory of the snapshots written by `Xsinfo daemon` (default to
+        $XSINFO_SNAPSHOT_DIR), read before ~/.xsinfo
+    max_age : float
+        Maximum age (in seconds) of a snapshot to be reused
+    output : str
+        Output format: "text", "tsv" or "json"
+    clusters : list
+        Names of the federated clusters (None for the local cluster)
+    backend : str
+        Scheduler backend collecting the nodes usage ("slurm" or "torque")
+
+    Returns
+    -------
+    shown : bool
+        Whether cached summaries were shown (i.e. no need to run sinfo nor to
+        read the snapshot).
+    """
+    snapshot = get_fresh_snapshot(
+        [get_clusters_dir(get_snapshot_dir(snapshot_dir), clusters, backend),
+         get_clusters_dir(get_cache_dir(), clusters, backend)], max_age)
+    if not snapshot:
+        return False
+    cached = read_summary(snapshot)
+    if cached is None:
+        return False
+    state = ClusterState(None, cached['shared'], snapshot,
+                         snapshot_time(snapshot), False)
+    print(RENDERERS[output](state, cached['summary']))
+    return True
@@ -0,0 +1,83 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import os
+import json
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from Xsinfo.bins import (
+    parse_bins, read_bins_config, get_bins, is_default, get_labels, digitize,
+    aggregate_bins, QUARTILES)
+
+
+class TestBins(unittest.TestCase):
+
+    def test_parse_bins(self):
+        self.assertEqual(parse_bins(4), QUARTILES)
+        self.assertEqual(parse_bins('4'), QUARTILES)
+        self.assertEqual(parse_bins('0, 50,90,100'), [0., 50., 90., 100.])
+        self.assertEqual(parse_bins([0, 100]), [0., 100.])
+        for bins in ['0', '2.5', 'a', '50,10', '10,10']:
+            with self.assertRaises(ValueError):
+                parse_bins(bins)
+
+    def test_read_bins_config(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bins.json')
+            with open(path, 'w') as o:
+                json.dump({'cpu': 2, 'mem': [0, 90, 100], 'grid': True}, o)
+            self.assertEqual(read_bins_config(path), {
+                'cpu': [0., 50., 100.], 'mem': [0., 90., 100.],
+                'grid': True})
+            bins = get_bins(10, path)
+            self.assertEqual(bins['cpu'], [0., 50., 100.])
+            self.assertEqual(len(bins['gpu']), 11)
+            with open(path, 'w') as o:
+                json.dump({'disk': 4}, o)
+            with self.assertRaises(ValueError):
+                read_bins_config(path)
+
+    def test_is_default(self):
+        self.assertTrue(is_default(None))
+        self.assertTrue(is_default(get_bins()))
+        self.assertTrue(is_default(get_bins(4)))
+        self.assertFalse(is_default(get_bins(10)))
+        self.assertFalse(is_default(get_bins(grid=True)))
+
+    def test_get_labels(self):
+        self.assertEqual(get_labels(QUARTILES),
+                         ['0-25', '25-50', '50-75', '75-100'])
+        self.assertEqual(get_labels(parse_bins(3))[1], '33.3333-66.6667')
+
+    def test_digitize(self):
+        loads = [0., 0.5, 25., 25.01, 100., 100.5, np.nan]
+        self.assertEqual(digitize(loads, QUARTILES).tolist(),
+                         [0, 0, 0, 1, 3, -1, -1])
+        # as pd.cut (right-closed bins)
+        cut = pd.cut(loads, [-1] + QUARTILES[1:], labels=False)
+        self.assertEqual(np.nan_to_num(cut, nan=-1).tolist(),
+                         digitize(loads, QUARTILES).tolist())
+
+    def test_aggregate_bins(self):
+        codes = np.array([2, 0, 2, -1, 2])
+        stats = aggregate_bins(
+            codes, 4, np.array([4., 1., 2., 8., 0.]),
+            np.array([10, 5, 20, 1, 30]),
+            np.array(['c1-3', 'c1-1', 'c1-2', 'c1-9', 'c1-4']),
+            np.array([1, 0, 0, 2, 1]))
+        self.assertEqual(len(stats), 2)
+        self.assertEqual(stats[0][:5] + stats[0][6:], [0, 0, 1., 5, 5., 1,
+                                                       'c1-1'])
+        # no deviation for one node
+        self.assertTrue(np.isnan(stats[0][5]))
+        self.assertEqual(stats[1], [2, 2, 6., 60, 20., 10., 3, 'c1-[2-4]'])
+        self.assertIsInstance(stats[1][3], int)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from Xsinfo.collect import (
+    get_sinfo, get_sinfo_cmd, read_fixed_width, read_json, SINFO_SPEC,
+    SINFO_COLUMNS, GRES_COLUMNS, COLLECT_SPEC, SINFO_JSON_ENV)
+
+
+class TestCollect(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [
+            ['c1-1', 'normal*', 'mixed', '47.41', '30/10/0/40', '2', '20', '2',
+             '182784', '148683', '(null)', '(null)', 'skylake'],
+            ['c1-1', 'optimist', 'mixed', '47.41', '30/10/0/40', '2', '20', '2',
+             '182784', '148683', '(null)', '(null)', 'skylake'],
+            ['gpu-a100-0123', 'gpu', 'down*', 'N/A', '0/0/64/64', '2', '32',
+             '1', '515000', 'N/A', 'gpu:a100:4(S:0-1)',
+             'gpu:a100:0(IDX:N/A)', 'a100,nvlink']]
+        self.lines = [
+            ''.join(['%-*s' % (width, value) for (_, _, width, _), value
+                     in zip(COLLECT_SPEC, row)]) + '\n' for row in self.rows]
+
+    def test_get_sinfo_cmd(self):
+        spec = [('node', 'NodeList', 40, str), ('cpus', 'CPUsState', 24, str)]
+        self.assertEqual(get_sinfo_cmd(spec), [
+            'sinfo', '--Node', '-h', '-O', 'NodeList:40,CPUsState:24'])
+        self.assertEqual(get_sinfo_cmd(spec, 'b')[:3],
+                         ['sinfo', '--clusters', 'b'])
+        # the filters that sinfo can express are pushed down
+        filters = {'partitions': ['gpu'], 'states': ['idle', 'mix'],
+                   'nodes': ['c1-[1-4]', 'c2-*']}
+        self.assertEqual(get_sinfo_cmd(spec, filters=filters)[5:], [
+            '-p', 'gpu', '-t', 'idle,mix'])
+
+    def test_read_fixed_width(self):
+        sinfo = read_fixed_width(self.lines + ['\n'])
+        self.assertEqual(sinfo.shape, (3, 13))
+        self.assertEqual(sinfo.columns.tolist(), SINFO_COLUMNS + GRES_COLUMNS)
+        self.assertEqual(sinfo.node.tolist(), ['c1-1', 'c1-1', 'gpu-a100-0123'])
+        self.assertEqual(sinfo.loc[1, 'partition'], 'optimist')
+        self.assertEqual(sinfo.loc[1, 'cpus'], '30/10/0/40')
+        self.assertEqual(sinfo.loc[1, 'cpu_load'], 47.41)
+        self.assertEqual(sinfo.loc[1, 'mem'], 182784)
+        self.assertEqual(sinfo.mem.dtype, 'int64')
+        self.assertEqual(sinfo.free_mem.dtype, 'float64')
+        self.assertTrue(pd.isna(sinfo.loc[2, 'cpu_load']))
+        self.assertTrue(pd.isna(sinfo.loc[2, 'free_mem']))
+        self.assertEqual(sinfo.loc[2, 'gres'], 'gpu:a100:4(S:0-1)')
+        self.assertEqual(sinfo.loc[2, 'features'], 'a100,nvlink')
+
+    def test_read_fixed_width_no_gres(self):
+        # records of an older sinfo command, without the GRES fields
+        lines = [x[:sum(w for _, _, w, _ in SINFO_SPEC)] for x in self.lines]
+        sinfo = read_fixed_width(lines)
+        self.assertEqual(sinfo.shape, (3, 13))
+        self.assertEqual(sinfo.gres.tolist(), ['', '', ''])
+
+    def test_read_fixed_width_cluster_header(self):
+        sinfo = read_fixed_width(['CLUSTER: b\n'] + self.lines)
+        self.assertEqual(sinfo.shape, (3, 13))
+
+    def test_get_sinfo_timeout(self):
+        bin_dir = tempfile.mkdtemp()
+        with open('%s/sinfo' % bin_dir, 'w') as o:
+            o.write('#!/bin/sh\nsleep 10\n')
+        os.chmod('%s/sinfo' % bin_dir, 0o755)
+        path = os.environ['PATH']
+        os.environ['PATH'] = bin_dir + os.pathsep + path
+        try:
+            with self.assertRaises(TimeoutError):
+                get_sinfo(use_json=False, timeout=.2)
+            with self.assertRaises(TimeoutError):
+                get_sinfo(use_json=True, timeout=.2)
+        finally:
+            os.environ['PATH'] = path
+            shutil.rmtree(bin_dir)
+
+    def test_get_sinfo_single_query(self):
+        bin_dir = tempfile.mkdtemp()
+        with open('%s/sinfo.txt' % bin_dir, 'w') as o:
+            o.writelines(self.lines)
+        # a current Slurm, whose JSON output only has groups of nodes
+        with open('%s/sinfo' % bin_dir, 'w') as o:
+            o.write('#!/bin/sh\necho "$1" >> %s/calls.log\ncase "$1" in\n'
+                    '--version) echo "slurm 23.11.4";;\n'
+                    '--json) echo \'{"sinfo": []}\';;\n'
+                    '*) cat %s/sinfo.txt;;\nesac\n' % (bin_dir, bin_dir))
+        os.chmod('%s/sinfo' % bin_dir, 0o755)
+        path = os.environ['PATH']
+        os.environ['PATH'] = bin_dir + os.pathsep + path
+        try:
+            self.assertEqual(get_sinfo().shape, (3, 13))
+            with open('%s/calls.log' % bin_dir) as f:
+                self.assertEqual(f.read(), '--Node\n')
+            os.environ[SINFO_JSON_ENV] = '1'
+            with self.assertRaisesRegex(ValueError, 'groups of nodes'):
+                get_sinfo()
+        finally:
+            os.environ['PATH'] = path
+            os.environ.pop(SINFO_JSON_ENV, None)
+            shutil.rmtree(bin_dir)
+
+    def test_read_fixed_width_empty_field(self):
+        line = self.lines[0][:40] + ' ' * 24 + self.lines[0][64:]
+        sinfo = read_fixed_width([line])
+        self.assertEqual(sinfo.loc[0, 'partition'], '')
+        self.assertEqual(sinfo.loc[0, 'status'], 'mixed')
+
+    def test_read_fixed_width_truncated(self):
+        line = 'x' * 40 + self.lines[0][40:]
+        with self.assertRaises(ValueError):
+            read_fixed_width([line])
+        # a truncated list of features only loses its last (cut) feature
+        features = ','.join(['feature%03d' % x for x in range(15)])[:120]
+        line = self.lines[2].rstrip('\n')[:-120] + features
+        sinfo = read_fixed_width([line])
+        self.assertEqual(sinfo.loc[0, 'features'].split(','),
+                         ['feature%03d' % x for x in range(10)])
+
+    def test_read_json(self):
+        data = {'nodes': [
+            {'name': 'c1-1', 'partitions': ['normal', 'optimist'],
+             'state': 'mixed', 'cpu_load': 4741, 'cpus': 40,
+             'alloc_cpus': 30, 'idle_cpus': 10, 'sockets': 2, 'cores': 20,
+             'threads': 2, 'real_memory': 182784, 'free_memory': 148683,
+             'gres': 'gpu:a100:4(S:0-1)', 'gres_used': 'gpu:a100:1(IDX:0)',
+             'features': 'a100,nvlink'},
+            {'name': 'c1-2', 'partitions': ['normal'],
+             'state': ['IDLE', 'DRAIN'], 'cpu_load': 1, 'cpus': 40,
+             'alloc_cpus': 0, 'idle_cpus': 40, 'sockets': 2, 'cores': 20,
+             'threads': 2, 'real_memory': 182784,
+             'free_memory': {'set': False, 'number': 0}}]}
+        sinfo = read_json(data)
+        self.assertEqual(sinfo.columns.tolist(), SINFO_COLUMNS + GRES_COLUMNS)
+        self.assertEqual(sinfo.loc[0, 'gres_used'], 'gpu:a100:1(IDX:0)')
+        self.assertEqual(sinfo.loc[2, 'gres'], '')
+        self.assertEqual(sinfo.partition.tolist(),
+                         ['normal', 'optimist', 'normal'])
+        self.assertEqual(sinfo.loc[0, 'cpus'], '30/10/0/40')
+        self.assertEqual(sinfo.loc[0, 'cpu_load'], 47.41)
+        self.assertEqual(sinfo.loc[2, 'status'], 'idle+drain')
+        self.assertTrue(pd.isna(sinfo.loc[2, 'free_mem']))
+        self.assertEqual(sinfo.mem.dtype, 'int64')
+
+    def test_read_json_no_nodes(self):
+        with self.assertRaises(ValueError):
+            read_json({'sinfo': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
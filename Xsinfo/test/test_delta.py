@@ -0,0 +1,100 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import unittest
+import pandas as pd
+from Xsinfo.collect import SINFO_COLUMNS
+from Xsinfo.delta import init_state, diff_nodes, get_deltas, update_state
+from Xsinfo.xsinfo import process_sinfo, get_shared_nodes, normalize_sinfo
+
+
+class TestDelta(unittest.TestCase):
+
+    def setUp(self):
+        self.sinfo = pd.DataFrame([
+            ['c1-1', 'normal*', 'mixed', 47.41, '30/10/0/40', 2, 20, 2,
+             182784, 148683.],
+            ['c1-1', 'optimist', 'mixed', 47.41, '30/10/0/40', 2, 20, 2,
+             182784, 148683.],
+            ['c1-2', 'normal*', 'allocated', 19.33, '40/0/0/40', 2, 20, 2,
+             182784, 161744.],
+            ['c1-3', 'normal*', 'mixed', 34.68, '38/2/0/40', 2, 20, 2,
+             182784, 131670.],
+            ['c1-9', 'normal*', 'reserved', 39.60, '40/0/0/40', 2, 20, 2,
+             182784, 158010.],
+            ['c1-10', 'normal*', 'idle', 0.01, '0/40/0/40', 2, 20, 2,
+             182784, 184132.],
+            ['c1-10', 'optimist', 'idle', 0.01, '0/40/0/40', 2, 20, 2,
+             182784, 184132.]], columns=SINFO_COLUMNS)
+        self.current = self.sinfo.copy()
+        # c1-1 gets fully allocated in both partitions
+        self.current.loc[[0, 1], 'cpus'] = '40/0/0/40'
+        # c1-2 frees some cores
+        self.current.loc[2, ['status', 'cpus']] = ['mixed', '36/4/0/40']
+        # c1-10 leaves the optimist partition and c2-1 is added
+        self.current = pd.concat([
+            self.current.drop(index=[6]),
+            pd.DataFrame([['c2-1', 'optimist', 'idle', 0.01, '0/40/0/40', 2,
+                           20, 2, 182784, 184132.]], columns=SINFO_COLUMNS)
+        ], ignore_index=True)
+
+    def test_diff_nodes(self):
+        previous, _ = normalize_sinfo(self.sinfo)
+        current, _ = normalize_sinfo(self.current)
+        diff = diff_nodes(previous, current)
+        self.assertEqual(diff[['node', 'change']].values.tolist(), [
+            ['c1-1', 'changed'], ['c1-10', 'changed'], ['c1-2', 'changed'],
+            ['c2-1', 'added']])
+        self.assertEqual(diff_nodes(previous, previous).shape[0], 0)
+        diff = diff_nodes(previous, current.iloc[1:])
+        self.assertEqual(diff.loc[0, ['node', 'change']].tolist(),
+                         ['c1-1', 'removed'])
+
+    def test_get_deltas(self):
+        previous, _ = normalize_sinfo(self.sinfo)
+        current, _ = normalize_sinfo(self.current)
+        deltas = get_deltas(diff_nodes(previous, current))
+        self.assertEqual(deltas[2], {
+            'node': 'c1-2', 'change': 'changed',
+            'fields': {'status': ['allocated', 'mixed'],
+                       'cpus': ['40/0/0/40', '36/4/0/40']}})
+        self.assertEqual(deltas[1]['fields'], {
+            'partitions': ['normal*,optimist', 'normal*']})
+        self.assertEqual(deltas[3]['fields']['cores'], [None, 20])
+
+    def test_update_state(self):
+        state = init_state(self.sinfo)
+        state, deltas = update_state(state, self.current)
+        self.assertEqual(len(deltas), 4)
+        # same as processing the full current collection
+        sinfo_cpu = process_sinfo(self.current).reset_index(drop=True)
+        pd.testing.assert_frame_equal(state['sinfo_cpu'], sinfo_cpu)
+        self.assertEqual(state['shared'], get_shared_nodes(sinfo_cpu))
+        self.assertEqual(state['shared'], {
+            'normal*': 'c1-[2-3,10]', 'optimist': 'c2-1'})
+
+    def test_update_state_unchanged(self):
+        state = init_state(self.sinfo)
+        new_state, deltas = update_state(state, self.sinfo.copy())
+        self.assertEqual(deltas, [])
+        self.assertIs(new_state['sinfo_cpu'], state['sinfo_cpu'])
+
+    def test_update_state_loads(self):
+        state = init_state(self.sinfo)
+        current = self.sinfo.copy()
+        current['cpu_load'] = current['cpu_load'] + 10
+        current.loc[[0, 1], 'free_mem'] = 2048.
+        new_state, deltas = update_state(state, current)
+        # only the loads are refreshed, in place
+        self.assertEqual(deltas, [])
+        self.assertIs(new_state['sinfo_cpu'], state['sinfo_cpu'])
+        sinfo_cpu = process_sinfo(current).reset_index(drop=True)
+        pd.testing.assert_frame_equal(new_state['sinfo_cpu'], sinfo_cpu)
+        self.assertEqual(new_state['sinfo_cpu'].free_mem[0], 2.)
+
+
+if __name__ == '__main__':
+    unittest.main()
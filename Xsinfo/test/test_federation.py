@@ -0,0 +1,97 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import io
+import time
+import unittest
+import pandas as pd
+from contextlib import redirect_stderr
+from Xsinfo.collect import SINFO_COLUMNS
+from Xsinfo.federation import parse_clusters, collect_clusters
+from Xsinfo.snapshot import get_clusters_dir
+from Xsinfo.xsinfo import process_sinfo, summarize, get_shared_nodes
+from Xsinfo.fit import index_nodes, fit_nodes
+
+
+class TestFederation(unittest.TestCase):
+
+    def setUp(self):
+        self.sinfo = [
+            ['c1-1', 'normal*', 'mixed', 47.41, '30/10/0/40', 2, 20, 2,
+             182784, 148683.],
+            ['c1-2', 'normal*', 'idle', 0.01, '0/40/0/40', 2, 20, 2,
+             182784, 184132.]]
+
+    def collect(self, name, slurm_conf, timeout, filters=None):
+        # same node names on every cluster
+        if name == 'down':
+            raise OSError('`sinfo --clusters down` exited with status 1')
+        sinfo = pd.DataFrame(self.sinfo, columns=SINFO_COLUMNS)
+        sinfo['node'] = name + ':' + sinfo.node
+        sinfo.insert(0, 'cluster', name)
+        time.sleep(.2)
+        return sinfo
+
+    def test_parse_clusters(self):
+        self.assertEqual(parse_clusters('a, b=/etc/slurm-b.conf'),
+                         [('a', None), ('b', '/etc/slurm-b.conf')])
+        for clusters in ['a,a', 'a,', 'a:b', '=/etc/slurm.conf']:
+            with self.assertRaises(ValueError):
+                parse_clusters(clusters)
+
+    def test_get_clusters_dir(self):
+        self.assertEqual(get_clusters_dir('/tmp/x', ['a', 'b']), '/tmp/x/a+b')
+        self.assertEqual(get_clusters_dir('/tmp/x'), '/tmp/x')
+        self.assertIsNone(get_clusters_dir(None, ['a']))
+        self.assertEqual(get_clusters_dir('/tmp/x', None, 'torque'),
+                         '/tmp/x/torque')
+
+    def test_collect_clusters(self):
+        start = time.monotonic()
+        with redirect_stderr(io.StringIO()) as err:
+            sinfo = collect_clusters([('a', None), ('down', None), ('b', None)],
+                                     collect=self.collect)
+        # collected concurrently
+        self.assertLess(time.monotonic() - start, .4)
+        self.assertIn('Cluster down left out', err.getvalue())
+        self.assertEqual(sinfo.columns.tolist(), ['cluster'] + SINFO_COLUMNS)
+        self.assertEqual(sinfo.node.tolist(),
+                         ['a:c1-1', 'a:c1-2', 'b:c1-1', 'b:c1-2'])
+        with redirect_stderr(io.StringIO()):
+            with self.assertRaises(OSError):
+                collect_clusters([('down', None)], collect=self.collect)
+
+    def test_collect_clusters_deadline(self):
+        def collect(name, slurm_conf, timeout, filters=None):
+            # e.g. a slow parsing, after a sinfo within its timeout
+            if name == 'slow':
+                time.sleep(1)
+            return self.collect(name, slurm_conf, timeout, filters)
+
+        start = time.monotonic()
+        with redirect_stderr(io.StringIO()) as err:
+            sinfo = collect_clusters([('a', None), ('slow', None)], .5,
+                                     collect=collect)
+        self.assertLess(time.monotonic() - start, .8)
+        self.assertIn('Cluster slow left out: not collected within 0.5s',
+                      err.getvalue())
+        self.assertEqual(sinfo.cluster.unique().tolist(), ['a'])
+
+    def test_process_clusters(self):
+        sinfo = collect_clusters([('a', None), ('b', None)],
+                                 collect=self.collect)
+        sinfo_cpu = process_sinfo(sinfo)
+        self.assertEqual(sinfo_cpu.cluster.tolist(), ['a', 'a', 'b', 'b'])
+        self.assertEqual(get_shared_nodes(sinfo_cpu),
+                         {'normal*': 'a:c1-[1-2],b:c1-[1-2]'})
+        summary = summarize(sinfo_cpu)
+        self.assertEqual(summary['cpu'].nodes.sum(), 4)
+        fits = fit_nodes(index_nodes(sinfo_cpu), cpus=20, nodes=2)
+        self.assertEqual(fits.node.tolist(), ['a:c1-2', 'b:c1-2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
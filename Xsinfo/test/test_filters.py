@@ -0,0 +1,93 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import unittest
+import pandas as pd
+from Xsinfo.filters import (
+    parse_filters, split_filters, match_names, match_states, filter_sinfo)
+
+
+class TestFilters(unittest.TestCase):
+
+    def setUp(self):
+        self.sinfo = pd.DataFrame({
+            'node': ['c1-1', 'c1-1', 'c1-2', 'c2-1', 'gpu-1'],
+            'partition': ['normal*', 'long', 'normal*', 'long', 'gpu'],
+            'status': ['mixed', 'mixed', 'idle', 'drained*', 'idle+planned']})
+        self.nodes = pd.DataFrame({
+            'node': ['c1-1', 'c1-2', 'c2-1', 'gpu-1'],
+            'partitions': ['normal*,long', 'normal*', 'long', 'gpu'],
+            'status': ['mixed', 'idle', 'drained*', 'idle+planned']})
+
+    def test_parse_filters(self):
+        self.assertIsNone(parse_filters())
+        filters = parse_filters('gpu, long', 'IDLE,mix', 'c1-[1-2],c2-1')
+        self.assertEqual(filters, {
+            'partitions': ['gpu', 'long'], 'states': ['idle', 'mix'],
+            'nodes': ['c1-[1-2]', 'c2-1']})
+        with self.assertRaises(ValueError):
+            parse_filters(states=',')
+        with self.assertRaises(ValueError):
+            parse_filters(nodes='c1-[1-2')
+
+    def test_split_filters(self):
+        self.assertEqual(split_filters(None), ([], None))
+        filters = parse_filters('gpu', 'idle,mix', 'c1-[1-2]')
+        self.assertEqual(split_filters(filters), (
+            ['-p', 'gpu', '-t', 'idle,mix', '-n', 'c1-[1-2]'], None))
+        # globs and unknown states are left to pandas
+        filters = parse_filters('gpu*', 'idle,busy', 'c1-[1-2]')
+        self.assertEqual(split_filters(filters), (['-n', 'c1-[1-2]'], {
+            'partitions': ['gpu*'], 'states': ['idle', 'busy']}))
+
+    def test_match_names(self):
+        self.assertEqual(
+            match_names(['c1-1', 'c1-3', 'c2-10', 'gpu-1'],
+                        ['c1-[1-2]', 'c2-*']), [True, False, True, False])
+
+    def test_match_states(self):
+        self.assertEqual(
+            match_states(['mixed', 'idle', 'drained*', 'idle+planned',
+                          'draining'], ['mix', 'drain']),
+            [True, False, True, False, True])
+        self.assertEqual(match_states(['idle+planned', 'idle'], ['planned']),
+                         [True, False])
+
+    def test_filter_sinfo(self):
+        self.assertIs(filter_sinfo(self.sinfo, None), self.sinfo)
+        filtered = filter_sinfo(self.sinfo, parse_filters('long'))
+        self.assertEqual(filtered.node.tolist(), ['c1-1', 'c2-1'])
+        self.assertEqual(filtered.partition.tolist(), ['long', 'long'])
+        filtered = filter_sinfo(self.sinfo, parse_filters(
+            'normal', 'mix,idle'))
+        self.assertEqual(filtered.node.tolist(), ['c1-1', 'c1-2'])
+        filtered = filter_sinfo(self.sinfo, parse_filters(nodes='gpu-*'))
+        self.assertEqual(filtered.node.tolist(), ['gpu-1'])
+
+    def test_filter_sinfo_nodes_table(self):
+        # the nodes only keep the selected partitions
+        filtered = filter_sinfo(self.nodes, parse_filters('long'))
+        self.assertEqual(filtered.node.tolist(), ['c1-1', 'c2-1'])
+        self.assertEqual(filtered.partitions.tolist(), ['long', 'long'])
+        self.assertEqual(self.nodes.partitions[0], 'normal*,long')
+        filtered = filter_sinfo(self.nodes, parse_filters(
+            'normal,long', 'mix,drain'))
+        self.assertEqual(filtered.partitions.tolist(),
+                         ['normal*,long', 'long'])
+
+    def test_filter_sinfo_federated(self):
+        nodes = self.nodes.assign(node='a:' + self.nodes.node)
+        filtered = filter_sinfo(nodes, parse_filters(nodes='c1-[1-2]'))
+        self.assertEqual(filtered.node.tolist(), ['a:c1-1', 'a:c1-2'])
+
+    def test_filter_sinfo_empty(self):
+        filtered = filter_sinfo(self.nodes.iloc[:0], parse_filters(
+            'long', 'idle', 'c1-1'))
+        self.assertEqual(filtered.shape, (0, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
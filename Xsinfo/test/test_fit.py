@@ -0,0 +1,115 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import unittest
+import pandas as pd
+from Xsinfo.collect import SINFO_COLUMNS, GRES_COLUMNS
+from Xsinfo.fit import parse_mem, index_nodes, fit_nodes
+from Xsinfo.xsinfo import process_sinfo
+
+
+class TestFit(unittest.TestCase):
+
+    def setUp(self):
+        sinfo = pd.DataFrame([
+            ['c1-1', 'normal*', 'mixed', 47.41, '30/10/0/40', 2, 20, 2,
+             182784, 148683.],
+            ['c1-1', 'optimist', 'mixed', 47.41, '30/10/0/40', 2, 20, 2,
+             182784, 148683.],
+            ['c1-2', 'normal*', 'mixed', 19.33, '8/32/0/40', 2, 20, 2,
+             182784, 61744.],
+            ['c1-3', 'normal*', 'mixed', 34.68, '38/2/0/40', 2, 20, 2,
+             182784, 131670.],
+            ['c1-10', 'normal*', 'idle', 0.01, '0/40/0/40', 2, 20, 2,
+             182784, 184132.],
+            ['c1-10', 'optimist', 'idle', 0.01, '0/40/0/40', 2, 20, 2,
+             182784, 184132.],
+            ['c2-1', 'bigmem', 'idle', 0.01, '0/64/0/64', 2, 32, 2,
+             3096000, 0.]], columns=SINFO_COLUMNS)
+        self.index = index_nodes(process_sinfo(sinfo))
+
+    def test_parse_mem(self):
+        self.assertEqual(parse_mem('200G'), 200)
+        # binary units, as Slurm
+        self.assertEqual(parse_mem('512M'), .5)
+        self.assertEqual(parse_mem('1048576K'), 1)
+        self.assertEqual(parse_mem('1.5TB'), 1536)
+        self.assertEqual(parse_mem(64), 64)
+        with self.assertRaises(ValueError):
+            parse_mem('200X')
+
+    def test_index_nodes(self):
+        self.assertEqual(self.index['cpus_sorted'].tolist(),
+                         [2., 10., 32., 40., 64.])
+        self.assertEqual(sorted(self.index['partitions']),
+                         ['bigmem', 'normal', 'optimist'])
+
+    def test_fit_nodes(self):
+        fits = fit_nodes(self.index, cpus=10)
+        self.assertEqual(fits.node.tolist(), ['c1-1', 'c1-2', 'c1-10', 'c2-1'])
+        fits = fit_nodes(self.index, cpus=10, mem=100.)
+        self.assertEqual(fits.node.tolist(), ['c1-1', 'c1-10'])
+        fits = fit_nodes(self.index, cpus=10, mem=100., partition='optimist')
+        self.assertEqual(fits.node.tolist(), ['c1-1', 'c1-10'])
+        fits = fit_nodes(self.index, cpus=32, partition='normal*')
+        self.assertEqual(fits.node.tolist(), ['c1-2', 'c1-10'])
+
+    def test_fit_nodes_gpus(self):
+        sinfo = pd.DataFrame([
+            ['c1-1', 'normal*', 'idle', 0.01, '0/40/0/40', 2, 20, 2,
+             182784, 184132., '(null)', '(null)', ''],
+            ['g1-1', 'gpu', 'mixed', 8.2, '8/56/0/64', 2, 32, 1,
+             515000, 400000., 'gpu:a100:4(S:0-1)', 'gpu:a100:3(IDX:0-2)',
+             'a100'],
+            ['g1-2', 'gpu', 'idle', 0.01, '0/64/0/64', 2, 32, 1,
+             515000, 500000., 'gpu:a100:4(S:0-1)', 'gpu:a100:0(IDX:N/A)',
+             'a100']], columns=SINFO_COLUMNS + GRES_COLUMNS)
+        index = index_nodes(process_sinfo(sinfo))
+        self.assertEqual(fit_nodes(index, gpus=2).node.tolist(), ['g1-2'])
+        # the node with the fewest GPUs left is used first
+        self.assertEqual(fit_nodes(index, gpus=1).node.tolist(),
+                         ['g1-1', 'g1-2'])
+        # and the cpu-only requests go to the nodes without free GPUs first
+        self.assertEqual(fit_nodes(index, cpus=8).node.tolist(),
+                         ['c1-1', 'g1-1', 'g1-2'])
+        self.assertEqual(fit_nodes(index, gpus=5).shape[0], 0)
+
+    def test_fit_nodes_gpu_type(self):
+        sinfo = pd.DataFrame([
+            ['g1-1', 'gpu', 'mixed', 8.2, '8/56/0/64', 2, 32, 1, 515000,
+             400000., 'gpu:a100:2(S:0),gpu:v100:4(S:1)',
+             'gpu:a100:1(IDX:0),gpu:v100:0(IDX:N/A)', 'ib,nvlink'],
+            ['g1-2', 'gpu', 'idle', 0.01, '0/64/0/64', 2, 32, 1, 515000,
+             500000., 'gpu:a100:4(S:0-1)', 'gpu:a100:0(IDX:N/A)', 'ib'],
+            ['c1-1', 'normal*', 'idle', 0.01, '0/40/0/40', 2, 20, 2,
+             182784, 184132., '(null)', '(null)', '']],
+            columns=SINFO_COLUMNS + GRES_COLUMNS)
+        index = index_nodes(process_sinfo(sinfo))
+        self.assertEqual(index['gpu_types']['a100'].tolist(), [1, 4, 0])
+        self.assertEqual(index['gpu_types']['v100'].tolist(), [4, 0, 0])
+        fits = fit_nodes(index, gpu_type='a100')
+        self.assertEqual(fits.node.tolist(), ['g1-1', 'g1-2'])
+        # ranked by the free GPUs of the type
+        self.assertEqual(fits.gpus_avail.tolist(), [1, 4])
+        self.assertEqual(fit_nodes(index, gpus=2, gpu_type='a100').node.tolist(),
+                         ['g1-2'])
+        self.assertEqual(fit_nodes(index, gpus=4, gpu_type='v100').node.tolist(),
+                         ['g1-1'])
+        self.assertEqual(fit_nodes(index, gpu_type='h100').shape[0], 0)
+        self.assertEqual(fit_nodes(index, features=['ib']).node.tolist(),
+                         ['g1-2', 'g1-1'])
+        self.assertEqual(fit_nodes(index, features=['ib', 'nvlink'],
+                                   gpu_type='a100').node.tolist(), ['g1-1'])
+        self.assertEqual(fit_nodes(index, features=['ssd']).shape[0], 0)
+
+    def test_fit_nodes_none(self):
+        self.assertEqual(fit_nodes(self.index, cpus=128).shape[0], 0)
+        self.assertEqual(fit_nodes(self.index, cpus=40, nodes=3).shape[0], 0)
+        self.assertEqual(fit_nodes(self.index, partition='gpu').shape[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
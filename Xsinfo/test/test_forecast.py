@@ -0,0 +1,105 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import unittest
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from Xsinfo.collect import SINFO_COLUMNS
+from Xsinfo.forecast import (
+    read_squeue, get_forecast_table, forecast_nodes, forecast_partitions,
+    sample_forecast)
+
+
+class TestForecast(unittest.TestCase):
+
+    def setUp(self):
+        self.now = datetime(2022, 3, 7, 10)
+        self.sinfo = pd.DataFrame([
+            ['c1-1', 'normal*', 'allocated', 40., '40/0/0/40', 2, 20, 2,
+             102400, 20480.],
+            ['c1-1', 'bigmem', 'allocated', 40., '40/0/0/40', 2, 20, 2,
+             102400, 20480.],
+            ['c1-2', 'normal*', 'mixed', 10., '10/30/0/40', 2, 20, 2,
+             102400, 81920.],
+            ['c1-3', 'normal*', 'drained', 0., '0/0/40/40', 2, 20, 2,
+             102400, 102400.]], columns=SINFO_COLUMNS)
+        # padded fields, as printed by squeue
+        self.squeue = [
+            'c1-1    |30   |1    |cpu=30,mem=40G,node=1|2022-03-07T10:05:00\n',
+            'c1-[1-2]|20|2|cpu=20,mem=20G,node=2,billing=20|'
+            '2022-03-07T12:00:00\n',
+            'c1-3|4|1|cpu=4,mem=1024M,node=1|2022-03-07T09:00:00\n',
+            'c1-2|0|1|node=1|N/A\n']
+
+    def test_read_squeue(self):
+        jobs = read_squeue(self.squeue, self.now)
+        self.assertEqual(jobs.node.tolist(),
+                         ['c1-1', 'c1-1', 'c1-2', 'c1-3', 'c1-2'])
+        # the cores of a job are split across its nodes
+        self.assertEqual(jobs.cpus.tolist(), [30, 10, 10, 4, 0])
+        # so is their allocated memory (also when requested per core)
+        self.assertEqual(jobs.mem.tolist(), [40960, 10240, 10240, 1024, 0])
+        # overdue jobs end now, jobs without time limit never
+        self.assertEqual(jobs.end.tolist(), [300, 7200, 7200, 0, np.inf])
+
+    def test_get_forecast_table(self):
+        nodes = get_forecast_table(self.sinfo)
+        # fully allocated nodes are kept, drained nodes are not
+        self.assertEqual(nodes.node.tolist(), ['c1-1', 'c1-2'])
+        self.assertEqual(nodes.partitions.tolist(), ['normal*,bigmem',
+                                                     'normal*'])
+        self.assertEqual(nodes.free_mem.tolist(), [20, 80])
+
+    def test_forecast_nodes(self):
+        nodes = get_forecast_table(self.sinfo)
+        jobs = read_squeue(self.squeue, self.now)
+        forecast = forecast_nodes(nodes, jobs, 600)
+        self.assertEqual(forecast.node.tolist(), ['c1-1', 'c1-2'])
+        self.assertEqual(forecast.cpus_avail.tolist(), [30, 30])
+        self.assertEqual(forecast.free_mem.tolist(), [60, 80])
+        forecast = forecast_nodes(nodes, jobs, 60)
+        self.assertEqual(forecast.node.tolist(), ['c1-2'])
+        forecast = forecast_nodes(nodes, jobs, 86400)
+        # capped at the cores and memory of the nodes
+        self.assertEqual(forecast.cpus_avail.tolist(), [40, 40])
+        self.assertEqual(forecast.free_mem.tolist(), [70, 90])
+        # in the dtypes of the nodes table
+        self.assertEqual(forecast.cpus_avail.dtype, 'uint16')
+        self.assertEqual(forecast.free_mem.dtype, 'float32')
+
+    def test_forecast_partitions(self):
+        nodes = get_forecast_table(self.sinfo)
+        jobs = read_squeue(self.squeue, self.now)
+        steps = forecast_partitions(nodes, jobs)
+        self.assertEqual(steps.values.tolist(), [
+            ['bigmem', 0., 0., 20.], ['bigmem', 300., 30., 60.],
+            ['bigmem', 7200., 40., 70.],
+            ['normal', 0., 30., 100.], ['normal', 300., 60., 140.],
+            ['normal', 7200., 80., 160.], ['normal', np.inf, 80., 160.]])
+        forecast = sample_forecast(steps, [0, 600, 86400])
+        self.assertEqual(forecast.values.tolist(), [
+            ['bigmem', 0, 0., 20.], ['bigmem', 600, 30., 60.],
+            ['bigmem', 86400, 40., 70.], ['normal', 0, 30., 100.],
+            ['normal', 600, 60., 140.], ['normal', 86400, 80., 160.]])
+
+    def test_forecast_partitions_capped(self):
+        nodes = get_forecast_table(self.sinfo)
+        # more cores and memory than c1-2 has are released (e.g. as the
+        # running jobs and the sinfo collection are not simultaneous)
+        jobs = read_squeue(self.squeue + [
+            'c1-2|16|1|cpu=16,mem=40G,node=1|2022-03-07T10:10:00\n'],
+            self.now)
+        steps = forecast_partitions(nodes, jobs)
+        steps = steps.loc[steps.partition == 'normal']
+        self.assertEqual(steps.values.tolist(), [
+            ['normal', 0., 30., 100.], ['normal', 300., 60., 140.],
+            ['normal', 600., 70., 160.], ['normal', 7200., 80., 170.],
+            ['normal', np.inf, 80., 170.]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import unittest
+import pandas as pd
+from Xsinfo.gres import parse_gres, count_gres, count_gres_types
+
+
+class TestGres(unittest.TestCase):
+
+    def setUp(self):
+        self.gres = pd.Series([
+            'gpu:a100:4(S:0-1),shard:8', 'gpu:2', '(null)', '',
+            'gpu:(null):0(IDX:N/A)',
+            'gpu:a100:2(IDX:0-1),gpu:v100:1(IDX:4),mps:1K'],
+            index=[3, 5, 7, 8, 9, 11])
+
+    def test_parse_gres(self):
+        items = parse_gres(self.gres)
+        self.assertEqual(items.index.get_level_values(0).tolist(),
+                         [3, 3, 5, 9, 11, 11, 11])
+        self.assertEqual(items.name.tolist(),
+                         ['gpu', 'shard', 'gpu', 'gpu', 'gpu', 'gpu', 'mps'])
+        self.assertEqual(items.type.tolist(),
+                         ['a100', '', '', '', 'a100', 'v100', ''])
+        self.assertEqual(items['count'].tolist(), [4, 8, 2, 0, 2, 1, 1024])
+
+    def test_count_gres(self):
+        counts = count_gres(self.gres)
+        self.assertEqual(counts.index.tolist(), [3, 5, 7, 8, 9, 11])
+        self.assertEqual(counts.tolist(), [4, 2, 0, 0, 0, 3])
+        self.assertEqual(count_gres(self.gres, 'shard').tolist(),
+                         [8, 0, 0, 0, 0, 0])
+        self.assertEqual(count_gres(pd.Series([], dtype=str)).size, 0)
+
+    def test_count_gres_types(self):
+        counts = count_gres_types(self.gres)
+        self.assertEqual(counts.index.tolist(), [3, 5, 7, 8, 9, 11])
+        self.assertEqual(counts.columns.tolist(), ['', 'a100', 'v100'])
+        self.assertEqual(counts.a100.tolist(), [4, 0, 0, 0, 0, 2])
+        self.assertEqual(counts[''].tolist(), [0, 2, 0, 0, 0, 0])
+        self.assertEqual(count_gres_types(self.gres, 'shard').columns.tolist(),
+                         [''])
+
+
+if __name__ == '__main__':
+    unittest.main()
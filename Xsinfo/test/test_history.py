@@ -0,0 +1,171 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import io
+import os
+import sqlite3
+import unittest
+import tempfile
+import pandas as pd
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from Xsinfo.collect import SINFO_COLUMNS
+from Xsinfo.history import (record_history, query_history,
+                            get_history_table, connect_history,
+                            show_history)
+
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'history.sqlite')
+        self.start = datetime(2022, 3, 7, 10)
+        self.sinfo = pd.DataFrame([
+            ['c1-1', 'normal*', 'mixed', 20., '30/10/0/40', 2, 20, 2,
+             102400, 51200.],
+            ['c1-1', 'bigmem', 'mixed', 20., '30/10/0/40', 2, 20, 2,
+             102400, 51200.],
+            ['c1-2', 'normal*', 'allocated', 40., '40/0/0/40', 2, 20, 2,
+             102400, 25600.]], columns=SINFO_COLUMNS)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def record(self, minutes, **kwargs):
+        for minute in minutes:
+            record_history(self.path, self.sinfo,
+                           self.start + timedelta(minutes=minute), **kwargs)
+
+    def count_rows(self):
+        con = sqlite3.connect(self.path)
+        try:
+            return con.execute('SELECT COUNT(*) FROM samples').fetchone()[0]
+        finally:
+            con.close()
+
+    def test_get_history_table(self):
+        usage = get_history_table(self.sinfo)
+        # fully allocated nodes are recorded too
+        self.assertEqual(usage.node.tolist(), ['c1-1', 'c1-2'])
+        self.assertEqual(usage.allocated.tolist(), [30, 40])
+        self.assertEqual(usage.cpu_load.tolist(), [2000, 4000])
+        self.assertEqual(usage.mem_load.tolist(), [5000, 7500])
+        self.assertEqual(usage.gpus.tolist(), [0, 0])
+
+    def test_query_history(self):
+        self.record(range(3))
+        usage = query_history(self.path, by='node')
+        self.assertEqual(usage.node.tolist(), ['c1-1', 'c1-2'])
+        self.assertEqual(usage.samples.tolist(), [3, 3])
+        self.assertEqual(usage.cpu_usage.tolist(), [75., 100.])
+        self.assertEqual(usage.mem_load.tolist(), [50., 75.])
+        self.assertEqual(usage.free_mem.tolist(), [50., 25.])
+        usage = query_history(self.path, by='partition')
+        self.assertEqual(usage.partition.tolist(), ['bigmem', 'normal'])
+        self.assertEqual(usage.nodes.tolist(), [1, 2])
+        self.assertEqual(usage.cpu_usage.tolist(), [75., 87.5])
+        usage = query_history(self.path, by='hour', partition='bigmem')
+        self.assertEqual(usage.values.tolist()[0][:4], [10, 3, 1, 75.])
+        usage = query_history(self.path, by='time', nodes='c1-[2-3]',
+                              since=self.start + timedelta(minutes=1))
+        self.assertEqual(usage.samples.tolist(), [1, 1])
+        self.assertEqual(usage.cpus_avail.tolist(), [0., 0.])
+
+    def test_query_history_moved(self):
+        moved = self.sinfo.copy()
+        moved.loc[2, 'partition'] = 'bigmem'
+        # c1-2 moves from normal to bigmem at minute 2, and back at minute 4
+        for minute in range(6):
+            record_history(self.path, moved if minute in (2, 3) else
+                           self.sinfo, self.start + timedelta(minutes=minute))
+        usage = query_history(self.path, by='partition')
+        self.assertEqual(usage.partition.tolist(), ['bigmem', 'normal'])
+        self.assertEqual(usage.samples.tolist(), [6 + 2, 6 + 4])
+        usage = query_history(self.path, by='partition', partition='bigmem',
+                              since=self.start + timedelta(minutes=4))
+        self.assertEqual(usage.samples.tolist(), [2])
+
+    def test_show_history(self):
+        self.record(range(2))
+        with redirect_stdout(io.StringIO()) as out:
+            show_history(query_history(self.path, by='hour'))
+        self.assertEqual(out.getvalue().split('\n')[1].split('\t')[:4],
+                         ['10', '4', '2', '87.5'])
+
+    def test_query_history_by(self):
+        with self.assertRaises(ValueError):
+            query_history(self.path, by='week')
+
+    def test_downsample_history(self):
+        # one sample per minute, merged into 5 minutes buckets after 10 minutes
+        self.record(range(20), policy=[(600, 300)], keep=None)
+        # at minute 19, minutes 0-4 are one bucket per node (5-9 are not yet
+        # all older than 10 minutes)
+        self.assertEqual(self.count_rows(), 2 * (1 + 15))
+        usage = query_history(self.path, by='node')
+        self.assertEqual(usage.samples.tolist(), [20, 20])
+        self.assertEqual(usage.cpu_usage.tolist(), [75., 100.])
+        self.assertEqual(usage.cpu_load.tolist(), [20., 40.])
+        usage = query_history(self.path, by='time')
+        self.assertEqual(usage.samples.tolist()[:3], [10, 2, 2])
+
+    def test_query_history_down(self):
+        down = self.sinfo.copy()
+        down.loc[2, ['status', 'cpu_load', 'cpus', 'free_mem']] = [
+            'down*', float('nan'), '0/0/40/40', float('nan')]
+        # c1-2 is down (no load nor free memory) at every other collection
+        for minute in range(20):
+            record_history(self.path, down if minute % 2 else self.sinfo,
+                           self.start + timedelta(minutes=minute),
+                           policy=[(600, 300)], keep=None)
+        usage = query_history(self.path, by='node')
+        self.assertEqual(usage.samples.tolist(), [20, 20])
+        # averaged over the collections where the node was up
+        self.assertEqual(usage.cpu_load.tolist(), [20., 40.])
+        self.assertEqual(usage.mem_load.tolist(), [50., 75.])
+        self.assertEqual(usage.free_mem.tolist(), [50., 25.])
+        usage = query_history(self.path, by='partition')
+        self.assertEqual(usage.cpu_load.round(2).tolist(), [20., 26.67])
+        self.assertEqual(usage.cpus_avail.tolist(), [10., 5.])
+
+    def test_upgrade_history(self):
+        con = sqlite3.connect(self.path)
+        con.execute('CREATE TABLE samples (node_id INTEGER NOT NULL, '
+                    'time INTEGER NOT NULL, n INTEGER NOT NULL, '
+                    'allocated INTEGER, cpus_avail INTEGER, total INTEGER, '
+                    'cpu_load INTEGER, mem_load INTEGER, free_mem INTEGER, '
+                    'gpus_used INTEGER, gpus INTEGER, '
+                    'PRIMARY KEY (node_id, time)) WITHOUT ROWID')
+        con.execute('CREATE TABLE node_partitions (node_id INTEGER NOT NULL, '
+                    'partition_id INTEGER NOT NULL, PRIMARY KEY (node_id, '
+                    'partition_id)) WITHOUT ROWID')
+        con.execute('INSERT INTO samples VALUES '
+                    '(1, 0, 3, 90, 30, 120, 6000, 15000, 153600, 0, 0), '
+                    '(2, 0, 1, 0, 0, 40, NULL, NULL, NULL, 0, 0)')
+        con.execute('INSERT INTO node_partitions VALUES (1, 1), (2, 1)')
+        con.commit()
+        con.close()
+        con = connect_history(self.path)
+        try:
+            self.assertEqual(con.execute(
+                'SELECT cpu_load_n, mem_load_n, free_mem_n FROM samples '
+                'ORDER BY node_id').fetchall(), [(3, 3, 3), (0, 0, 0)])
+            # the partitions of the nodes, as always
+            self.assertEqual(con.execute(
+                'SELECT * FROM node_partitions').fetchall(),
+                [(1, 1, 0, None), (2, 1, 0, None)])
+        finally:
+            con.close()
+
+    def test_history_retention(self):
+        self.record(range(20), policy=[], keep=300)
+        # minutes 14-19 are kept
+        self.assertEqual(self.count_rows(), 2 * 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import unittest
+from Xsinfo.hostlist import (
+    split_name, compress_hostlist, expand_hostlist, split_hostlist)
+
+
+class TestHostlist(unittest.TestCase):
+
+    def test_split_name(self):
+        self.assertEqual(split_name('gpu-a100-0123'), ('gpu-a100-', '0123', ''))
+        self.assertEqual(split_name('n12ib'), ('n', '12', 'ib'))
+        self.assertEqual(split_name('login'), ('', '', 'login'))
+
+    def test_compress_hostlist(self):
+        names = ['c3-%s' % x for x in [3, 30, 31, 32, 33, 34, 44, 45, 55]]
+        self.assertEqual(compress_hostlist(names), 'c3-[3,30-34,44-45,55]')
+        names = ['c1-2', 'c1-1', 'c6-5', 'c1-3', 'c1-7', 'c1-1', 'login']
+        self.assertEqual(compress_hostlist(names), 'c1-[1-3,7],c6-5,login')
+        names = ['n9', 'n10', 'n11']
+        self.assertEqual(compress_hostlist(names), 'n[9-11]')
+        names = ['gpu-a100-0098', 'gpu-a100-0099', 'gpu-a100-1000', 'n01ib']
+        self.assertEqual(compress_hostlist(names),
+                         'gpu-a100-[0098-0099,1000],n01ib')
+        names = ['n1', 'n01', 'n02']
+        self.assertEqual(compress_hostlist(names), 'n1,n[01-02]')
+        self.assertEqual(compress_hostlist([]), '')
+
+    def test_split_hostlist(self):
+        self.assertEqual(split_hostlist('c1-[1-3,7],c6-5'),
+                         ['c1-[1-3,7]', 'c6-5'])
+        with self.assertRaises(ValueError):
+            split_hostlist('c1-[1-3,c6-5')
+        with self.assertRaises(ValueError):
+            split_hostlist('c1-[[1-3]]')
+
+    def test_expand_hostlist(self):
+        self.assertEqual(expand_hostlist('c1-[1-3,7],c6-5,login'),
+                         ['c1-1', 'c1-2', 'c1-3', 'c1-7', 'c6-5', 'login'])
+        self.assertEqual(expand_hostlist('gpu-[0099-0101]'),
+                         ['gpu-0099', 'gpu-0100', 'gpu-0101'])
+        self.assertEqual(expand_hostlist('rack[1-2]-n[01-02]'),
+                         ['rack1-n01', 'rack1-n02', 'rack2-n01', 'rack2-n02'])
+        with self.assertRaises(ValueError):
+            expand_hostlist('c1-[3-1]')
+
+    def test_roundtrip(self):
+        names = ['c%s-%s' % (x, y) for x in range(1, 4) for y in range(1, 60)
+                 if y % 7]
+        self.assertEqual(expand_hostlist(compress_hostlist(names)), names)
+
+
+if __name__ == '__main__':
+    unittest.main()
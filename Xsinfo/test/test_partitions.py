@@ -0,0 +1,59 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import unittest
+import pandas as pd
+from Xsinfo.partitions import (
+    index_partitions, get_partition_mask, get_overlaps, get_exclusive_nodes,
+    group_nodes)
+
+
+class TestPartitions(unittest.TestCase):
+
+    def setUp(self):
+        self.nodes = pd.DataFrame({
+            'node': ['c1-2', 'c1-1', 'c2-1', 'c1-3', 'c3-1'],
+            'partitions': ['normal*,optimist', 'normal*,optimist', 'bigmem',
+                           'normal*', 'optimist,bigmem']})
+        self.index = index_partitions(self.nodes)
+
+    def test_index_partitions(self):
+        self.assertEqual(self.index['partitions'].tolist(),
+                         ['bigmem', 'normal*', 'optimist'])
+        self.assertEqual(self.index['matrix'].astype(int).tolist(), [
+            [0, 0, 1, 0, 1], [1, 1, 0, 1, 0], [1, 1, 0, 0, 1]])
+        self.assertEqual(self.index['rows'],
+                         {'bigmem': 0, 'normal': 1, 'optimist': 2})
+
+    def test_get_partition_mask(self):
+        self.assertEqual(get_partition_mask(self.index, 'normal').tolist(),
+                         [True, True, False, True, False])
+        self.assertEqual(get_partition_mask(self.index, 'normal*').tolist(),
+                         [True, True, False, True, False])
+        self.assertIsNone(get_partition_mask(self.index, 'gpu'))
+
+    def test_get_overlaps(self):
+        overlaps = get_overlaps(self.index)
+        self.assertEqual(overlaps.loc['optimist'].tolist(), [1, 2, 3])
+        self.assertEqual(overlaps.loc['normal*', 'bigmem'], 0)
+
+    def test_get_exclusive_nodes(self):
+        self.assertEqual(get_exclusive_nodes(self.index),
+                         {'bigmem': 'c2-1', 'normal*': 'c1-3'})
+
+    def test_group_nodes(self):
+        # the same set of partitions whatever their order on a node
+        self.assertEqual(group_nodes(self.index), {
+            'bigmem': 'c2-1',
+            'bigmem,optimist': 'c3-1',
+            'normal*': 'c1-3',
+            'normal*,optimist': 'c1-[1-2]'})
+        self.assertEqual(group_nodes(index_partitions(self.nodes.iloc[:0])),
+                         {})
+
+
+if __name__ == '__main__':
+    unittest.main()
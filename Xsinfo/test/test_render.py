@@ -0,0 +1,104 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import json
+import unittest
+import pandas as pd
+from datetime import datetime
+from Xsinfo.collect import SINFO_COLUMNS, GRES_COLUMNS
+from Xsinfo.render import (
+    render_text, render_tsv, render_json, render_nodes, render_shared)
+from Xsinfo.summary import get_summary_rows
+from Xsinfo.xsinfo import (
+    ClusterState, process_sinfo, get_shared_nodes, summarize)
+
+
+class TestRender(unittest.TestCase):
+
+    def setUp(self):
+        sinfo = pd.DataFrame([
+            ['c1-1', 'normal*', 'mixed', 47.41, '30/10/0/40', 2, 20, 2,
+             182784, 148683.],
+            ['c1-1', 'optimist', 'mixed', 47.41, '30/10/0/40', 2, 20, 2,
+             182784, 148683.],
+            ['c1-3', 'normal*', 'mixed', 34.68, '38/2/0/40', 2, 20, 2,
+             182784, 131670.],
+            ['c1-10', 'normal*', 'idle', 0.01, '0/40/0/40', 2, 20, 2,
+             182784, 184132.]], columns=SINFO_COLUMNS)
+        sinfo_cpu = process_sinfo(sinfo)
+        self.state = ClusterState(
+            sinfo_cpu, get_shared_nodes(sinfo_cpu),
+            '/tmp/2022-09-01T10-00-00.npz', datetime(2022, 9, 1, 10), False)
+        self.summary = get_summary_rows(summarize(sinfo_cpu))
+
+    def test_render_shared(self):
+        text = render_shared(self.state.shared)
+        self.assertIn(' - normal* \t:\t c1-[3,10]', text.split('\n'))
+        self.assertIn(' - normal*,optimist \t:\t c1-1', text.split('\n'))
+
+    def test_render_nodes(self):
+        lines = render_nodes(self.state.sinfo_cpu).split('\n')
+        self.assertEqual(lines[:2], ['##', '\tcpu%\tfreecpu\tmem%\tfreemem'])
+        self.assertEqual(lines[2], 'c1-1\t47.41\t10\t18.6564\t145')
+
+    def test_render_text(self):
+        lines = render_text(self.state, self.summary).split('\n')
+        self.assertTrue(lines[0].startswith(
+            '> Read /tmp/2022-09-01T10-00-00.npz ('))
+        self.assertIn('# Showing nodes per % of cpu load:', lines)
+        self.assertIn('0-25%\t40\t179\t179.0\tnan\t1\tc1-10', lines)
+        self.assertNotIn('##', lines)
+        lines = render_text(self.state, self.summary, True).split('\n')
+        self.assertIn('##', lines)
+
+    def test_render_tsv(self):
+        table = render_tsv(self.state, self.summary).split('\n')
+        self.assertEqual(table[0], 'by\tload\tcpus\tmem\tav\tsd\tnodes\tnames')
+        self.assertEqual(len(table), 1 + sum(
+            len(x) for x in self.summary.values()))
+        self.assertIn('cpu\t0-25\t40\t179\t179.0\t\t1\tc1-10', table)
+
+    def test_render_json(self):
+        document = json.loads(render_json(self.state, self.summary, True))
+        self.assertEqual(document['taken'], '2022-09-01T10:00:00')
+        self.assertFalse(document['collected'])
+        self.assertEqual(document['shared'], self.state.shared)
+        self.assertEqual(sum(x['nodes'] for x in document['summary']['cpu']), 3)
+        self.assertIsNone(document['summary']['cpu'][0]['sd'])
+        self.assertEqual([x['node'] for x in document['nodes']],
+                         ['c1-1', 'c1-3', 'c1-10'])
+        # the float32 loads as their decimals, the free memory in whole GiB
+        self.assertEqual(document['nodes'][0]['cpu_load'], 47.41)
+        self.assertEqual(document['nodes'][0]['mem_load'], 18.6564)
+        self.assertEqual(document['nodes'][0]['free_mem'], 145)
+
+    def test_render_gpus(self):
+        sinfo = pd.DataFrame([
+            ['c1-1', 'normal*', 'idle', 0.01, '0/40/0/40', 2, 20, 2,
+             182784, 184132., '(null)', '(null)', ''],
+            ['g1-1', 'gpu', 'mixed', 8.2, '8/56/0/64', 2, 32, 1,
+             515000, 400000., 'gpu:a100:4(S:0-1)', 'gpu:a100:3(IDX:0-2)',
+             'a100']], columns=SINFO_COLUMNS + GRES_COLUMNS)
+        sinfo_cpu = process_sinfo(sinfo)
+        state = self.state._replace(sinfo_cpu=sinfo_cpu)
+        summary = get_summary_rows(summarize(sinfo_cpu))
+        self.assertEqual(sorted(summary), ['cpu', 'gpu', 'mem'])
+        lines = render_text(state, summary, True).split('\n')
+        self.assertIn('# Showing nodes per % of gpu load:', lines)
+        self.assertIn('%\tgpus\tcpus\tmem(gb)\tav\t±\tnodes\tnames', lines)
+        self.assertIn('50-75%\t1\t56\t390\t390.0\tnan\t1\tg1-1', lines)
+        self.assertIn('\tcpu%\tfreecpu\tmem%\tfreemem\tfreegpu', lines)
+        table = render_tsv(state, summary).split('\n')
+        self.assertEqual(table[0],
+                         'by\tload\tgpus\tcpus\tmem\tav\tsd\tnodes\tnames')
+        self.assertIn('gpu\t50-75\t1\t56\t390\t390.0\t\t1\tg1-1', table)
+        self.assertTrue(table[1].startswith('cpu\t0-25\t\t'))
+        document = json.loads(render_json(state, summary))
+        self.assertEqual(document['summary']['gpu'][0]['gpus'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
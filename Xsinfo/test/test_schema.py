@@ -0,0 +1,54 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import unittest
+import numpy as np
+import pandas as pd
+from Xsinfo.schema import mib_to_gib, apply_schema, to_display
+
+
+class TestSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.table = pd.DataFrame({
+            'node': ['c1-1', 'c1-2', 'c1-3'],
+            'partitions': ['normal*', 'normal*,gpu', 'normal*'],
+            'cpus_avail': [10., 2., 64.],
+            'mem': [182784, 182784, 515000],
+            'free_mem': [145., np.nan, 390.],
+            'cpu_load': [20.01, 47.41, np.nan]})
+
+    def test_mib_to_gib(self):
+        self.assertEqual(mib_to_gib([1023, 1024, 148683]).tolist(),
+                         [0., 1., 145.])
+        gib = mib_to_gib(pd.Series([2048., np.nan]))
+        self.assertEqual(gib[0], 2.)
+        self.assertTrue(np.isnan(gib[1]))
+
+    def test_apply_schema(self):
+        apply_schema(self.table)
+        self.assertEqual(self.table.dtypes.astype(str).tolist()[1:], [
+            'category', 'uint16', 'uint32', 'float32', 'float32'])
+        self.assertEqual(self.table.partitions.cat.categories.tolist(),
+                         ['normal*', 'normal*,gpu'])
+        # already cast, i.e. not copied
+        cpus = self.table.cpus_avail.to_numpy()
+        apply_schema(self.table)
+        self.assertTrue(np.shares_memory(self.table.cpus_avail.to_numpy(),
+                                         cpus))
+
+    def test_to_display(self):
+        apply_schema(self.table)
+        table = to_display(self.table)
+        self.assertEqual(table.cpu_load.tolist()[:2], [20.01, 47.41])
+        self.assertEqual(table.free_mem.dtype, 'Int64')
+        self.assertTrue(pd.isna(table.free_mem[1]))
+        # the table itself is left as it is
+        self.assertEqual(self.table.cpu_load.dtype, 'float32')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from datetime import datetime
+from os.path import basename, join
+from Xsinfo.snapshot import (
+    list_snapshots, get_latest_snapshot, write_snapshot, prune_snapshots,
+    read_snapshot, snapshot_time, snapshot_age, get_fresh_snapshot, parse_age,
+    write_npz, read_npz)
+from Xsinfo.schema import apply_schema
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.sinfo_cpu = pd.DataFrame({
+            'node': ['c1-1', 'c1-2'], 'partition': ['normal*', 'normal*'],
+            'cpus_avail': [10., 2.], 'free_mem': [148, 131]})
+        apply_schema(self.sinfo_cpu)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_write_snapshot(self):
+        taken = datetime(2022, 3, 1, 9, 30, 5)
+        snapshot = write_snapshot(self.sinfo_cpu, self.dir, taken, 'tsv')
+        self.assertEqual(snapshot, join(self.dir, '2022-03-01T09-30-05.tsv'))
+        self.assertEqual(os.listdir(self.dir), [basename(snapshot)])
+        self.assertEqual(os.stat(snapshot).st_mode & 0o777, 0o644)
+        self.assertEqual(snapshot_time(snapshot), taken)
+        # the dtypes of the schema, that the tsv does not keep
+        pd.testing.assert_frame_equal(read_snapshot(snapshot), self.sinfo_cpu)
+
+    def test_write_snapshot_npz(self):
+        self.sinfo_cpu['cpu_load_bin'] = pd.cut(
+            [10., 60.], [-1, 25, 50, 75, 100],
+            labels=['0-25', '25-50', '50-75', '75-100'])
+        sinfo_cpu = self.sinfo_cpu.drop(index=[0])
+        snapshot = write_snapshot(sinfo_cpu, self.dir,
+                                  datetime(2022, 3, 1, 9, 30, 5))
+        self.assertEqual(snapshot, join(self.dir, '2022-03-01T09-30-05.npz'))
+        pd.testing.assert_frame_equal(read_snapshot(snapshot),
+                                      sinfo_cpu.reset_index(drop=True))
+
+    def test_write_snapshot_format(self):
+        with self.assertRaises(ValueError):
+            write_snapshot(self.sinfo_cpu, self.dir, fmt='xlsx')
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_npz(self):
+        table = pd.DataFrame({
+            'node': ['c1-1', 'c1-1', None, 'c1-2'],
+            'bin': pd.Categorical(['a', 'b', 'a', None], categories=['b', 'a']),
+            'cpus': [1, 2, 3, 4], 'mem': [1.5, float('nan'), 2., 0.]})
+        npz = join(self.dir, 'table.npz')
+        write_npz(table, npz)
+        pd.testing.assert_frame_equal(read_npz(npz), table)
+
+    def test_get_latest_snapshot(self):
+        self.assertIsNone(get_latest_snapshot(self.dir))
+        for hour, fmt in [(10, 'tsv'), (9, 'npz'), (11, 'tsv')]:
+            write_snapshot(self.sinfo_cpu, self.dir, datetime(2022, 3, 1, hour),
+                           fmt)
+        # unfinished snapshots of a concurrent writer are ignored
+        open(join(self.dir, '.tmp1234.tmp'), 'w').close()
+        self.assertEqual(get_latest_snapshot(self.dir),
+                         join(self.dir, '2022-03-01T11-00-00.tsv'))
+
+    def test_prune_snapshots(self):
+        for hour in range(5):
+            write_snapshot(self.sinfo_cpu, self.dir, datetime(2022, 3, 1, hour),
+                           'tsv' if hour % 2 else 'npz')
+        removed = prune_snapshots(self.dir, 2, None)
+        self.assertEqual(len(removed), 3)
+        self.assertEqual(list(map(basename, list_snapshots(self.dir))), [
+            '2022-03-01T03-00-00.tsv', '2022-03-01T04-00-00.npz'])
+
+    def test_prune_snapshots_derived(self):
+        for hour in range(3):
+            snapshot = write_snapshot(self.sinfo_cpu, self.dir,
+                                      datetime(2022, 3, 1, hour))
+            open(snapshot.replace('.npz', '.delta.json'), 'w').close()
+        prune_snapshots(self.dir, 1, None)
+        self.assertEqual(sorted(os.listdir(self.dir)), [
+            '2022-03-01T02-00-00.delta.json', '2022-03-01T02-00-00.npz'])
+        self.assertEqual(len(list_snapshots(self.dir)), 1)
+
+    def test_prune_snapshots_age(self):
+        # daily snapshot of Xsinfo <= 1.2
+        open(join(self.dir, '2022-02-28.tsv'), 'w').close()
+        for hour in range(5):
+            write_snapshot(self.sinfo_cpu, self.dir, datetime(2022, 3, 1, hour))
+        removed = prune_snapshots(self.dir, 10, 2.5 * 3600,
+                                  now=datetime(2022, 3, 1, 5))
+        self.assertEqual(list(map(basename, removed)), [
+            '2022-02-28.tsv', '2022-03-01T00-00-00.npz',
+            '2022-03-01T01-00-00.npz', '2022-03-01T02-00-00.npz'])
+
+    def test_snapshot_age(self):
+        snapshot = write_snapshot(self.sinfo_cpu, self.dir,
+                                  datetime(2022, 3, 1, 23, 59))
+        # a snapshot of one minute ago is not stale on the next day
+        self.assertEqual(snapshot_age(snapshot, datetime(2022, 3, 2)), 60.)
+
+    def test_get_fresh_snapshot(self):
+        other = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other)
+        write_snapshot(self.sinfo_cpu, self.dir, datetime(2022, 3, 1, 9))
+        newest = write_snapshot(self.sinfo_cpu, other,
+                                datetime(2022, 3, 1, 9, 5))
+        now = datetime(2022, 3, 1, 9, 10)
+        dirs = [None, self.dir, other, join(self.dir, 'missing')]
+        self.assertEqual(get_fresh_snapshot(dirs, 600, now), newest)
+        self.assertIsNone(get_fresh_snapshot(dirs, 60, now))
+        self.assertIsNone(get_fresh_snapshot([None], 60, now))
+
+    def test_get_fresh_snapshot_legacy(self):
+        # daily snapshot of Xsinfo <= 1.2, per partition (no "partitions")
+        legacy = join(self.dir, '2022-03-01.tsv')
+        self.sinfo_cpu.to_csv(legacy, sep='\t', index=False)
+        now = datetime(2022, 3, 1, 9)
+        self.assertIsNone(get_latest_snapshot(self.dir))
+        self.assertIsNone(get_fresh_snapshot([self.dir], 2 * 86400, now))
+        newest = write_snapshot(self.sinfo_cpu, self.dir,
+                                datetime(2022, 2, 28, 9))
+        self.assertEqual(get_fresh_snapshot([self.dir], 2 * 86400, now),
+                         newest)
+        # still pruned with the others
+        self.assertIn(legacy, list_snapshots(self.dir))
+
+    def test_parse_age(self):
+        self.assertEqual(parse_age('90'), 90.)
+        self.assertEqual(parse_age('90s'), 90.)
+        self.assertEqual(parse_age('10m'), 600.)
+        self.assertEqual(parse_age('1.5h'), 5400.)
+        self.assertEqual(parse_age('2D'), 172800.)
+        with self.assertRaises(ValueError):
+            parse_age('ten minutes')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from datetime import datetime
+from contextlib import redirect_stdout
+from Xsinfo.collect import SINFO_COLUMNS
+from Xsinfo.snapshot import write_snapshot
+from Xsinfo.summary import (
+    summary_path, get_summary_rows, write_summary, read_summary,
+    show_cached_summary)
+from Xsinfo.xsinfo import process_sinfo, summarize, get_shared_nodes
+
+
+class TestSummary(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        sinfo = pd.DataFrame([
+            ['c1-1', 'normal*', 'mixed', 47.41, '30/10/0/40', 2, 20, 2,
+             182784, 148683.],
+            ['c1-3', 'normal*', 'mixed', 34.68, '38/2/0/40', 2, 20, 2,
+             182784, 131670.]], columns=SINFO_COLUMNS)
+        self.sinfo_cpu = process_sinfo(sinfo)
+        self.summary = get_summary_rows(summarize(self.sinfo_cpu))
+        self.shared = get_shared_nodes(self.sinfo_cpu)
+        self.snapshot = write_snapshot(self.sinfo_cpu, self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_write_summary(self):
+        output = write_summary(self.snapshot, self.summary, self.shared)
+        self.assertEqual(output, summary_path(self.snapshot))
+        self.assertTrue(output.endswith('.summary.json'))
+        cached = read_summary(self.snapshot)
+        # compared as text, as the standard deviation of one node is nan
+        self.assertEqual(repr(cached['summary']), repr(self.summary))
+        self.assertEqual(cached['shared'], {'normal*': 'c1-[1,3]'})
+
+    def test_read_summary_other_snapshot(self):
+        write_summary(self.snapshot, self.summary, self.shared)
+        # same snapshot name, but a file rewritten after its summary
+        with open(summary_path(self.snapshot)) as f:
+            cached = json.load(f)
+        cached['snapshot'] = cached['snapshot'] + '0'
+        with open(summary_path(self.snapshot), 'w') as o:
+            json.dump(cached, o)
+        self.assertIsNone(read_summary(self.snapshot))
+
+    def test_read_summary_missing(self):
+        self.assertIsNone(read_summary(self.snapshot))
+        with open(summary_path(self.snapshot), 'w') as o:
+            o.write('{"cpu": [')
+        self.assertIsNone(read_summary(self.snapshot))
+
+    def test_show_cached_summary(self):
+        with redirect_stdout(io.StringIO()) as out:
+            self.assertFalse(show_cached_summary(self.dir, 600))
+        self.assertEqual(out.getvalue(), '')
+        write_summary(self.snapshot, self.summary, self.shared)
+        with redirect_stdout(io.StringIO()) as out:
+            self.assertTrue(show_cached_summary(self.dir, 600))
+        lines = out.getvalue().split('\n')
+        self.assertTrue(lines[0].startswith('> Read %s (' % self.snapshot))
+        self.assertIn('25-50%\t12\t273\t136.5\t12.0208\t2\tc1-[1,3]', lines)
+        with redirect_stdout(io.StringIO()) as out:
+            self.assertTrue(show_cached_summary(self.dir, 600, 'json'))
+        document = json.loads(out.getvalue())
+        self.assertEqual(document['snapshot'], self.snapshot)
+        self.assertEqual(document['shared'], self.shared)
+        # the Slurm snapshot is not that of a Torque cluster
+        with redirect_stdout(io.StringIO()) as out:
+            self.assertFalse(show_cached_summary(self.dir, 600,
+                                                 backend='torque'))
+        self.assertEqual(out.getvalue(), '')
+
+    def test_show_cached_summary_old(self):
+        old = write_snapshot(self.sinfo_cpu, self.dir, datetime(2022, 1, 1))
+        write_summary(old, self.summary, self.shared)
+        os.remove(self.snapshot)
+        with redirect_stdout(io.StringIO()):
+            self.assertFalse(show_cached_summary(self.dir, 600))
+
+
+if __name__ == '__main__':
+    unittest.main()
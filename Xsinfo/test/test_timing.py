@@ -0,0 +1,120 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from os.path import join
+from Xsinfo.timing import (
+    start_trace, stop_trace, start_poll, stop_poll, timed, render_trace,
+    write_trace, render_prometheus, write_prometheus, TRACE)
+
+
+class TestTiming(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.records = [
+            {'stage': 'collect', 'rows': 4, 'start': 0., 'wall': .5,
+             'cpu': .1, 'depth': 0},
+            {'stage': 'sinfo', 'rows': 2, 'start': 0., 'wall': .2,
+             'cpu': .05, 'depth': 1},
+            {'stage': 'sinfo', 'rows': 2, 'start': .2, 'wall': .25,
+             'cpu': .05, 'depth': 1}]
+
+    def tearDown(self):
+        TRACE['records'] = None
+        shutil.rmtree(self.dir)
+
+    def test_timed_not_tracing(self):
+        with timed('collect') as record:
+            record['rows'] = 1
+        self.assertEqual(stop_trace(), [])
+
+    def test_timed(self):
+        start_trace()
+        with timed('collect') as record:
+            with timed('sinfo'):
+                pass
+            record['rows'] = 3
+        records = stop_trace()
+        self.assertEqual([(x['stage'], x['depth'], x['rows'])
+                          for x in records],
+                         [('collect', 0, 3), ('sinfo', 1, None)])
+        self.assertGreaterEqual(records[0]['wall'], records[1]['wall'])
+        # not recorded once the trace is stopped
+        with timed('collect'):
+            pass
+        self.assertEqual(stop_trace(), [])
+
+    def test_poll(self):
+        # polls without a trace of the whole run: only their own records
+        for stage in ['collect', 'render']:
+            mark = start_poll()
+            with timed(stage):
+                pass
+            self.assertEqual([x['stage'] for x in stop_poll(mark)], [stage])
+        self.assertEqual(TRACE['records'], [])
+        # polls during a trace of the whole run (e.g. --profile)
+        start_trace()
+        with timed('import'):
+            pass
+        for stage in ['collect', 'render']:
+            mark = start_poll()
+            with timed(stage):
+                pass
+            self.assertEqual([x['stage'] for x in stop_poll(mark)], [stage])
+        self.assertEqual([x['stage'] for x in stop_trace()],
+                         ['import', 'collect', 'render'])
+
+    def test_timed_error(self):
+        start_trace()
+        with self.assertRaises(OSError):
+            with timed('sinfo'):
+                raise OSError('sinfo failed')
+        with timed('collect'):
+            pass
+        self.assertEqual([(x['stage'], x['depth']) for x in stop_trace()],
+                         [('sinfo', 0), ('collect', 0)])
+
+    def test_render_trace(self):
+        self.assertEqual(render_trace(self.records[:2]), '\n'.join([
+            '# stage\twall(s)\tcpu(s)\trows',
+            'collect\t0.5000\t0.1000\t4',
+            '  sinfo\t0.2000\t0.0500\t2']))
+
+    def test_write_trace(self):
+        output = join(self.dir, 'trace.json')
+        write_trace(self.records, output)
+        with open(output) as f:
+            self.assertEqual(json.load(f), {'stages': self.records})
+
+    def test_render_prometheus(self):
+        text = render_prometheus(self.records, {'xsinfo_polls_total': 3,
+                                                'xsinfo_interval': 60})
+        lines = text.split('\n')
+        self.assertIn('# TYPE xsinfo_stage_seconds gauge', lines)
+        self.assertIn('xsinfo_stage_seconds{stage="collect"} 0.5', lines)
+        # the runs of a stage are summed
+        self.assertIn('xsinfo_stage_seconds{stage="sinfo"} 0.45', lines)
+        self.assertIn('xsinfo_stage_rows{stage="sinfo"} 4.0', lines)
+        self.assertIn('# TYPE xsinfo_polls_total counter', lines)
+        self.assertIn('xsinfo_polls_total 3.0', lines)
+        self.assertIn('# TYPE xsinfo_interval gauge', lines)
+        self.assertTrue(text.endswith('xsinfo_interval 60.0\n'))
+
+    def test_write_prometheus(self):
+        path = join(self.dir, 'xsinfo.prom')
+        write_prometheus(path, self.records)
+        with open(path) as f:
+            self.assertEqual(f.read(), render_prometheus(self.records))
+        self.assertEqual(os.listdir(self.dir), ['xsinfo.prom'])
+
+
+if __name__ == '__main__':
+    unittest.main()
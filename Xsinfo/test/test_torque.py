@@ -0,0 +1,90 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import os
+import io
+import tempfile
+import unittest
+import pkg_resources
+import pandas as pd
+from contextlib import redirect_stdout
+from Xsinfo.backends import get_backend, read_sinfo_file
+from Xsinfo.collect import SINFO_SPEC, SINFO_COLUMNS
+from Xsinfo.torque import parse_pbs_mem, count_job_cores, read_pbsnodes
+from Xsinfo.xsinfo import process_sinfo, run_xsinfo
+
+ROOT = pkg_resources.resource_filename("Xsinfo", "test")
+PBSNODES = '%s/pbsnodes.xml' % ROOT
+
+
+class TestTorque(unittest.TestCase):
+
+    def test_parse_pbs_mem(self):
+        self.assertEqual(parse_pbs_mem('196608000kb'), 192000.)
+        self.assertEqual(parse_pbs_mem('32gb'), 32768.)
+        self.assertEqual(parse_pbs_mem('2097152'), 2.)
+        self.assertTrue(pd.isna(parse_pbs_mem(None)))
+
+    def test_count_job_cores(self):
+        self.assertEqual(count_job_cores(''), 0)
+        self.assertEqual(count_job_cores('0-15/15.srv'), 16)
+        # core 8 is shared by two jobs
+        self.assertEqual(
+            count_job_cores('0-3,8/12.srv,4-7/13.srv,8/14.srv'), 9)
+
+    def test_read_pbsnodes(self):
+        sinfo = read_pbsnodes(PBSNODES)
+        self.assertEqual(sinfo.columns.tolist(), SINFO_COLUMNS)
+        for col, _, _, dtype in SINFO_SPEC:
+            if dtype is not str:
+                self.assertEqual(sinfo[col].dtype, dtype)
+        self.assertEqual(sinfo.node.tolist(),
+                         ['n001', 'n001', 'n002', 'n003', 'n004', 'n005'])
+        self.assertEqual(sinfo.partition.tolist(),
+                         ['batch', 'long', 'batch', 'batch', 'long', ''])
+        self.assertEqual(
+            sinfo.status.tolist(),
+            ['idle', 'idle', 'mixed', 'allocated', 'drained', 'idle'])
+        self.assertEqual(
+            sinfo.cpus.tolist(),
+            ['0/32/0/32', '0/32/0/32', '9/23/0/32', '16/0/0/16', '0/0/16/16',
+             '0/8/0/8'])
+        self.assertEqual(sinfo.loc[0, ['socket', 'cores', 'threads', 'mem']]
+                         .tolist(), [2, 8, 2, 192000])
+        # available memory without the free swap
+        self.assertEqual(sinfo.free_mem[2], 94343.75)
+        self.assertTrue(pd.isna(sinfo.free_mem[4]))
+
+    def test_process_pbsnodes(self):
+        sinfo_cpu = process_sinfo(read_pbsnodes(PBSNODES))
+        self.assertEqual(sinfo_cpu.node.tolist(), ['n001', 'n002', 'n005'])
+        self.assertEqual(sinfo_cpu.partitions.tolist(),
+                         ['batch,long', 'batch', ''])
+        self.assertEqual(sinfo_cpu.cpus_avail.tolist(), [32, 23, 8])
+        self.assertEqual(sinfo_cpu.free_mem.tolist(), [182, 92, 16])
+
+    def test_get_backend(self):
+        self.assertEqual(get_backend('torque')['command'], 'pbsnodes')
+        self.assertEqual(get_backend('slurm')['command'], 'sinfo')
+        self.assertIs(get_backend('slurm')['read'], read_sinfo_file)
+        sinfo = get_backend('torque')['read'](PBSNODES)
+        self.assertEqual(sinfo.shape, (6, len(SINFO_COLUMNS)))
+        with self.assertRaises(ValueError):
+            get_backend('lsf')
+
+    def test_run_xsinfo_no_pbsnodes(self):
+        path, home = os.environ.get('PATH'), os.environ.get('HOME')
+        os.environ['PATH'] = os.environ['HOME'] = tempfile.mkdtemp()
+        try:
+            with redirect_stdout(io.StringIO()):
+                with self.assertRaisesRegex(OSError, '`pbsnodes`'):
+                    run_xsinfo(True, True, False)
+        finally:
+            os.environ['PATH'], os.environ['HOME'] = path, home
+
+
+if __name__ == '__main__':
+    unittest.main()
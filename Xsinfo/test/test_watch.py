@@ -0,0 +1,94 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+import io
+import os
+import tempfile
+import unittest
+import pandas as pd
+from Xsinfo.backends import register_backend, BACKENDS
+from Xsinfo.collect import SINFO_COLUMNS
+from Xsinfo.watch import (
+    get_watch_interval, fit_screen, redraw, run_watch, CLEAR_SCREEN)
+
+
+class TestWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.sinfo = [
+            pd.DataFrame([
+                ['c1-1', 'normal*', 'mixed', 47.41, '30/10/0/40', 2, 20, 2,
+                 182784, 148683.],
+                ['c1-2', 'normal*', 'idle', 0.01, '0/40/0/40', 2, 20, 2,
+                 182784, 184132.]], columns=SINFO_COLUMNS),
+            pd.DataFrame([
+                ['c1-1', 'normal*', 'mixed', 47.41, '30/10/0/40', 2, 20, 2,
+                 182784, 148683.],
+                ['c1-2', 'normal*', 'mixed', 30.01, '36/4/0/40', 2, 20, 2,
+                 182784, 84132.]], columns=SINFO_COLUMNS)]
+        register_backend('watch-test', 'true', self.collect, None)
+
+    def tearDown(self):
+        del BACKENDS['watch-test']
+
+    def collect(self):
+        sinfo = self.sinfo.pop(0)
+        if isinstance(sinfo, Exception):
+            raise sinfo
+        return sinfo
+
+    def test_get_watch_interval(self):
+        self.assertEqual(get_watch_interval(10, .5), 10)
+        # slow controller: polled less often
+        self.assertEqual(get_watch_interval(10, 4), 20)
+
+    def test_fit_screen(self):
+        self.assertEqual(fit_screen(['a\tb', 'abcdefghijkl', 'c'], 10, 3),
+                         ['a       b', 'abcdefghi'])
+
+    def test_redraw(self):
+        out = io.StringIO()
+        redraw(None, ['a', 'b', 'c'], out)
+        self.assertEqual(out.getvalue(), CLEAR_SCREEN + 'a\nb\nc\n')
+        out = io.StringIO()
+        redraw(['a', 'b', 'c'], ['a', 'x'], out)
+        # only the changed line, and the lines below the report are cleared
+        self.assertEqual(out.getvalue(), '\033[2;1Hx\033[K\033[3;1H\033[J')
+
+    def test_run_watch(self):
+        out = io.StringIO()
+        run_watch(0, backend='watch-test', iterations=2, out=out)
+        reports = out.getvalue().split('> ')[1:]
+        self.assertEqual(len(reports), 2)
+        self.assertIn('true took', reports[0])
+        self.assertIn('0-25%\t50\t324\t162.0', reports[0])
+        self.assertIn('25-50%\t14\t227\t113.5', reports[1])
+
+    def test_run_watch_failure(self):
+        self.sinfo.insert(1, KeyError('partition'))
+        out = io.StringIO()
+        run_watch(0, backend='watch-test', iterations=3, out=out)
+        reports = out.getvalue().split('> ')[1:]
+        # the failed poll is reported with the previous report
+        self.assertIn("collection failed (KeyError: 'partition')", reports[1])
+        self.assertIn('0-25%\t50\t324\t162.0', reports[1])
+        self.assertIn('25-50%\t14\t227\t113.5', reports[2])
+
+    def test_run_watch_metrics(self):
+        with tempfile.TemporaryDirectory() as directory:
+            metrics = os.path.join(directory, 'xsinfo.prom')
+            run_watch(0, backend='watch-test', iterations=2,
+                      out=io.StringIO(), metrics=metrics)
+            with open(metrics) as f:
+                lines = f.read().split('\n')
+        self.assertIn('xsinfo_polls_total 2.0', lines)
+        self.assertIn('xsinfo_stage_rows{stage="collect"} 2.0', lines)
+        self.assertTrue(any(x.startswith(
+            'xsinfo_stage_seconds{stage="render"}') for x in lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
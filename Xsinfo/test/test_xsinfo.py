@@ -4,11 +4,20 @@
 # Distributed under the terms of the Modified BSD License.
 # ----------------------------------------------------------------------------
 
+import io
+import os
+import tempfile
 import unittest
 import pkg_resources
-from Xsinfo.xsinfo import run_xsinfo
+import pandas as pd
+from contextlib import redirect_stdout
+from Xsinfo.xsinfo import (
+    run_xsinfo, expand_cpus, normalize_sinfo, get_membership, process_sinfo,
+    summarize)
+from Xsinfo.render import SUMMARY_COLUMNS
+from Xsinfo.bins import get_bins
 
-ROOT = pkg_resources.resource_filename("Xpbs", "test")
+ROOT = pkg_resources.resource_filename("Xsinfo", "test")
 
 
 class TestXsinfo(unittest.TestCase):
@@ -66,11 +75,108 @@ class TestXsinfo(unittest.TestCase):
             ['c3-1', 'normal*', 'idle', '0.01', '0/40/0/40', '2', '20', '2',
             '182784', '184132']]
 
+        self.columns = ['node', 'partition', 'status', 'cpu_load', 'cpus',
+                        'socket', 'cores', 'threads', 'mem', 'free_mem']
+
+    def test_normalize_sinfo(self):
+        sinfo = pd.DataFrame(self.sinfo, columns=self.columns)
+        nodes, membership = normalize_sinfo(sinfo)
+        self.assertEqual(nodes.shape, (12, 10))
+        self.assertEqual(nodes.columns.tolist()[:3],
+                         ['node', 'partitions', 'status'])
+        self.assertEqual(nodes.node.tolist()[:3], ['c1-1', 'c1-2', 'c1-3'])
+        self.assertEqual(nodes.partitions.tolist()[:3], [
+            'normal*,optimist', 'optimist,normal*', 'optimist,normal*'])
+        self.assertEqual(membership.shape, (24, 2))
+        pd.testing.assert_frame_equal(get_membership(nodes), membership)
+
+    def test_process_sinfo(self):
+        sinfo = pd.DataFrame(self.sinfo, columns=self.columns)
+        sinfo_cpu = process_sinfo(sinfo)
+        # reserved and fully allocated nodes are removed
+        self.assertEqual(sinfo_cpu.node.tolist(), [
+            'c1-1', 'c1-3', 'c1-8', 'c1-10', 'c2-1', 'c3-1'])
+        self.assertEqual(sinfo_cpu.cpus_avail.sum(), 137)
+        self.assertFalse(sinfo_cpu.node.duplicated().any())
+        # compact dtypes, and the free memory in GiB (1024 MiB)
+        self.assertEqual(sinfo_cpu.cpus_avail.dtype, 'uint16')
+        self.assertEqual(sinfo_cpu.mem.dtype, 'uint32')
+        self.assertEqual(sinfo_cpu.cpu_load.dtype, 'float32')
+        self.assertEqual(sinfo_cpu.partitions.dtype, 'category')
+        self.assertEqual(sinfo_cpu.status.dtype, 'category')
+        self.assertEqual(sinfo_cpu.free_mem.tolist()[:3], [145, 128, 125])
+
+    def test_process_sinfo_unknown_free_mem(self):
+        sinfo = pd.DataFrame(self.sinfo, columns=self.columns)
+        sinfo.loc[sinfo.node == 'c1-10', 'free_mem'] = float('nan')
+        sinfo_cpu = process_sinfo(sinfo)
+        self.assertEqual(sinfo_cpu.node.tolist(), [
+            'c1-1', 'c1-3', 'c1-8', 'c1-10', 'c2-1', 'c3-1'])
+        self.assertTrue(pd.isna(sinfo_cpu.free_mem.iloc[3]))
+        self.assertTrue(pd.isna(sinfo_cpu.mem_load.iloc[3]))
+        # the node is counted, but not in the free memory stats
+        summary = summarize(sinfo_cpu)
+        self.assertEqual(summary['cpu'].nodes.sum(), 6)
+        idle = summary['cpu'].iloc[0]
+        self.assertEqual(idle[['cpus', 'mem', 'av', 'nodes']].tolist(),
+                         [120, 358, 179.0, 3])
+
+    def test_expand_cpus(self):
+        sinfo = pd.DataFrame(self.sinfo, columns=self.columns)
+        sinfo_cpu = expand_cpus(sinfo)
+        self.assertEqual(sinfo_cpu.shape, (24, 14))
+        self.assertEqual(sinfo_cpu.loc[0, 'allocated'], 30)
+        self.assertEqual(sinfo_cpu.loc[0, 'cpus_avail'], 10)
+        self.assertEqual(sinfo_cpu.loc[0, 'other'], 0)
+        self.assertEqual(sinfo_cpu.loc[0, 'total'], 40)
+        self.assertEqual(sinfo_cpu.cpus_avail.sum(), 274)
+
+    def test_expand_cpus_empty(self):
+        sinfo = pd.DataFrame([], columns=self.columns)
+        sinfo_cpu = expand_cpus(sinfo)
+        self.assertEqual(sinfo_cpu.shape, (0, 14))
+
+    def test_summarize(self):
+        sinfo = pd.DataFrame(self.sinfo, columns=self.columns)
+        summary = summarize(process_sinfo(sinfo))
+        self.assertEqual(sorted(summary), ['cpu', 'mem'])
+        for table in summary.values():
+            self.assertEqual(table.columns.tolist(), SUMMARY_COLUMNS)
+            self.assertEqual(table.cpus.sum(), 137)
+            self.assertEqual(table.nodes.sum(), 6)
+
+    def test_summarize_bins(self):
+        sinfo = pd.DataFrame(self.sinfo, columns=self.columns)
+        sinfo_cpu = process_sinfo(sinfo)
+        summary = summarize(sinfo_cpu, get_bins('0,1,40,100', grid=True))
+        self.assertEqual(sorted(summary), ['cpu', 'cpu-mem', 'mem'])
+        self.assertEqual(summary['cpu'].load.tolist(),
+                         ['0-1', '1-40', '40-100'])
+        self.assertEqual(summary['cpu'].names.tolist(),
+                         ['c1-10,c2-1,c3-1', 'c1-[3,8]', 'c1-1'])
+        self.assertEqual(summary['cpu-mem'].load.tolist(),
+                         ['0-1/0-1', '1-40/1-40', '40-100/1-40'])
+        self.assertEqual(summary['cpu-mem'].nodes.tolist(), [3, 2, 1])
+        self.assertEqual(summary['cpu-mem'].cpus.sum(), 137)
+        # same stats as the quartiles assigned to the nodes
+        summary = summarize(sinfo_cpu)
+        for by in ['cpu', 'mem']:
+            groups = sinfo_cpu.astype({'free_mem': float}).groupby(
+                '%s_load_bin' % by, observed=True)
+            self.assertEqual(summary[by].load.tolist(), list(groups.groups))
+            self.assertEqual(summary[by].av.tolist(),
+                             groups.free_mem.mean().round(4).tolist())
+
     def test_xsinfo(self):
-        run_xsinfo(True, False)
-        with open(self.out_fp) as f_ref:
-            self.pbs2_out = f_ref.readlines()
-        self.assertEqual(self.pbs2, self.pbs2_out)
+        path, home = os.environ.get('PATH'), os.environ.get('HOME')
+        os.environ['PATH'] = os.environ['HOME'] = tempfile.mkdtemp()
+        try:
+            with redirect_stdout(io.StringIO()) as out:
+                with self.assertRaisesRegex(OSError, '`sinfo`'):
+                    run_xsinfo(False, True, False)
+        finally:
+            os.environ['PATH'], os.environ['HOME'] = path, home
+        self.assertEqual(out.getvalue(), '')
 
 
 if __name__ == '__main__':
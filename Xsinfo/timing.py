@@ -0,0 +1,231 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Timing of the pipeline stages (wall time, CPU time and number of rows),
+e.g. to tell the time spent waiting for slurmctld from the time spent
+importing pandas or processing the nodes.
+
+The stages are only measured while a trace is started (`start_trace`), so
+that `timed` costs nothing otherwise. This module does not import pandas."""
+
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# records of the current trace (None if not tracing), and whether it was only
+# started for the polls (see `start_poll`)
+TRACE = {'records': None, 'start': 0., 'depth': threading.local(),
+         'polls': False}
+# (metric, type, help, record field) of the Prometheus metrics of a poll
+PROMETHEUS_METRICS = [
+    ('xsinfo_stage_seconds', 'gauge',
+     'Wall time of each stage of the last poll.', 'wall'),
+    ('xsinfo_stage_cpu_seconds', 'gauge',
+     'CPU time of the process during each stage of the last poll.', 'cpu'),
+    ('xsinfo_stage_rows', 'gauge',
+     'Number of rows output by each stage of the last poll.', 'rows')]
+
+
+def start_trace() -> None:
+    """Start recording the stages (and forget the previous records)."""
+    TRACE['records'] = []
+    TRACE['start'] = time.perf_counter()
+    TRACE['polls'] = False
+
+
+def stop_trace() -> list:
+    """
+    Stop recording the stages.
+
+    Returns
+    -------
+    records : list
+        Records of the stages, in order of start (see `timed`).
+    """
+    records = TRACE['records'] or []
+    TRACE['records'] = None
+    return sorted(records, key=lambda x: x['start'])
+
+
+def start_poll() -> int:
+    """
+    Start recording the stages of a poll (of the daemon or the watch mode),
+    in the current trace if one is started (e.g. for the whole run), which
+    is then neither reset nor stopped by the polls.
+
+    Returns
+    -------
+    mark : int
+        Number of records of the trace before the poll.
+    """
+    if TRACE['records'] is None:
+        start_trace()
+        TRACE['polls'] = True
+    return len(TRACE['records'])
+
+
+def stop_poll(mark: int) -> list:
+    """
+    Get the records of the stages of a poll. They are kept in a trace that
+    was started before the polls, and otherwise forgotten (so that the trace
+    does not grow with the polls).
+
+    Parameters
+    ----------
+    mark : int
+        Number of records of the trace before the poll (see `start_poll`).
+
+    Returns
+    -------
+    records : list
+        Records of the stages of the poll, in order of start.
+    """
+    records = TRACE['records'] or []
+    poll = sorted(records[mark:], key=lambda x: x['start'])
+    if TRACE['polls']:
+        del records[mark:]
+    return poll
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Record the wall and CPU times of a stage, if a trace is started.
+
+    Parameters
+    ----------
+    stage : str
+        Stage name, e.g. "expand_cpus" or "sinfo" (subprocess).
+
+    Yields
+    ------
+    record : dict
+        Record of the stage, to which its number of output rows can be set
+        (key "rows"). The record gets its "start" (seconds since the start of
+        the trace), "wall" and "cpu" (seconds, of the whole process) and
+        "depth" (of nesting in other stages) once the stage is done.
+    """
+    records = TRACE['records']
+    record = {'stage': stage, 'rows': None}
+    if records is None:
+        yield record
+        return
+    local = TRACE['depth']
+    depth = getattr(local, 'value', 0)
+    local.value = depth + 1
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        local.value = depth
+        record.update(start=wall - TRACE['start'],
+                      wall=time.perf_counter() - wall,
+                      cpu=time.process_time() - cpu, depth=depth)
+        records.append(record)
+
+
+def render_trace(records: list) -> str:
+    """
+    Render the stages of a trace as an indented table.
+
+    Parameters
+    ----------
+    records : list
+        Records of the stages (see `stop_trace`).
+
+    Returns
+    -------
+    text : str
+        Wall time, CPU time and rows of each stage (nested stages indented).
+    """
+    lines = ['# stage\twall(s)\tcpu(s)\trows']
+    for record in records:
+        lines.append('%s%s\t%.4f\t%.4f\t%s' % (
+            '  ' * record['depth'], record['stage'], record['wall'],
+            record['cpu'], '' if record['rows'] is None else record['rows']))
+    return '\n'.join(lines)
+
+
+def write_trace(records: list, output: str = None) -> None:
+    """
+    Write the stages of a trace to stderr or to a JSON file.
+
+    Parameters
+    ----------
+    records : list
+        Records of the stages (see `stop_trace`).
+    output : str
+        Path to the JSON file, or None (or "-", "1", "stderr") for stderr.
+    """
+    if output in (None, '-', '1', 'stderr'):
+        print(render_trace(records), file=sys.stderr)
+    else:
+        with open(output, 'w') as o:
+            json.dump({'stages': records}, o, indent=1)
+            o.write('\n')
+
+
+def render_prometheus(records: list, counters: dict = None) -> str:
+    """
+    Render the stages of a poll (of the daemon or the watch mode) as
+    Prometheus metrics, in text exposition format.
+
+    The stages are labelled by name, and a stage run several times in a poll
+    (e.g. sinfo for each federated cluster) is summed.
+
+    Parameters
+    ----------
+    records : list
+        Records of the stages of the last poll (see `stop_trace`).
+    counters : dict
+        Other metrics of the poller, e.g. {"xsinfo_polls_total": 10}.
+
+    Returns
+    -------
+    text : str
+        Metrics.
+    """
+    stages = {}
+    for record in records:
+        totals = stages.setdefault(record['stage'], {'rows': None})
+        for field in ['wall', 'cpu']:
+            totals[field] = totals.get(field, 0.) + record[field]
+        if record['rows'] is not None:
+            totals['rows'] = (totals['rows'] or 0) + record['rows']
+    lines = []
+    for metric, kind, description, field in PROMETHEUS_METRICS:
+        lines.append('# HELP %s %s' % (metric, description))
+        lines.append('# TYPE %s %s' % (metric, kind))
+        for stage, totals in stages.items():
+            if totals[field] is not None:
+                lines.append('%s{stage="%s"} %s' % (
+                    metric, stage, repr(float(totals[field]))))
+    for metric, value in (counters or {}).items():
+        kind = 'counter' if metric.endswith('_total') else 'gauge'
+        lines.append('# TYPE %s %s' % (metric, kind))
+        lines.append('%s %s' % (metric, repr(float(value))))
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path: str, records: list, counters: dict = None) -> None:
+    """
+    Write the metrics of a poll atomically (e.g. for the textfile collector
+    of the Prometheus node exporter).
+
+    Parameters
+    ----------
+    path : str
+        Path to the metrics file (e.g. ending in ".prom").
+    records : list
+        Records of the stages of the last poll (see `stop_trace`).
+    counters : dict
+        Other metrics of the poller.
+    """
+    from Xsinfo.snapshot import atomic_write
+    text = render_prometheus(records, counters)
+    atomic_write(path, lambda o: o.write(text))
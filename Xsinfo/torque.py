@@ -0,0 +1,177 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Collection of the nodes usage on Torque/PBS, from `pbsnodes -x`, into the
+same table as the sinfo collection (see `Xsinfo.collect.SINFO_SPEC`)."""
+
+import subprocess
+import xml.etree.ElementTree as ET
+import pandas as pd
+
+from Xsinfo.collect import SINFO_SPEC, SINFO_COLUMNS
+from Xsinfo.timing import timed
+
+PBSNODES_CMD = ['pbsnodes', '-x']
+# Torque node states, to the closest Slurm node state
+PBS_STATES = {
+    'free': 'idle',
+    'job-exclusive': 'allocated',
+    'job-sharing': 'allocated',
+    'busy': 'allocated',
+    'reserve': 'reserved',
+    'offline': 'drained',
+    'down': 'down',
+    'unknown': 'unknown'}
+# memory units of the status attributes, in kiB
+PBS_MEM_UNITS = {'b': 1 / 1024, 'kb': 1, 'mb': 1024, 'gb': 1024 ** 2,
+                 'tb': 1024 ** 3}
+
+
+def parse_pbs_mem(value: str) -> float:
+    """
+    Parse an amount of memory of the pbsnodes status, e.g. "196608000kb".
+
+    Parameters
+    ----------
+    value : str
+        Amount of memory with its unit.
+
+    Returns
+    -------
+    mem : float
+        Amount of memory in MiB (as for sinfo), or nan if missing.
+    """
+    value = (value or '').strip().lower()
+    number = value.rstrip('bkmgt')
+    if not number:
+        return float('nan')
+    unit = value[len(number):] or 'b'
+    return float(number) * PBS_MEM_UNITS[unit] / 1024
+
+
+def count_job_cores(jobs: str) -> int:
+    """
+    Count the cores used by the jobs running on a node.
+
+    Parameters
+    ----------
+    jobs : str
+        Cores (or cores ranges) and job ids, e.g. "0-3/12.srv,4/13.srv".
+
+    Returns
+    -------
+    cores : int
+        Number of allocated cores (each core is only counted once).
+    """
+    cores = set()
+    # a job can also list several cores ranges: "0-3,8/12.srv"
+    for part in (jobs or '').split(','):
+        rng = part.strip().split('/', 1)[0]
+        if rng:
+            lo, _, hi = rng.partition('-')
+            cores.update(range(int(lo), int(hi or lo) + 1))
+    return len(cores)
+
+
+def read_pbs_node(node: ET.Element) -> list:
+    """
+    Get the sinfo records of a pbsnodes node element (one per property).
+
+    Parameters
+    ----------
+    node : ET.Element
+        <Node> element of the `pbsnodes -x` output.
+
+    Returns
+    -------
+    records : list
+        Records with the values of `SINFO_COLUMNS`.
+    """
+    def text(tag, default=''):
+        value = node.findtext(tag)
+        return default if value is None else value.strip()
+
+    status = dict(x.split('=', 1) for x in text('status').split(',')
+                  if '=' in x)
+    total = int(text('np', status.get('ncpus', '0')) or 0)
+    states = text('state').split(',')
+    alloc = min(count_job_cores(text('jobs')), total)
+    other = total - alloc if {'down', 'offline', 'unknown'} & set(states) \
+        else 0
+    idle = total - alloc - other
+    state = PBS_STATES.get(states[0], states[0])
+    if state == 'idle' and alloc:
+        state = 'mixed'
+    # "availmem" also counts the free swap (i.e. "totmem" - "physmem")
+    physmem = parse_pbs_mem(status.get('physmem'))
+    swap = parse_pbs_mem(status.get('totmem')) - physmem
+    free_mem = parse_pbs_mem(status.get('availmem')) - (
+        swap if swap == swap else 0)
+    cpu_load = float(status.get('loadave', 'nan'))
+    sockets = int(text('total_sockets', '1') or 1)
+    cores = int(text('total_cores', '0') or 0) or total
+    threads = int(text('total_threads', '0') or 0)
+    threads = threads // cores if threads and cores else 1
+    record = [text('name'), None, state, cpu_load,
+              '%s/%s/%s/%s' % (alloc, idle, other, total), sockets,
+              cores // sockets, threads,
+              int(physmem) if physmem == physmem else 0, max(free_mem, 0.)]
+    partitions = [x for x in text('properties').split(',') if x] or ['']
+    return [record[:1] + [partition] + record[2:] for partition in partitions]
+
+
+def read_pbsnodes(source) -> pd.DataFrame:
+    """
+    Parse the XML output of `pbsnodes -x` one node at a time.
+
+    The nodes properties are used as partitions (i.e. one record per node and
+    property), as these are what Torque queues route jobs to.
+
+    Parameters
+    ----------
+    source : str or file
+        Path to, or stream of, the XML output (e.g. a subprocess pipe).
+
+    Returns
+    -------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores.
+    """
+    records = []
+    for _, elem in ET.iterparse(source, events=('end',)):
+        if elem.tag == 'Node':
+            records.extend(read_pbs_node(elem))
+            # only one node is kept in memory at a time
+            elem.clear()
+    sinfo = pd.DataFrame(records, columns=SINFO_COLUMNS)
+    dtypes = {col: dtype for col, _, _, dtype in SINFO_SPEC
+              if dtype is not str}
+    sinfo = sinfo.astype(dtypes)
+    return sinfo
+
+
+def get_pbsnodes() -> pd.DataFrame:
+    """
+    Run `pbsnodes -x` and parse its output as it is streamed.
+
+    Returns
+    -------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores.
+    """
+    # the output is parsed as it is streamed, i.e. during the latency
+    with timed('pbsnodes') as record:
+        proc = subprocess.Popen(PBSNODES_CMD, stdout=subprocess.PIPE)
+        try:
+            sinfo = read_pbsnodes(proc.stdout)
+            record['rows'] = sinfo.shape[0]
+        finally:
+            proc.stdout.close()
+            proc.wait()
+    if proc.returncode:
+        raise OSError('`%s` exited with status %s' % (
+            ' '.join(PBSNODES_CMD), proc.returncode))
+    return sinfo
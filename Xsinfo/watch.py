@@ -0,0 +1,228 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Live view of the nodes usage: one process re-collects on a schedule with
+the incremental pipeline, and only the lines of the report that changed are
+redrawn in the terminal (with ANSI escape codes)."""
+
+import sys
+import time
+import shutil
+from datetime import datetime
+
+from Xsinfo.backends import get_backend
+from Xsinfo.federation import collect_clusters, CLUSTER_TIMEOUT
+from Xsinfo.xsinfo import summarize
+from Xsinfo.summary import get_summary_rows
+from Xsinfo.delta import init_state, update_state
+from Xsinfo.render import render_shared, render_summary, render_nodes
+from Xsinfo.timing import timed, start_poll, stop_poll, write_prometheus
+
+# the next poll waits at least this many times the last collection time, so
+# that a slow controller is polled less often
+WATCH_BACKOFF = 5.
+# ANSI escape codes: clear the screen, move to a line, clear to the end of
+# the line or of the screen
+CLEAR_SCREEN = '\033[H\033[2J'
+MOVE_TO = '\033[%d;1H'
+CLEAR_LINE = '\033[K'
+CLEAR_BELOW = '\033[J'
+
+
+def get_watch_interval(interval: float, latency: float,
+                       backoff: float = WATCH_BACKOFF) -> float:
+    """
+    Get the number of seconds until the next poll.
+
+    Parameters
+    ----------
+    interval : float
+        Requested number of seconds between two polls.
+    latency : float
+        Number of seconds the last collection took.
+    backoff : float
+        Minimum ratio of the interval to the collection time.
+
+    Returns
+    -------
+    interval : float
+        Requested interval, or longer if the collections are slow.
+    """
+    return max(interval, backoff * latency)
+
+
+def render_watch(state: dict, status: str, show: bool = False,
+                 bins: dict = None) -> list:
+    """
+    Render the report of the current collection.
+
+    Parameters
+    ----------
+    state : dict
+        Incremental state of the collection (see `Xsinfo.delta.init_state`).
+    status : str
+        First line, e.g. with the collection time and latency.
+    show : bool
+        Also render the loads and free resources of each node.
+    bins : dict
+        Bins of the loads (see `Xsinfo.bins.get_bins`).
+
+    Returns
+    -------
+    lines : list
+        Lines of the report.
+    """
+    summary = get_summary_rows(summarize(state['sinfo_cpu'], bins))
+    parts = [status, render_shared(state['shared']), render_summary(summary)]
+    if show:
+        parts.append(render_nodes(state['sinfo_cpu']))
+    return '\n'.join(parts).split('\n')
+
+
+def fit_screen(lines: list, columns: int, rows: int) -> list:
+    """
+    Clip the report to the terminal, so that no line wraps or scrolls (which
+    would shift the lines to redraw).
+
+    Parameters
+    ----------
+    lines : list
+        Lines of the report.
+    columns : int
+        Terminal width.
+    rows : int
+        Terminal height.
+
+    Returns
+    -------
+    lines : list
+        At most `rows` - 1 lines (the cursor stays on the last row), each
+        with the tabs expanded and at most `columns` - 1 characters.
+    """
+    return [line.expandtabs()[:columns - 1] for line in lines[:rows - 1]]
+
+
+def redraw(previous: list, lines: list, out=sys.stdout) -> None:
+    """
+    Update the terminal from the previous report to the current one, by only
+    rewriting the lines that differ.
+
+    Parameters
+    ----------
+    previous : list
+        Lines of the report on the screen (None to draw the full report).
+    lines : list
+        Lines of the current report.
+    out : file
+        Terminal stream.
+    """
+    if previous is None:
+        out.write(CLEAR_SCREEN + '\n'.join(lines) + '\n')
+    else:
+        for row, line in enumerate(lines):
+            if row >= len(previous) or previous[row] != line:
+                out.write(MOVE_TO % (row + 1) + line + CLEAR_LINE)
+        # below the report, e.g. if it became shorter
+        out.write(MOVE_TO % (len(lines) + 1) + CLEAR_BELOW)
+    out.flush()
+
+
+def run_watch(interval: float, show: bool = False, backend: str = 'slurm',
+              clusters: list = None, timeout: float = CLUSTER_TIMEOUT,
+              iterations: int = None, out=sys.stdout,
+              metrics: str = None, filters: dict = None,
+              bins: dict = None) -> None:
+    """
+    Re-collect the nodes usage on a schedule and keep its report up to date.
+
+    Only the nodes that changed since the previous poll are re-processed
+    (see `Xsinfo.delta.update_state`), and no snapshot is written. On a
+    terminal, the report is clipped to its size, otherwise the full report
+    is written at each poll.
+
+    Parameters
+    ----------
+    interval : float
+        Number of seconds between the start of two collections (longer if
+        the collections are slow, see `get_watch_interval`).
+    show : bool
+        Also show the loads and free resources of each node.
+    backend : str
+        Scheduler backend collecting the nodes usage ("slurm" or "torque").
+    clusters : list
+        (name, slurm.conf path or None) of the Slurm clusters to collect
+        concurrently and merge.
+    timeout : float
+        Number of seconds after which the sinfo of a federated cluster is
+        killed (and the cluster left out).
+    iterations : int
+        Stop after this number of collections (default to run until
+        interrupted).
+    out : file
+        Output stream.
+    metrics : str
+        File to which the timing of the stages of each poll is written, as
+        Prometheus metrics (see `Xsinfo.timing.write_prometheus`).
+    filters : dict
+        Only collect and show the nodes selected by these filters (see
+        `Xsinfo.filters.parse_filters`).
+    bins : dict
+        Bins of the loads in which the nodes are summarized (see
+        `Xsinfo.bins.get_bins`).
+    """
+    scheduler = get_backend(backend)
+    tty = out.isatty()
+    n, failures, state, lines, wait = 0, 0, None, None, interval
+    while iterations is None or n < iterations:
+        start = time.monotonic()
+        if metrics:
+            mark = start_poll()
+        try:
+            with timed('collect') as record:
+                if clusters:
+                    sinfo = collect_clusters(clusters, timeout,
+                                             filters=filters)
+                elif filters:
+                    sinfo = scheduler['collect'](filters)
+                else:
+                    sinfo = scheduler['collect']()
+                record['rows'] = sinfo.shape[0]
+            latency = time.monotonic() - start
+            if state is None:
+                state = init_state(sinfo)
+            else:
+                state, _ = update_state(state, sinfo)
+            wait = get_watch_interval(interval, latency)
+            status = '> %s: %s took %.2fs, next in %gs' % (
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                scheduler['command'], latency, round(wait, 1))
+        except Exception as err:
+            # any failure of a poll (e.g. an unexpected record) is shown and
+            # the next poll is tried, rather than ending the watch
+            failures += 1
+            wait = get_watch_interval(interval, time.monotonic() - start)
+            status = '> %s: collection failed (%s: %s), next in %gs' % (
+                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                type(err).__name__, err, round(wait, 1))
+        # the previous report stays on the screen if the collection failed
+        with timed('render'):
+            current = [status] if state is None else render_watch(
+                state, status, show, bins)
+        if tty:
+            current = fit_screen(current, *shutil.get_terminal_size())
+            redraw(lines, current, out)
+        else:
+            out.write('\n'.join(current) + '\n')
+            out.flush()
+        lines = current
+        n += 1
+        if metrics:
+            write_prometheus(metrics, stop_poll(mark), {
+                'xsinfo_polls_total': n,
+                'xsinfo_poll_failures_total': failures,
+                'xsinfo_poll_interval_seconds': wait})
+        if iterations is None or n < iterations:
+            time.sleep(max(0., wait - (time.monotonic() - start)))
@@ -4,106 +4,93 @@
 # Distributed under the terms of the Modified BSD License.
 # ----------------------------------------------------------------------------
 
-import os
-import glob
-import math
-import subprocess
+import shutil
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from os.path import dirname, isdir, isfile
-# import yaml
 
+from Xsinfo.backends import get_backend
+from Xsinfo.federation import collect_clusters, CLUSTER_TIMEOUT
+from Xsinfo.filters import filter_sinfo
+from Xsinfo.collect import GRES_COLUMNS
+from Xsinfo.gres import count_gres
+from Xsinfo.bins import (
+    get_bins, is_default, get_labels, digitize, aggregate_bins, LOADS, GRID)
+from Xsinfo.schema import mib_to_gib, apply_schema, LOAD_DECIMALS
+from Xsinfo.partitions import index_partitions, group_nodes
+from Xsinfo.render import (
+    render_shared, render_nodes, get_summary_columns, RENDERERS)
+from Xsinfo.timing import timed
+from Xsinfo.summary import write_summary, read_summary, get_summary_rows
+from Xsinfo.snapshot import (
+    get_cache_dir, get_snapshot_dir, get_clusters_dir, get_fresh_snapshot,
+    read_snapshot, write_snapshot, prune_snapshots, snapshot_time,
+    ClusterState, MAX_AGE, SNAPSHOT_FORMAT)
+
+
+def normalize_sinfo(sinfo: pd.DataFrame) -> tuple:
+    """
+    Split the sinfo records (one per node and partition) into a table of the
+    physical nodes and a table of the partitions each node belongs to.
 
-def get_today_output():
-    """Get the path to the output file for today's node usage.
+    Parameters
+    ----------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores, per partition.
 
     Returns
     -------
-    output : str
-        path
+    nodes : pd.DataFrame
+        sinfo about the nodes with available cores, one row per node and with
+        the comma-separated partitions of the node ("partitions").
+    membership : pd.DataFrame
+        Node (column "node") to partition (column "partition") membership.
     """
-    output_dir = '%s/.xsinfo' % os.path.expanduser('~')
-    if not isdir(output_dir):
-        os.makedirs(output_dir)
-    today = str(datetime.now().date())
-    output = output_dir + '/' + today + '.tsv'
-    return output
+    membership = sinfo[['node', 'partition']].reset_index(drop=True)
+    first = ~sinfo.node.duplicated().values
+    nodes = sinfo.loc[first].drop(columns='partition')
+    # nodes codes in order of first record, i.e. of the rows of `nodes`
+    node_codes, names = pd.factorize(sinfo.node)
+    part_codes, parts = pd.factorize(sinfo.partition)
+    counts = np.bincount(node_codes, minlength=names.size)
+    if counts.size:
+        # one row of partition codes per node (in the order of its records,
+        # -1 after its last partition), and the distinct rows (i.e. sets of
+        # partitions) joined once each
+        order = np.argsort(node_codes, kind='stable')
+        ranks = np.arange(order.size) - np.repeat(np.cumsum(counts) - counts,
+                                                  counts)
+        sets = np.full((names.size, counts.max()), -1)
+        sets[node_codes[order], ranks] = part_codes[order]
+        unique_sets, inverse = np.unique(sets, axis=0, return_inverse=True)
+        labels = np.array([','.join(parts[row[row >= 0]])
+                           for row in unique_sets], dtype=object)
+        partitions = labels[inverse.reshape(-1)]
+    else:
+        partitions = np.array([], dtype=object)
+    nodes.insert(1, 'partitions', partitions)
+    nodes = nodes.reset_index(drop=True)
+    return nodes, membership
 
 
-def get_sinfo() -> pd.DataFrame:
+def get_membership(sinfo_cpu: pd.DataFrame) -> pd.DataFrame:
     """
-    Run subprocess to collect the nodes and cores
-    that are idle and available for compute.
-
-    Returns
-    -------
-    sinfo : pd.DataFrame
-        sinfo about the nodes with available cores.
-    """
-    # prepare a sinfo output to know more about current system availability
-    cmd = 'sinfo '
-    cmd += '--Node -h -O '
-    cmd += 'NodeList:10,'
-    cmd += 'Partition:10,'
-    cmd += 'StateLong:10,'
-    cmd += 'CPUsLoad:10,'
-    cmd += 'CPUsState:12,'
-    cmd += 'Sockets:4,'
-    cmd += 'Cores:4,'
-    cmd += 'Threads:4,'
-    cmd += 'Memory:12,'
-    cmd += 'FreeMem:12'
-    # get this rich output of sinfo
-    sinfo = [n.split() for n in subprocess.getoutput(cmd).split('\n')]
-    # with open('/Users/franck/programs/Xsinfo/Xsinfo/test/snap.txt') as o:
-    #     sinfo = yaml.load(o, Loader=yaml.Loader)
-    sinfo = pd.DataFrame(sinfo, columns=[
-        'node', 'partition', 'status', 'cpu_load', 'cpus',
-        'socket', 'cores', 'threads', 'mem', 'free_mem'])
-    return sinfo
-
-
-def find_series(cs: list) -> str:
-    """
-    Get a condensed representation of the series of cpus numbers for a node.
+    Get the node to partition membership table of the nodes table.
 
     Parameters
     ----------
-    cs : list
-        current list of numbers corresponding to cpus nodes.
+    sinfo_cpu : pd.DataFrame
+        sinfo about the nodes with available cores, one row per node.
 
     Returns
     -------
-    cpus : str
-        Condensed representation of nodes number (as ranges).
+    membership : pd.DataFrame
+        Node (column "node") to partition (column "partition") membership.
     """
-    mini, maxi = min(cs), max(cs)
-    vals = []
-    cur = [mini]
-    for c in cs[:-1]:
-        if not cur:
-            cur.append(c)
-            continue
-        if c + 1 not in cs:
-            cur.append(c)
-            vals.append(list(cur))
-            cur = []
-    cur.append(cs[-1])
-    vals.append(list(cur))
-    cpus = ','.join(['-'.join(map(str, sorted(set(x)))) for x in vals])
-    return cpus
-
-
-def condense_node_cpus(names):
-    d = {}
-    for name in names:
-        name_split = name.split('-')
-        d.setdefault(name_split[0], []).append(int(name_split[1]))
-
-    nodes = []
-    for n, cs in d.items():
-        nodes.append('%s-[%s]' % (n, find_series(sorted(cs))))
-    return ','.join(nodes)
+    membership = sinfo_cpu[['node', 'partitions']].assign(
+        partition=sinfo_cpu.partitions.str.split(',')
+    ).explode('partition')[['node', 'partition']].reset_index(drop=True)
+    return membership
 
 
 def expand_cpus(sinfo: pd.DataFrame) -> pd.DataFrame:
@@ -120,9 +107,16 @@ def expand_cpus(sinfo: pd.DataFrame) -> pd.DataFrame:
     sinfo_cpus : pd.DataFrame
         sinfo about the nodes with available cores expanded per current usage.
     """
-    # expand the number of allocated, idle, other and total cores
-    expanded = sinfo.cpus.apply(lambda x: pd.Series(map(int, x.split('/')[:2])))
-    expanded = expanded.rename(columns={0: 'allocated', 1: 'cpus_avail'})
+    # expand the number of allocated, idle, other and total cores by
+    # splitting the "A/I/O/T" field of all the rows at once
+    cols = ['allocated', 'cpus_avail', 'other', 'total']
+    if sinfo.shape[0]:
+        counts = np.array(
+            '/'.join(sinfo.cpus.tolist()).split('/'), dtype=int
+        ).reshape(-1, len(cols))
+    else:
+        counts = np.empty((0, len(cols)), dtype=int)
+    expanded = pd.DataFrame(counts, index=sinfo.index, columns=cols)
     sinfo_cpu = pd.concat([sinfo, expanded], axis=1)
     return sinfo_cpu
 
@@ -143,7 +137,8 @@ def keep_avail_nodes(sinfo_cpu: pd.DataFrame):
 
 def change_dtypes(sinfo_cpu: pd.DataFrame) -> None:
     """
-    Change the dtypes of some variables and use them to compute new metrics,
+    Change the dtypes of the nodes table to those of its schema (see
+    `Xsinfo.schema.NODES_DTYPES`) and use them to compute new metrics,
     including the memory load and free memory in GiB.
 
     Parameters
@@ -151,58 +146,116 @@ def change_dtypes(sinfo_cpu: pd.DataFrame) -> None:
     sinfo_cpu : pd.DataFrame
         sinfo about the nodes with available cores expanded per current usage.
     """
-    # reduce to nodes having cores that are idle but not reserved
-    sinfo_cpu['cpus_avail'] = sinfo_cpu['cpus_avail'].astype(float)
-    sinfo_cpu['cpu_load'] = sinfo_cpu['cpu_load'].astype(float)
-    sinfo_cpu['mem'] = sinfo_cpu['mem'].astype(float)
-    sinfo_cpu['free_mem'] = sinfo_cpu['free_mem'].astype(float)
-    sinfo_cpu['mem_load'] = 100*(1-(sinfo_cpu['free_mem'] / sinfo_cpu['mem']))
-    sinfo_cpu['mem_load'] = round(sinfo_cpu['mem_load'].clip(0), 4)
-    sinfo_cpu['free_mem'] = (sinfo_cpu['free_mem'] / 1000).apply(math.floor)
+    mem = sinfo_cpu['mem'].to_numpy(dtype=float)
+    free_mem = sinfo_cpu['free_mem'].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mem_load = 100 * (1 - free_mem / mem)
+    sinfo_cpu['mem_load'] = np.round(mem_load.clip(0), LOAD_DECIMALS)
+    # the free memory is unknown (nan) for the nodes that do not report it
+    sinfo_cpu['free_mem'] = mib_to_gib(free_mem)
+    apply_schema(sinfo_cpu)
 
 
-def bin_loads(sinfo_cpus: pd.DataFrame):
+def expand_gres(sinfo_cpu: pd.DataFrame) -> None:
     """
-    Group the cpu and memory load values into 1-100 quartiles.
+    Count the GPUs of each node, the used and available ones, and compute
+    their load (nan for the nodes without GPUs).
+
+    Parameters
+    ----------
+    sinfo_cpu : pd.DataFrame
+        sinfo about the nodes with available cores expanded per current usage,
+        with the "gres" and "gres_used" of each node (empty if not collected).
+    """
+    for col in GRES_COLUMNS:
+        if col not in sinfo_cpu.columns:
+            sinfo_cpu[col] = ''
+    sinfo_cpu['gpus'] = count_gres(sinfo_cpu['gres'])
+    sinfo_cpu['gpus_used'] = count_gres(sinfo_cpu['gres_used'])
+    sinfo_cpu['gpus_avail'] = (
+        sinfo_cpu['gpus'] - sinfo_cpu['gpus_used']).clip(0)
+    sinfo_cpu['gpu_load'] = round(
+        100 * sinfo_cpu['gpus_used'] / sinfo_cpu['gpus'].where(
+            sinfo_cpu['gpus'] > 0), LOAD_DECIMALS)
+    apply_schema(sinfo_cpu)
+
+
+def bin_loads(sinfo_cpus: pd.DataFrame, bins: dict = None):
+    """
+    Group the cpu, memory and gpu load values into bins (1-100 quartiles by
+    default).
 
     Parameters
     ----------
     sinfo_cpus : pd.DataFrame
         sinfo about the nodes with available cores.
+    bins : dict
+        Edges of the bins per load (see `Xsinfo.bins.get_bins`).
     """
-    q = [-1, 25, 50, 75, 100]
-    labels = ['0-25', '25-50', '50-75', '75-100']
-    for load in ['cpu_load', 'mem_load']:
-        sinfo_cpus['%s_bin' % load] = pd.cut(sinfo_cpus[load], q, labels=labels)
+    bins = bins or get_bins()
+    for load in LOADS:
+        edges = bins[load]
+        sinfo_cpus['%s_load_bin' % load] = pd.Categorical.from_codes(
+            digitize(sinfo_cpus['%s_load' % load], edges), get_labels(edges),
+            ordered=True)
 
 
-def summarize(sinfo_cpus: pd.DataFrame):
+def summarize(sinfo_cpus: pd.DataFrame, bins: dict = None) -> dict:
     """
-    Show some node usage stats in order for the use to select nodes
+    Get some node usage stats in order for the use to select nodes
     with enough resources in terms of cpu and memory availability.
 
     Parameters
     ----------
     sinfo_cpus : pd.DataFrame
         sinfo about the nodes with available cores.
+    bins : dict
+        Edges of the bins per load, and whether to also summarize the nodes
+        per bin of cpu x mem load (see `Xsinfo.bins.get_bins`), default to
+        the quartiles of each load.
+
+    Returns
+    -------
+    summary : dict
+        Per load ("cpu", "mem" and, if some nodes have GPUs, "gpu"), the nodes
+        per bin of load ("load"): their available cores ("cpus") and
+        memory ("mem") in total, their average and standard deviation of free
+        memory ("av" and "sd"), their number ("nodes") and their names, as a
+        hostlist ("names"), and for "gpu", their available GPUs ("gpus").
+        With a grid of bins, the same stats per bins of cpu and mem load
+        ("cpu-mem", e.g. with load "0-25/50-75").
     """
-    show_sinfo_cpus = sinfo_cpus.drop(columns=['partition', 'status'])
-    show_sinfo_cpus.sort_values('cpus_avail', ascending=False, inplace=True)
-    show_sinfo_cpus = show_sinfo_cpus.drop_duplicates()
-    for cpu_mem in ['cpu', 'mem']:
-        print('\n# Showing nodes per %s of %s load:' % ('%', cpu_mem))
-        print('%s\tcpus\tmem(gb)\tav\t±\tnodes\tnames' % '%')
-        for load, load_pd in show_sinfo_cpus.groupby('%s_load_bin' % cpu_mem):
-            if not load_pd.shape[0]:
-                continue
-            nnodes = load_pd.node.size
-            nodes = condense_node_cpus(load_pd.node.tolist())
-            ncpus = load_pd.cpus_avail.sum()
-            mem = load_pd.free_mem.sum()
-            mem_av = round(load_pd.free_mem.mean(), 4)
-            mem_sd = round(load_pd.free_mem.std(), 4)
-            print('%s%s\t%s\t%s\t%s\t%s\t%s\t%s' % (
-                load, '%', ncpus, mem, mem_av, mem_sd, nnodes, nodes))
+    bins = bins or get_bins()
+    show_sinfo_cpus = sinfo_cpus.sort_values('cpus_avail', ascending=False,
+                                             kind='stable')
+    loads = ['cpu', 'mem']
+    # snapshots processed before the GPUs were counted have no "gpus"
+    if 'gpus' in show_sinfo_cpus.columns and (show_sinfo_cpus.gpus > 0).any():
+        loads.append('gpu')
+    nodes = show_sinfo_cpus.node.to_numpy(dtype=object)
+    cpus = show_sinfo_cpus.cpus_avail.to_numpy()
+    free_mem = show_sinfo_cpus.free_mem.to_numpy()
+    codes = {}
+    summary = {}
+    for by in loads:
+        edges = bins[by]
+        codes[by] = digitize(show_sinfo_cpus['%s_load' % by], edges)
+        gpus = show_sinfo_cpus.gpus_avail.to_numpy() if by == 'gpu' else None
+        labels = get_labels(edges)
+        rows = [[labels[idx]] + row for idx, *row in aggregate_bins(
+            codes[by], len(edges) - 1, cpus, free_mem, nodes, gpus)]
+        summary[by] = pd.DataFrame(rows, columns=get_summary_columns(by))
+    if bins.get('grid'):
+        cpu_labels, mem_labels = get_labels(bins['cpu']), get_labels(
+            bins['mem'])
+        size = len(mem_labels)
+        grid = np.where((codes['cpu'] >= 0) & (codes['mem'] >= 0),
+                        codes['cpu'] * size + codes['mem'], -1)
+        rows = [['%s/%s' % (cpu_labels[idx // size], mem_labels[idx % size])]
+                + row for idx, *row in aggregate_bins(
+                    grid, len(cpu_labels) * size, cpus, free_mem, nodes)]
+        summary[GRID] = pd.DataFrame(rows, columns=get_summary_columns(GRID))
+    return summary
 
 
 def show_shared(sinfo_cpu_per_partition: dict):
@@ -214,10 +267,7 @@ def show_shared(sinfo_cpu_per_partition: dict):
     sinfo_cpu_per_partition : dict
         partitions sharing the same nodes.
     """
-    print('\n%s\nAvailable nodes/cpus across partitions:' % ('-' * 35))
-    for parts, nodes in sinfo_cpu_per_partition.items():
-        print(' -', parts, '\t:\t', nodes)
-    print('-' * 35, '\n')
+    print(render_shared(sinfo_cpu_per_partition))
 
 
 def show_sinfo_cpu(sinfo_cpu: pd.DataFrame) -> None:
@@ -231,89 +281,269 @@ def show_sinfo_cpu(sinfo_cpu: pd.DataFrame) -> None:
     sinfo_cpu : pd.DataFrame
         sinfo about the nodes with available cores.
     """
-    print('##')
-    sinfo_cpu = sinfo_cpu.drop(
-        columns='partition'
-    ).drop_duplicates().set_index(
-        'node'
-    ).rename(columns={
-        'cpu_load': 'cpu%',
-        'cpus_avail': 'freecpu',
-        'free_mem': 'freemem',
-        'mem_load': 'mem%'}
-    )
-    cols = ['cpu%', 'freecpu', 'mem%', 'freemem']
-    print('\t%s' % '\t'.join(cols))
-    for r, row in sinfo_cpu.iterrows():
-        print('%s\t%s' % (r, '\t'.join(map(str, row[cols]))))
-
-
-def write_sinfo(sinfo_cpu: pd.DataFrame, output: str, refresh: bool) -> None:
+    print(render_nodes(sinfo_cpu))
+
+
+def write_sinfo(sinfo_cpu: pd.DataFrame, output_dir: str,
+                taken: datetime = None, fmt: str = SNAPSHOT_FORMAT) -> str:
     """
+    Write a new snapshot (and its summary) and only keep a bounded set of
+    recent ones.
 
     Parameters
     ----------
     sinfo_cpu : pd.DataFrame
+        sinfo about the nodes with available cores.
+    output_dir : str
+        Directory of the snapshots (e.g. ~/.xsinfo).
+    taken : datetime
+        Collection time of the snapshot (default to now).
+    fmt : str
+        Snapshot file format: "npz", "feather" or "tsv" (e.g. for Xpbs).
+
+    Returns
+    -------
     output : str
-        A file path to output nodes summary, or empty string to only print.
-    refresh: bool
+        Path to the written snapshot file.
+    """
+    output = write_snapshot(sinfo_cpu, output_dir, taken, fmt)
+    write_summary(output, get_summary_rows(summarize(sinfo_cpu)),
+                  get_shared_nodes(sinfo_cpu))
+    prune_snapshots(output_dir)
+    return output
+
+
+def get_shared_nodes(sinfo_cpu: pd.DataFrame) -> dict:
     """
-    today = str(datetime.now().date())
-    outs = glob.glob('%s/*' % dirname(output))
-    for previous in [x for x in outs if today not in x]:
-        os.remove(previous)
-
-    if not isfile(output) or refresh:
-        sinfo_cpu.to_csv(output, index=False, sep='\t')
-        print('\n# sinfo written in "%s' % output)
-
-
-def get_shared_nodes(sinfo_cpu):
-    sinfo_cpu_per_partition = sinfo_cpu.groupby(
-        'node'
-    ).apply(
-        lambda x: ','.join(x['partition'])).reset_index(
-    ).groupby(
-        0
-    ).node.apply(
-        condense_node_cpus
-    ).to_dict()
+    Get the nodes per set of partitions they belong to.
+
+    Parameters
+    ----------
+    sinfo_cpu : pd.DataFrame
+        sinfo about the nodes with available cores, one row per node.
+
+    Returns
+    -------
+    sinfo_cpu_per_partition : dict
+        Condensed node names (values) per set of partitions (keys).
+    """
+    sinfo_cpu_per_partition = group_nodes(index_partitions(sinfo_cpu))
     return sinfo_cpu_per_partition
 
 
-def run_xsinfo(torque: bool, refresh: bool, show: bool) -> None:
+def process_nodes(nodes: pd.DataFrame) -> pd.DataFrame:
+    """
+    Expand, filter and bin the nodes table.
+
+    Parameters
+    ----------
+    nodes : pd.DataFrame
+        sinfo about the nodes with available cores, one row per node.
+
+    Returns
+    -------
+    sinfo_cpu : pd.DataFrame
+        sinfo about the nodes with available cores expanded per current usage.
+    """
+    with timed('expand_cpus') as record:
+        sinfo_cpu = expand_cpus(nodes)
+        record['rows'] = sinfo_cpu.shape[0]
+    for stage in [keep_avail_nodes, change_dtypes, expand_gres, bin_loads]:
+        with timed(stage.__name__) as record:
+            stage(sinfo_cpu)
+            record['rows'] = sinfo_cpu.shape[0]
+    return sinfo_cpu
+
+
+def process_sinfo(sinfo: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalize the collected sinfo table into one row per node (so that each
+    node is only processed once, whatever the number of its partitions), and
+    expand, filter and bin these nodes.
+
+    Parameters
+    ----------
+    sinfo : pd.DataFrame
+        sinfo about the nodes with available cores, per partition.
+
+    Returns
+    -------
+    sinfo_cpu : pd.DataFrame
+        sinfo about the nodes with available cores expanded per current usage,
+        one row per node.
+    """
+    with timed('normalize_sinfo') as record:
+        nodes, _ = normalize_sinfo(sinfo)
+        record['rows'] = nodes.shape[0]
+    sinfo_cpu = process_nodes(nodes)
+    return sinfo_cpu
+
+
+def get_cluster_state(refresh: bool = False, snapshot_dir: str = None,
+                      max_age: float = MAX_AGE, fmt: str = SNAPSHOT_FORMAT,
+                      backend: str = 'slurm', clusters: list = None,
+                      timeout: float = CLUSTER_TIMEOUT,
+                      filters: dict = None) -> ClusterState:
+    """Get the nodes usage from a recent enough snapshot, or by running sinfo
+    (in which case a snapshot is written in ~/.xsinfo), without printing.
+
+    With filters, the nodes of a recent snapshot are filtered, and otherwise
+    only the selected nodes are collected (and not written as a snapshot).
+
+    Parameters
+    ----------
+    refresh : str
+        Re-collect a snapshot in ~/.xsinfo even if a recent one exists
+    snapshot_dir : str
+        Directory of the snapshots written by `Xsinfo daemon` (default to
+        $XSINFO_SNAPSHOT_DIR), read instead of running sinfo
+    max_age : float
+        Maximum age (in seconds) of a snapshot to be reused
+    fmt : str
+        Format of the snapshot written after running sinfo (npz, feather, tsv)
+    backend : str
+        Scheduler backend collecting the nodes usage ("slurm" or "torque")
+    clusters : list
+        (name, slurm.conf path or None) of the Slurm clusters to collect
+        concurrently and merge (see `Xsinfo.federation.parse_clusters`)
+    timeout : float
+        Number of seconds after which the sinfo of a federated cluster is
+        killed (and the cluster left out)
+    filters : dict
+        Nodes filters (see `Xsinfo.filters.parse_filters`)
+
+    Returns
+    -------
+    state : ClusterState
+        Processed nodes table, nodes per set of partitions and provenance.
+    """
+    names = [name for name, _ in clusters or []]
+    output_dir = get_clusters_dir(get_cache_dir(), names, backend)
+    if not refresh:
+        snapshot = get_fresh_snapshot(
+            [get_clusters_dir(get_snapshot_dir(snapshot_dir), names, backend),
+             output_dir], max_age)
+        if snapshot:
+            with timed('read_snapshot') as record:
+                sinfo_cpu = read_snapshot(snapshot)
+                record['rows'] = sinfo_cpu.shape[0]
+            if filters:
+                with timed('filter_sinfo') as record:
+                    sinfo_cpu = filter_sinfo(sinfo_cpu, filters)
+                    record['rows'] = sinfo_cpu.shape[0]
+            cached = None if filters else read_summary(snapshot)
+            if cached is None:
+                with timed('get_shared_nodes'):
+                    shared = get_shared_nodes(sinfo_cpu)
+            else:
+                shared = cached['shared']
+            return ClusterState(sinfo_cpu, shared, snapshot,
+                                snapshot_time(snapshot), False,
+                                filtered=bool(filters))
+    scheduler = get_backend(backend)
+    if shutil.which(scheduler['command']) is None:
+        raise OSError('Are you using %s? `%s` command not found' % (
+            backend.capitalize(), scheduler['command']))
+    if clusters and backend != 'slurm':
+        raise ValueError('Only Slurm clusters can be federated')
+    taken = datetime.now()
+    with timed('collect') as record:
+        if clusters:
+            sinfo = collect_clusters(clusters, timeout, filters=filters)
+        elif filters:
+            sinfo = scheduler['collect'](filters)
+        else:
+            sinfo = scheduler['collect']()
+        record['rows'] = sinfo.shape[0]
+    sinfo_cpu = process_sinfo(sinfo)
+    if filters:
+        # a partial view, that must not be reused as the nodes usage
+        with timed('get_shared_nodes'):
+            shared = get_shared_nodes(sinfo_cpu)
+        return ClusterState(sinfo_cpu, shared, None, taken, True,
+                            scheduler['command'], True)
+    with timed('write_sinfo'):
+        snapshot = write_sinfo(sinfo_cpu, output_dir, taken, fmt)
+    return ClusterState(sinfo_cpu, read_summary(snapshot)['shared'],
+                        snapshot, taken, True, scheduler['command'])
+
+
+def get_summary(state: ClusterState, bins: dict = None) -> dict:
+    """Get the nodes stats rows saved with the snapshot, or summarize its
+    nodes table (and save them next to it for the next runs, if possible).
+
+    Parameters
+    ----------
+    state : ClusterState
+        Nodes usage (see `get_cluster_state`).
+    bins : dict
+        Bins of the loads (see `Xsinfo.bins.get_bins`), other than the
+        quartiles of the saved summaries.
+
+    Returns
+    -------
+    rows : dict
+        Nodes stats rows per bin of "cpu" and "mem" load.
+    """
+    # the saved summaries are those of all the nodes, in quartiles
+    reuse = not state.filtered and is_default(bins)
+    cached = read_summary(state.snapshot) if reuse else None
+    if cached is not None:
+        return cached['summary']
+    with timed('summarize'):
+        rows = get_summary_rows(summarize(state.sinfo_cpu, bins))
+    if not reuse:
+        return rows
+    try:
+        write_summary(state.snapshot, rows, state.shared)
+    except OSError:
+        # e.g. a snapshot of a shared directory that is read-only for users
+        pass
+    return rows
+
+
+def run_xsinfo(torque: bool, refresh: bool, show: bool,
+               snapshot_dir: str = None, max_age: float = MAX_AGE,
+               fmt: str = SNAPSHOT_FORMAT, output: str = 'text',
+               clusters: list = None, timeout: float = CLUSTER_TIMEOUT,
+               filters: dict = None, bins: dict = None) -> None:
     """Run the routine of collecting the nodes/cpus information and summarize it
     for different dimension, or get possible usage solutions for a users need.
 
     Parameters
     ----------
     torque : bool
-        Switch from Slurm to Torque
+        Switch from Slurm to Torque (nodes usage collected with pbsnodes)
     refresh : str
-        Update any sinfo snapshot file written today in ~/.slurm
+        Re-collect a snapshot in ~/.xsinfo even if a recent one exists
     show : bool
         Show available cpu and memory per node on top of summaries
+    snapshot_dir : str
+        Directory of the snapshots written by `Xsinfo daemon` (default to
+        $XSINFO_SNAPSHOT_DIR), read instead of running sinfo
+    max_age : float
+        Maximum age (in seconds) of a snapshot to be reused
+    fmt : str
+        Format of the snapshot written after running sinfo (npz, feather, tsv)
+    output : str
+        Output format: "text", "tsv" or "json"
+    clusters : list
+        (name, slurm.conf path or None) of the Slurm clusters to collect
+        concurrently and merge into one view
+    timeout : float
+        Number of seconds after which the sinfo of a federated cluster is
+        killed (and the cluster left out)
+    filters : dict
+        Only report the nodes selected by these filters (see
+        `Xsinfo.filters.parse_filters`)
+    bins : dict
+        Bins of the loads in which the nodes are summarized (see
+        `Xsinfo.bins.get_bins`), default to quartiles
     """
-    if torque:
-        print('No node collection mechanism yet for PBS/Torque!')
-    else:
-        if subprocess.getstatusoutput('sinfo')[0]:
-            raise OSError('Are you using Slurm? `sinfo` command not found')
-        output = get_today_output()
-        if isfile(output) and not refresh:
-            print('> Read', output)
-            sinfo_cpu = pd.read_table(output, sep='\t')
-        else:
-            print('> Run sinfo')
-            sinfo = get_sinfo()
-            sinfo_cpu = expand_cpus(sinfo)
-            keep_avail_nodes(sinfo_cpu)
-            change_dtypes(sinfo_cpu)
-            bin_loads(sinfo_cpu)
-            sinfo_cpu_per_partition = get_shared_nodes(sinfo_cpu)
-            show_shared(sinfo_cpu_per_partition)
-            write_sinfo(sinfo_cpu, output, refresh)
-
-        summarize(sinfo_cpu)
-        if show:
-            show_sinfo_cpu(sinfo_cpu)
+    backend = 'torque' if torque else 'slurm'
+    state = get_cluster_state(refresh, snapshot_dir, max_age, fmt, backend,
+                              clusters, timeout, filters)
+    summary = get_summary(state, bins)
+    with timed('render'):
+        text = RENDERERS[output](state, summary, show)
+    print(text)
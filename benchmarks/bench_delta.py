@@ -0,0 +1,89 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Benchmark of the incremental processing of a poll (`update_state`) against
+the full processing of the collection, on a synthetic cluster where only the
+loads changed, or where some nodes also changed state or partitions.
+
+Usage:
+    python benchmarks/bench_delta.py [NODES] [CHANGED] [REPEATS]
+"""
+
+import os
+import sys
+import timeit
+import tempfile
+import numpy as np
+
+from synthetic import make_sinfo_lines, write_stub_sinfo
+from Xsinfo.collect import get_sinfo
+from Xsinfo.delta import init_state, update_state
+from Xsinfo.xsinfo import process_sinfo, get_shared_nodes
+
+
+def get_polls(sinfo, changed: int, seed: int = 0) -> dict:
+    """
+    Get the sinfo collections of the next poll, per scenario.
+
+    Parameters
+    ----------
+    sinfo : pd.DataFrame
+        sinfo collection of the first poll.
+    changed : int
+        Number of nodes that change state (all the cores allocated).
+    seed : int
+        Seed of the random generator.
+
+    Returns
+    -------
+    polls : dict
+        sinfo collection of the next poll, per scenario.
+    """
+    rng = np.random.default_rng(seed)
+    loads = sinfo.copy()
+    loads['cpu_load'] = np.round(loads['cpu_load'] * rng.uniform(
+        .9, 1.1, loads.shape[0]), 2)
+    loads['free_mem'] = (loads['free_mem'] * rng.uniform(
+        .9, 1., loads.shape[0])).round()
+    nodes = rng.choice(sinfo.node.unique(), changed, replace=False)
+    states = loads.copy()
+    touched = states.node.isin(nodes)
+    total = states.loc[touched, 'cpus'].str.split('/').str[-1]
+    states.loc[touched, 'cpus'] = total + '/0/0/' + total
+    states.loc[touched, 'status'] = 'allocated'
+    # the touched nodes also leave their last partition (if in several)
+    partitions = states.loc[~(touched & states.node.duplicated(keep='first')
+                              & ~states.node.duplicated(keep='last'))]
+    return {
+        'unchanged': sinfo.copy(),
+        'loads': loads,
+        '%s states' % changed: states,
+        '%s partitions' % changed: partitions.reset_index(drop=True)}
+
+
+def main(nodes: int = 20000, changed: int = 30, repeats: int = 3) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        write_stub_sinfo(tmp, make_sinfo_lines(nodes))
+        os.environ['PATH'] = '%s%s%s' % (tmp, os.pathsep, os.environ['PATH'])
+        sinfo = get_sinfo()
+    state = init_state(sinfo)
+    polls = get_polls(sinfo, changed)
+
+    def full(current):
+        get_shared_nodes(process_sinfo(current).reset_index(drop=True))
+
+    print('nodes\tpoll\tfull(s)\tincremental(s)\tspeedup')
+    for poll, current in polls.items():
+        t_full = min(timeit.repeat(lambda: full(current), number=1,
+                                   repeat=repeats))
+        t_delta = min(timeit.repeat(lambda: update_state(state, current),
+                                    number=1, repeat=repeats))
+        print('%s\t%s\t%.4f\t%.4f\t%.1fx' % (
+            nodes, poll, t_full, t_delta, t_full / t_delta))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:4]))
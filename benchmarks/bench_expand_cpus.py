@@ -0,0 +1,70 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Regression benchmark of `expand_cpus` against the per-row implementation.
+
+Usage:
+    python benchmarks/bench_expand_cpus.py [ROWS] [REPEATS]
+"""
+
+import ast
+import sys
+import timeit
+import pandas as pd
+from os.path import abspath, dirname, join
+
+from Xsinfo.xsinfo import expand_cpus
+
+SNAP = join(dirname(dirname(abspath(__file__))), 'Xsinfo', 'test', 'snap.txt')
+COLUMNS = ['node', 'partition', 'status', 'cpu_load', 'cpus',
+           'socket', 'cores', 'threads', 'mem', 'free_mem']
+
+
+def expand_cpus_legacy(sinfo: pd.DataFrame) -> pd.DataFrame:
+    """Per-row `pd.Series` implementation of `expand_cpus` (Xsinfo <= 1.2)."""
+    expanded = sinfo.cpus.apply(lambda x: pd.Series(map(int, x.split('/')[:2])))
+    expanded = expanded.rename(columns={0: 'allocated', 1: 'cpus_avail'})
+    sinfo_cpu = pd.concat([sinfo, expanded], axis=1)
+    return sinfo_cpu
+
+
+def make_sinfo(rows: int) -> pd.DataFrame:
+    """Tile the snapshot fixture until it reaches the requested number of rows.
+
+    Parameters
+    ----------
+    rows : int
+        Number of (node, partition) rows to generate.
+
+    Returns
+    -------
+    sinfo : pd.DataFrame
+        sinfo table as returned by `get_sinfo`.
+    """
+    with open(SNAP) as f:
+        snap = ast.literal_eval(f.read())
+    tiled = (snap * (rows // len(snap) + 1))[:rows]
+    return pd.DataFrame(tiled, columns=COLUMNS)
+
+
+def main(rows: int = 120000, repeats: int = 3) -> None:
+    sinfo = make_sinfo(rows)
+    legacy = expand_cpus_legacy(sinfo)
+    current = expand_cpus(sinfo)
+    for col in ['allocated', 'cpus_avail']:
+        assert (legacy[col].values == current[col].values).all()
+
+    t_legacy = min(timeit.repeat(
+        lambda: expand_cpus_legacy(sinfo), number=1, repeat=repeats))
+    t_current = min(timeit.repeat(
+        lambda: expand_cpus(sinfo), number=1, repeat=repeats))
+    print('rows\tlegacy(s)\tcurrent(s)\tspeedup')
+    print('%s\t%.4f\t%.4f\t%.1fx' % (
+        rows, t_legacy, t_current, t_legacy / t_current))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:3]))
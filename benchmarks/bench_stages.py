@@ -0,0 +1,175 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Benchmark of each stage of the Xsinfo pipeline on synthetic clusters, from
+running a stub `sinfo` to summarizing, with the wall time and the peak memory
+allocated by each stage.
+
+The results are appended as JSON lines (one per stage and size, with the
+Xsinfo, Python, pandas and numpy versions, and the number of sinfo calls per
+collection) so that releases can be compared.
+
+Usage:
+    python benchmarks/bench_stages.py [--nodes 1000,10000,100000]
+        [--overlap 0.5] [--names simple] [--repeats 3] [--output FILE]
+        [--compare FILE]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from synthetic import make_sinfo_lines, write_stub_sinfo, NAME_PATTERNS
+from Xsinfo import __version__
+from Xsinfo.collect import get_sinfo
+from Xsinfo.xsinfo import (
+    normalize_sinfo, expand_cpus, keep_avail_nodes, change_dtypes,
+    expand_gres, bin_loads, get_shared_nodes, summarize)
+
+
+def get_stages() -> list:
+    """
+    Get the pipeline stages, in order, as (name, function) where the function
+    takes and returns the data passed between the stages (a dict).
+    """
+    def collect(data):
+        data['sinfo'] = get_sinfo()
+
+    def normalize(data):
+        data['nodes'], _ = normalize_sinfo(data['sinfo'])
+
+    def expand(data):
+        data['sinfo_cpu'] = expand_cpus(data['nodes'])
+
+    def in_place(func):
+        return lambda data: func(data['sinfo_cpu'])
+
+    return [
+        ('get_sinfo', collect),
+        ('normalize_sinfo', normalize),
+        ('expand_cpus', expand),
+        ('keep_avail_nodes', in_place(keep_avail_nodes)),
+        ('change_dtypes', in_place(change_dtypes)),
+        ('expand_gres', in_place(expand_gres)),
+        ('bin_loads', in_place(bin_loads)),
+        ('get_shared_nodes', in_place(get_shared_nodes)),
+        ('summarize', in_place(summarize))]
+
+
+def run_stages(repeats: int) -> dict:
+    """
+    Run the pipeline stages and measure them.
+
+    Parameters
+    ----------
+    repeats : int
+        Number of runs of the pipeline (the fastest time of each stage is
+        kept, the peak memory is measured on an extra run).
+
+    Returns
+    -------
+    results : dict
+        (seconds, peak MiB) per stage name.
+    """
+    times = {}
+    for _ in range(repeats):
+        data = {}
+        for name, stage in get_stages():
+            start = time.perf_counter()
+            stage(data)
+            times.setdefault(name, []).append(time.perf_counter() - start)
+    # tracing slows the allocations down, so it has its own run
+    peaks = {}
+    data = {}
+    tracemalloc.start()
+    for name, stage in get_stages():
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        stage(data)
+        peaks[name] = (tracemalloc.get_traced_memory()[1] - base) / 1024 ** 2
+    tracemalloc.stop()
+    results = dict((name, (min(times[name]), peaks[name]))
+                   for name, _ in get_stages())
+    return results
+
+
+def read_results(path: str) -> dict:
+    """Get the latest (seconds, peak MiB) per (nodes, stage) of a results
+    file."""
+    results = {}
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            results[(record['nodes'], record['stage'])] = (
+                record['seconds'], record['peak_mib'])
+    return results
+
+
+def main(sizes: list, overlap: float = .5, names: str = 'simple',
+         repeats: int = 3, output: str = None, compare: str = None) -> None:
+    previous = read_results(compare) if compare else {}
+    versions = {
+        'xsinfo': __version__, 'python': platform.python_version(),
+        'pandas': pd.__version__, 'numpy': np.__version__}
+    print('nodes\tstage\tseconds\tpeak(MiB)%s' % (
+        '\tvs.seconds\tvs.peak' if compare else ''))
+    for nodes in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            write_stub_sinfo(directory, make_sinfo_lines(nodes, overlap,
+                                                         names))
+            path = os.environ.get('PATH', '')
+            os.environ['PATH'] = directory + os.pathsep + path
+            try:
+                results = run_stages(repeats)
+            finally:
+                os.environ['PATH'] = path
+            # queries of the controller per collection (the stub reports a
+            # current Slurm, see `synthetic.SLURM_VERSION`)
+            with open(os.path.join(directory, 'calls.log')) as f:
+                calls = len(f.readlines()) / (repeats + 1)
+        if calls != 1:
+            print('# %g sinfo calls per collection (instead of one)' % calls,
+                  file=sys.stderr)
+        records = []
+        for stage, (seconds, peak) in results.items():
+            line = '%s\t%s\t%.4f\t%.1f' % (nodes, stage, seconds, peak)
+            if (nodes, stage) in previous:
+                old_seconds, old_peak = previous[(nodes, stage)]
+                line += '\t%.2fx\t%.2fx' % (seconds / old_seconds,
+                                            peak / old_peak if old_peak
+                                            else float('nan'))
+            print(line, flush=True)
+            records.append(dict(versions, nodes=nodes, overlap=overlap,
+                                names=names, stage=stage, seconds=seconds,
+                                peak_mib=peak, sinfo_calls=calls))
+        if output:
+            with open(output, 'a') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--nodes', default='1000,10000,100000',
+                        help='Comma-separated numbers of nodes.')
+    parser.add_argument('--overlap', type=float, default=.5,
+                        help='Fraction of nodes in several partitions.')
+    parser.add_argument('--names', choices=sorted(NAME_PATTERNS),
+                        default='simple', help='Node name pattern.')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', help='Append the results to this file.')
+    parser.add_argument('--compare',
+                        help='Show the ratios to the results of this file.')
+    args = parser.parse_args()
+    main([int(x) for x in args.nodes.split(',')], args.overlap, args.names,
+         args.repeats, args.output, args.compare)
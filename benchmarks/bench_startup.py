@@ -0,0 +1,78 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Startup benchmark of `Xsinfo` on a cache hit, with and without the summary
+saved next to the snapshot (i.e. the fast path that does not import pandas).
+
+Usage:
+    python benchmarks/bench_startup.py [REPEATS]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+from os.path import join
+
+from bench_expand_cpus import make_sinfo
+from Xsinfo.xsinfo import process_sinfo, write_sinfo
+from Xsinfo.summary import summary_path
+
+CMD = [sys.executable, '-c', 'from Xsinfo.script._standalone_xsinfo import '
+       'standalone_xsinfo; standalone_xsinfo()']
+
+
+def time_cmd(cmd: list, env: dict, repeats: int) -> tuple:
+    """Get the min and median wall time (in seconds) of a command.
+
+    Parameters
+    ----------
+    cmd : list
+        Command and arguments.
+    env : dict
+        Environment variables of the command.
+    repeats : int
+        Number of runs.
+
+    Returns
+    -------
+    times : tuple
+        Minimum and median wall times.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[0], times[len(times) // 2]
+
+
+def main(repeats: int = 10) -> None:
+    home = tempfile.mkdtemp()
+    try:
+        env = dict(os.environ, HOME=home)
+        env.pop('XSINFO_SNAPSHOT_DIR', None)
+        snapshot = write_sinfo(process_sinfo(make_sinfo(728)),
+                               join(home, '.xsinfo'))
+        runs = [
+            ('python (no import)', [sys.executable, '-c', 'pass']),
+            ('import pandas', [sys.executable, '-c', 'import pandas']),
+            ('cache hit, summary', CMD)]
+        print('run\tmin(s)\tmedian(s)')
+        for name, cmd in runs:
+            print('%s\t%.3f\t%.3f' % ((name,) + time_cmd(cmd, env, repeats)))
+        os.remove(summary_path(snapshot))
+        print('%s\t%.3f\t%.3f' % (
+            ('cache hit, no summary',) + time_cmd(CMD, env, repeats)))
+    finally:
+        shutil.rmtree(home)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:2]))
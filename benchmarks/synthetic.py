@@ -0,0 +1,144 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2022, Franck Lejzerowicz.
+#
+# Distributed under the terms of the Modified BSD License.
+# ----------------------------------------------------------------------------
+
+"""Synthetic sinfo outputs (as printed by `Xsinfo.collect.get_sinfo_cmd`), at
+any number of nodes, and a stub `sinfo` executable printing them.
+
+Usage:
+    python benchmarks/synthetic.py NODES [OVERLAP] [NAMES] > sinfo.txt
+"""
+
+import os
+import sys
+import stat
+import numpy as np
+from os.path import join
+
+from Xsinfo.collect import COLLECT_SPEC
+
+# node name patterns, formatted with the rack and node numbers
+NAME_PATTERNS = {
+    'simple': 'c%(rack)s-%(node)s',
+    'padded': 'r%(rack)02dn%(node)03d',
+    'suffix': 'gpu%(rack)s-%(node)s.ib'}
+NODES_PER_RACK = 60
+PARTITIONS = ['normal', 'long', 'bigmem', 'gpu', 'debug', 'scavenger']
+STATES = ['mixed', 'allocated', 'idle', 'drained', 'down*', 'reserved']
+STATES_P = [.55, .25, .1, .04, .03, .03]
+# (cores, memory in MiB) of the node types
+NODE_TYPES = [(40, 182784), (64, 515000), (128, 1031000)]
+# a current Slurm, whose `sinfo --json` only reports groups of nodes
+SLURM_VERSION = '23.11.4'
+# each call is logged (one line of arguments), to count the controller queries
+STUB = """#!/bin/sh
+echo "$@" >> "%(calls)s"
+case "$1" in
+--version) echo "slurm %(version)s";;
+--json) echo '{"sinfo": []}';;
+*) cat "%(output)s";;
+esac
+"""
+
+
+def make_sinfo_lines(nodes: int, overlap: float = .5, names: str = 'simple',
+                     seed: int = 0) -> list:
+    """
+    Generate the lines of a sinfo output (one per node and partition).
+
+    Parameters
+    ----------
+    nodes : int
+        Number of nodes.
+    overlap : float
+        Fraction of the nodes that also belong to a second partition (and,
+        for half of them, a third one).
+    names : str
+        Node name pattern (see `NAME_PATTERNS`).
+    seed : int
+        Seed of the random generator.
+
+    Returns
+    -------
+    lines : list
+        Fixed-width lines (with their newline).
+    """
+    rng = np.random.default_rng(seed)
+    types = rng.choice(len(NODE_TYPES), nodes, p=[.7, .2, .1])
+    total = np.array([x for x, _ in NODE_TYPES])[types]
+    mem = np.array([x for _, x in NODE_TYPES])[types]
+    states = np.array(STATES)[rng.choice(len(STATES), nodes, p=STATES_P)]
+    allocated = np.where(states == 'allocated', total, 0)
+    mixed = states == 'mixed'
+    allocated[mixed] = (rng.random(mixed.sum()) * total[mixed]).astype(int)
+    other = np.where(np.isin(states, ['drained', 'down*']), total, 0)
+    idle = total - allocated - other
+    cpu_load = np.round(allocated * rng.uniform(.2, 1.1, nodes), 2)
+    free_mem = (mem * rng.uniform(.05, 1., nodes)).astype(int)
+    gpus = np.where(types == 2, 4, 0)
+    gpus_used = (rng.random(nodes) * (gpus + 1)).astype(int)
+    first = rng.choice(len(PARTITIONS), nodes)
+    second = (first + 1 + rng.choice(len(PARTITIONS) - 1, nodes)) % len(
+        PARTITIONS)
+    third = (second + 1) % len(PARTITIONS)
+    third = np.where(third == first, -1, third)
+    draw = rng.random(nodes)
+    widths = [width for _, _, width, _ in COLLECT_SPEC]
+    lines = []
+    for idx in range(nodes):
+        name = NAME_PATTERNS[names] % {'rack': idx // NODES_PER_RACK + 1,
+                                       'node': idx % NODES_PER_RACK + 1}
+        parts = [first[idx]]
+        if draw[idx] < overlap:
+            parts.append(second[idx])
+            if draw[idx] < overlap / 2 and third[idx] >= 0:
+                parts.append(third[idx])
+        gres = 'gpu:a100:%s(S:0-1)' % gpus[idx] if gpus[idx] else '(null)'
+        used = 'gpu:a100:%s(IDX:N/A)' % gpus_used[idx] if gpus[idx] \
+            else '(null)'
+        for part in sorted(parts):
+            row = [name, PARTITIONS[part] + ('*' if part == 0 else ''),
+                   states[idx], cpu_load[idx], '%s/%s/%s/%s' % (
+                       allocated[idx], idle[idx], other[idx], total[idx]),
+                   2, total[idx] // 4, 2, mem[idx], free_mem[idx], gres,
+                   used, 'feature%s' % types[idx]]
+            lines.append(''.join(['%-*s' % (width, value) for width, value
+                                  in zip(widths, row)]) + '\n')
+    return lines
+
+
+def write_stub_sinfo(directory: str, lines: list) -> str:
+    """
+    Write a sinfo output and a stub `sinfo` executable printing it.
+
+    Parameters
+    ----------
+    directory : str
+        Directory to prepend to $PATH for the stub to be used.
+    lines : list
+        Lines of the sinfo output (see `make_sinfo_lines`).
+
+    Returns
+    -------
+    stub : str
+        Path to the stub executable, that logs its calls in "calls.log" of
+        the directory.
+    """
+    output = join(directory, 'sinfo.txt')
+    with open(output, 'w') as f:
+        f.writelines(lines)
+    stub = join(directory, 'sinfo')
+    with open(stub, 'w') as f:
+        f.write(STUB % {'calls': join(directory, 'calls.log'),
+                        'version': SLURM_VERSION, 'output': output})
+    os.chmod(stub, os.stat(stub).st_mode | stat.S_IXUSR)
+    return stub
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    sys.stdout.writelines(make_sinfo_lines(
+        int(args[0]), float(args[1]) if len(args) > 1 else .5,
+        args[2] if len(args) > 2 else 'simple'))
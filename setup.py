@@ -52,6 +52,7 @@ setup(
     include_package_data=True,
     install_requires=[
         "click",
+        "numpy",
         "pandas"
     ],
     classifiers=classifiers,